@@ -0,0 +1,43 @@
+"""create analysis_report table for background analysis jobs
+
+Revision ID: 7a3e9c2d1f40
+Revises: 26dd5ba33f41
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3e9c2d1f40'
+down_revision: Union[str, None] = '26dd5ba33f41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('analysis_report',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('params_hash', sa.String(length=64), nullable=False),
+    sa.Column('user_params', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('queued', 'running', 'completed', 'failed', name='analysisjobstatus'), nullable=False),
+    sa.Column('report', sa.Text(), nullable=True),
+    sa.Column('school_data', sa.Text(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_analysis_report_params_hash'), 'analysis_report', ['params_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_analysis_report_params_hash'), table_name='analysis_report')
+    op.drop_table('analysis_report')
+    op.execute('DROP TYPE IF EXISTS analysisjobstatus')
@@ -0,0 +1,81 @@
+"""create materialized views for wide-table statistics and county rollups
+
+Revision ID: a6c2e8f4d1b9
+Revises: f3a9d6e2b7c4
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c2e8f4d1b9'
+down_revision: Union[str, None] = 'f3a9d6e2b7c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /data/statistics：四張 wide 表的彙總只有一列
+    op.execute("""
+        CREATE MATERIALIZED VIEW mv_wide_table_stats AS
+        SELECT
+            1 AS id,
+            f.total AS faraway_total,
+            f.counties AS faraway_counties,
+            f.total_classes AS faraway_total_classes,
+            f.total_students AS faraway_total_students,
+            e.total AS education_total,
+            d.total AS devices_total,
+            d.counties AS devices_counties,
+            v.total AS volunteer_total,
+            v.counties AS volunteer_counties,
+            v.volunteer_schools AS volunteer_schools,
+            now() AS refreshed_at
+        FROM (
+            SELECT COUNT(*) AS total,
+                   COUNT(DISTINCT "縣市名稱") AS counties,
+                   SUM("班級數") AS total_classes,
+                   SUM("男學生數[人]" + "女學生數[人]") AS total_students
+            FROM wide_faraway3
+        ) AS f
+        CROSS JOIN (SELECT COUNT(*) AS total FROM "wide_edu_B_1_4") AS e
+        CROSS JOIN (
+            SELECT COUNT(*) AS total, COUNT(DISTINCT "縣市") AS counties
+            FROM wide_connected_devices
+        ) AS d
+        CROSS JOIN (
+            SELECT COUNT(*) AS total,
+                   COUNT(DISTINCT "縣市") AS counties,
+                   COUNT(DISTINCT "志工團隊學校") AS volunteer_schools
+            FROM wide_volunteer_teams
+        ) AS v
+    """)
+    # REFRESH ... CONCURRENTLY 需要唯一索引
+    op.execute('CREATE UNIQUE INDEX ux_mv_wide_table_stats_id ON mv_wide_table_stats (id)')
+
+    # 智能探索的各縣市學生數彙總（與 smart_exploration_crud 原本的 GROUP BY 相同）
+    op.execute("""
+        CREATE MATERIALIZED VIEW mv_county_education_stats AS
+        SELECT
+            COALESCE(c.name, w."縣市別") AS county_name,
+            MIN(w.county_id) AS county_id,
+            SUM(CAST(w."幼兒園[人]" AS INTEGER)) AS total_kindergarten,
+            SUM(CAST(w."國小[人]" AS INTEGER)) AS total_elementary,
+            SUM(CAST(w."國中[人]" AS INTEGER)) AS total_junior,
+            SUM(CAST(w."高級中等學校-普通科[人]" AS INTEGER) +
+                CAST(w."高級中等學校-專業群科[人]" AS INTEGER) +
+                CAST(w."高級中等學校-綜合高中[人]" AS INTEGER)) AS total_senior
+        FROM "wide_edu_B_1_4" AS w
+        LEFT JOIN dim_county AS c ON c.id = w.county_id
+        GROUP BY COALESCE(c.name, w."縣市別")
+    """)
+    op.execute('CREATE UNIQUE INDEX ux_mv_county_education_stats_name ON mv_county_education_stats (county_name)')
+    op.execute('CREATE INDEX ix_mv_county_education_stats_county_id ON mv_county_education_stats (county_id)')
+
+
+def downgrade() -> None:
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS mv_county_education_stats')
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS mv_wide_table_stats')
@@ -0,0 +1,29 @@
+"""add composite status indexes for dashboard aggregates
+
+Revision ID: b8d4f1a7c3e5
+Revises: a6c2e8f4d1b9
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4f1a7c3e5'
+down_revision: Union[str, None] = 'a6c2e8f4d1b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_need_school_id_status', 'need', ['school_id', 'status'], unique=False)
+    op.create_index('ix_donation_status', 'donation', ['status'], unique=False)
+    op.create_index('ix_donation_company_id_status', 'donation', ['company_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_donation_company_id_status', table_name='donation')
+    op.drop_index('ix_donation_status', table_name='donation')
+    op.drop_index('ix_need_school_id_status', table_name='need')
@@ -0,0 +1,112 @@
+"""add dim_county / dim_township and integer county keys on wide tables
+
+Revision ID: c5d8e2a1f7b3
+Revises: b41f7d2e8c15
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.county_resolver import resolve_county_id
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8e2a1f7b3'
+down_revision: Union[str, None] = 'b41f7d2e8c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 內政部縣市代碼（與 app/core/county_resolver.COUNTIES 相同；migration 內保留一份固定的副本）
+COUNTIES = [
+    (63000, '臺北市'), (64000, '高雄市'), (65000, '新北市'), (66000, '臺中市'),
+    (67000, '臺南市'), (68000, '桃園市'), (10002, '宜蘭縣'), (10004, '新竹縣'),
+    (10005, '苗栗縣'), (10007, '彰化縣'), (10008, '南投縣'), (10009, '雲林縣'),
+    (10010, '嘉義縣'), (10013, '屏東縣'), (10014, '臺東縣'), (10015, '花蓮縣'),
+    (10016, '澎湖縣'), (10017, '基隆市'), (10018, '新竹市'), (10020, '嘉義市'),
+    (9020, '金門縣'), (9007, '連江縣'),
+]
+
+# (表名, 縣市欄位, 鄉鎮欄位)
+WIDE_TABLES = [
+    ('wide_faraway3', '縣市名稱', '鄉鎮市區'),
+    ('wide_edu_B_1_4', '縣市別', None),
+    ('wide_connected_devices', '縣市', '鄉鎮市區'),
+    ('wide_volunteer_teams', '縣市', None),
+]
+
+
+def _backfill_county_ids(table: str, county_column: str) -> None:
+    """
+    以 app 的 resolve_county_id 回填 county_id
+
+    與 ingest 使用同一個解析器（含改制前名稱、「臺東」等簡稱與「馬祖」），
+    只需解析各表中不重複的縣市寫法，再以一條 UPDATE ... FROM unnest 批次寫入
+    """
+    conn = op.get_bind()
+    names = conn.execute(sa.text(
+        f'SELECT DISTINCT "{county_column}" FROM "{table}" WHERE "{county_column}" IS NOT NULL'
+    )).scalars().all()
+    resolved = [(name, resolve_county_id(name)) for name in names]
+    resolved = [(name, county_id) for name, county_id in resolved if county_id is not None]
+    if not resolved:
+        return
+    conn.execute(
+        sa.text(
+            f'UPDATE "{table}" AS w SET county_id = m.county_id '
+            f'FROM unnest(CAST(:names AS text[]), CAST(:county_ids AS integer[])) AS m(name, county_id) '
+            f'WHERE w."{county_column}" = m.name'
+        ),
+        {"names": [name for name, _ in resolved], "county_ids": [county_id for _, county_id in resolved]}
+    )
+
+
+def upgrade() -> None:
+    dim_county = op.create_table('dim_county',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name', name='uq_dim_county_name')
+    )
+    op.bulk_insert(dim_county, [{'id': county_id, 'name': name} for county_id, name in COUNTIES])
+
+    op.create_table('dim_township',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('county_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['county_id'], ['dim_county.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('county_id', 'name', name='uq_dim_township_county_name')
+    )
+
+    for table, county_column, township_column in WIDE_TABLES:
+        op.add_column(table, sa.Column('county_id', sa.Integer(), sa.ForeignKey('dim_county.id'), nullable=True))
+        op.create_index(f'ix_{table}_county_id', table, ['county_id'], unique=False)
+        _backfill_county_ids(table, county_column)
+        if township_column:
+            op.add_column(table, sa.Column('township_id', sa.Integer(), sa.ForeignKey('dim_township.id'), nullable=True))
+            op.create_index(f'ix_{table}_township_id', table, ['township_id'], unique=False)
+            op.execute(
+                f'INSERT INTO dim_township (county_id, name) '
+                f'SELECT DISTINCT county_id, btrim("{township_column}") FROM "{table}" '
+                f'WHERE county_id IS NOT NULL AND btrim(coalesce("{township_column}", \'\')) <> \'\' '
+                f'ON CONFLICT ON CONSTRAINT uq_dim_township_county_name DO NOTHING'
+            )
+            op.execute(
+                f'UPDATE "{table}" AS w SET township_id = t.id FROM dim_township AS t '
+                f'WHERE t.county_id = w.county_id AND t.name = btrim(w."{township_column}")'
+            )
+
+
+def downgrade() -> None:
+    for table, _, township_column in reversed(WIDE_TABLES):
+        if township_column:
+            op.drop_index(f'ix_{table}_township_id', table_name=table)
+            op.drop_column(table, 'township_id')
+        op.drop_index(f'ix_{table}_county_id', table_name=table)
+        op.drop_column(table, 'county_id')
+    op.drop_table('dim_township')
+    op.drop_table('dim_county')
@@ -0,0 +1,96 @@
+"""create school_stats, company_stats and company_sdg_stats rollup tables
+
+Revision ID: c9e5a2f8d4b1
+Revises: b8d4f1a7c3e5
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e5a2f8d4b1'
+down_revision: Union[str, None] = 'b8d4f1a7c3e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('school_stats',
+    sa.Column('school_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('total_needs', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('active_needs', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('in_progress_needs', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('completed_needs', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('students_benefited', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['school_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('school_id')
+    )
+    op.create_table('company_stats',
+    sa.Column('company_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('total_donations', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('completed_donations', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('students_helped', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('completed_duration_days', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('completed_with_duration', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['company_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('company_id')
+    )
+    op.create_table('company_sdg_stats',
+    sa.Column('company_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('sdg', sa.Integer(), nullable=False),
+    sa.Column('contributions', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['company_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('company_id', 'sdg')
+    )
+
+    # 以現有的需求與捐贈回填（與 app/crud/stats_rollup_crud.py 的 REBUILD_STATEMENTS 相同）
+    op.execute("""
+        INSERT INTO school_stats (school_id, total_needs, active_needs, in_progress_needs,
+                                  completed_needs, students_benefited, updated_at)
+        SELECT school_id,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE status = 'active'),
+               COUNT(*) FILTER (WHERE status = 'in_progress'),
+               COUNT(*) FILTER (WHERE status = 'completed'),
+               COALESCE(SUM(student_count) FILTER (WHERE status = 'completed'), 0),
+               timezone('utc', now())
+        FROM need
+        GROUP BY school_id
+    """)
+    op.execute("""
+        INSERT INTO company_stats (company_id, total_donations, completed_donations, students_helped,
+                                   completed_duration_days, completed_with_duration, updated_at)
+        SELECT d.company_id,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE d.status = 'completed'),
+               COALESCE(SUM(n.student_count) FILTER (WHERE d.status = 'completed'), 0),
+               COALESCE(SUM(EXTRACT(DAY FROM d.updated_at - d.created_at)::int)
+                        FILTER (WHERE d.status = 'completed' AND d.updated_at IS NOT NULL), 0),
+               COUNT(*) FILTER (WHERE d.status = 'completed' AND d.updated_at IS NOT NULL),
+               timezone('utc', now())
+        FROM donation AS d
+        JOIN need AS n ON n.id = d.need_id
+        GROUP BY d.company_id
+    """)
+    op.execute("""
+        INSERT INTO company_sdg_stats (company_id, sdg, contributions)
+        SELECT d.company_id, s.sdg, COUNT(*)
+        FROM donation AS d
+        JOIN need AS n ON n.id = d.need_id
+        CROSS JOIN LATERAL unnest(n.sdgs) AS s(sdg)
+        WHERE d.status = 'completed'
+        GROUP BY d.company_id, s.sdg
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('company_sdg_stats')
+    op.drop_table('company_stats')
+    op.drop_table('school_stats')
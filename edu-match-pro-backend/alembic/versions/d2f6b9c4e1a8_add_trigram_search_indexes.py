@@ -0,0 +1,41 @@
+"""add pg_trgm GIN indexes on searched school name columns
+
+Revision ID: d2f6b9c4e1a8
+Revises: c5d8e2a1f7b3
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6b9c4e1a8'
+down_revision: Union[str, None] = 'c5d8e2a1f7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (索引名稱, 表名, 欄位)：/schools 與 /data/* 以 ILIKE '%...%' 搜尋的名稱欄位
+TRGM_INDEXES = [
+    ('ix_wide_faraway3_school_name_trgm', 'wide_faraway3', '本校名稱'),
+    ('ix_wide_faraway3_branch_name_trgm', 'wide_faraway3', '分校分班名稱'),
+    ('ix_wide_connected_devices_school_name_trgm', 'wide_connected_devices', '學校名稱'),
+    ('ix_wide_volunteer_teams_service_unit_trgm', 'wide_volunteer_teams', '受服務單位'),
+    ('ix_wide_volunteer_teams_volunteer_school_trgm', 'wide_volunteer_teams', '志工團隊學校'),
+]
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index_name, table, column in TRGM_INDEXES:
+        op.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON "{table}" USING gin ("{column}" gin_trgm_ops)'
+        )
+
+
+def downgrade() -> None:
+    for index_name, _, _ in TRGM_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {index_name}')
+    # 不移除 pg_trgm extension：其他資料庫物件可能也在使用
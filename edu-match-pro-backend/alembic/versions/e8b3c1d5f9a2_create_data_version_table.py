@@ -0,0 +1,32 @@
+"""create data_version table for ingestion-driven cache invalidation
+
+Revision ID: e8b3c1d5f9a2
+Revises: d2f6b9c4e1a8
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3c1d5f9a2'
+down_revision: Union[str, None] = 'd2f6b9c4e1a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    data_version = op.create_table('data_version',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(data_version, [{'name': 'wide_tables', 'version': 1}])
+
+
+def downgrade() -> None:
+    op.drop_table('data_version')
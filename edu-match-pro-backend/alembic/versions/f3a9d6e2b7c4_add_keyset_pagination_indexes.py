@@ -0,0 +1,40 @@
+"""add composite indexes backing keyset pagination on wide tables
+
+Revision ID: f3a9d6e2b7c4
+Revises: e8b3c1d5f9a2
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d6e2b7c4'
+down_revision: Union[str, None] = 'e8b3c1d5f9a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 與 app/crud/wide_table_crud.py 的 KeysetOrder 完全一致（運算式與排序方向都要相同才能走索引）
+KEYSET_INDEXES = [
+    ('ix_wide_faraway3_keyset', 'wide_faraway3',
+     '"縣市名稱", "本校名稱", id'),
+    ('ix_wide_edu_B_1_4_keyset', 'wide_edu_B_1_4',
+     '"學年度" DESC, "縣市別", id'),
+    ('ix_wide_connected_devices_keyset', 'wide_connected_devices',
+     'COALESCE("縣市", \'\'), COALESCE("學校名稱", \'\'), id'),
+    ('ix_wide_volunteer_teams_keyset', 'wide_volunteer_teams',
+     'COALESCE("年度", \'\') DESC, COALESCE("縣市", \'\'), COALESCE("受服務單位", \'\'), id'),
+]
+
+
+def upgrade() -> None:
+    for index_name, table, columns in KEYSET_INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table}" ({columns})')
+
+
+def downgrade() -> None:
+    for index_name, _, _ in KEYSET_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS "{index_name}"')
@@ -2,12 +2,20 @@
 簡化的主 API 文件
 包含所有前端需要的 API 端點
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
+import logging
 import uuid
 
-from app.db import get_session
+from app.core.config import CountMode, settings
+from app.core.school_name_index import school_name_autocomplete
+from app.core.query_cache import public_query_cache
+from app.core.http_cache import (
+    conditional_response, make_etag, wide_data_etag,
+    REVALIDATE_CACHE_CONTROL, STATIC_CACHE_CONTROL, WIDE_DATA_CACHE_CONTROL
+)
+from app.db import get_read_session, get_session, read_session_factory
 from app.api.dependencies import get_current_user, require_company_user, require_school_user
 from app.models.user import User
 from app.schemas.need_schemas import NeedPublic, NeedCreate, NeedUpdate
@@ -23,10 +31,23 @@ from app.crud.dashboard_crud import get_school_dashboard_stats as get_school_sta
 from app.crud.donation_crud import get_donations_by_company
 from app.crud.activity_log_crud import get_recent_activity as get_user_activity
 from app.crud.smart_exploration_crud import query_schools_by_criteria
+from app.crud.aggregate_views_crud import get_wide_table_stats
+from app.crud.school_search_crud import search_school_names
+from app.crud.sql_filters import SqlFilter
+from app.crud.keyset_pagination import InvalidCursorError
+from app.crud.wide_table_crud import (
+    fetch_wide_page, FARAWAY_ORDER, EDUCATION_ORDER, DEVICES_ORDER, VOLUNTEER_ORDER
+)
 
 # 導入模擬數據
 from app.data.mock_data import RECENT_PROJECTS, IMPACT_STORIES
 
+logger = logging.getLogger(__name__)
+
+# 模擬數據只在部署時變動，ETag 於載入時計算一次
+RECENT_PROJECTS_ETAG = make_etag("recent_projects", RECENT_PROJECTS)
+IMPACT_STORIES_ETAG = make_etag("impact_stories", IMPACT_STORIES)
+
 
 def convert_need_to_public(need) -> NeedPublic:
     """將 Need 模型轉換為 NeedPublic 響應模型"""
@@ -61,43 +82,33 @@ async def health_check():
 @router.get("/schools")
 async def get_schools(
     query: str = "",
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     獲取學校列表（從 wide_faraway3 表）
     返回格式："本校名稱"-"分校分班名稱"
-    支持搜索過濾
+    支持搜索過濾，結果依與搜尋字串的相似度排序
     """
-    from sqlalchemy import select, text
-    
-    try:
-        # 使用原生 SQL 查詢以確保正確處理列名
-        sql = text("""
-            SELECT DISTINCT 
-                CASE 
-                    WHEN "分校分班名稱" IS NOT NULL AND "分校分班名稱" != '' 
-                    THEN "本校名稱" || '-' || "分校分班名稱"
-                    ELSE "本校名稱"
-                END as school_name
-            FROM wide_faraway3
-            WHERE 
-                ("本校名稱" IS NOT NULL AND "本校名稱" != '')
-                AND (
-                    :query = '' 
-                    OR "本校名稱" ILIKE '%' || :query || '%'
-                    OR "分校分班名稱" ILIKE '%' || :query || '%'
-                )
-            ORDER BY school_name
-            LIMIT 100
-        """)
-        
-        result = await session.execute(sql, {"query": query})
-        schools = [row[0] for row in result.fetchall()]
+    query = query.strip()
+
+    async def load():
+        schools = None
+        if settings.school_autocomplete_enabled:
+            try:
+                schools = await school_name_autocomplete.search(query, limit=100)
+            except Exception as e:
+                # 索引無法建立時退回資料庫查詢
+                print(f"[學校索引] 無法使用自動完成索引: {e}")
+        if schools is None:
+            schools = await search_school_names(session, query, limit=100)
         
         return {
             "schools": schools,
             "total": len(schools)
         }
+
+    try:
+        return await public_query_cache.get_or_load(session, "/schools", {"query": query}, load)
     except Exception as e:
         print(f"Error fetching schools: {e}")
         raise HTTPException(
@@ -110,57 +121,51 @@ async def get_schools(
 
 @router.get("/data/faraway-schools")
 async def get_faraway_schools(
+    request: Request,
+    response: Response,
     page: int = 1,
     limit: int = 50,
     county: str = "",
     school_name: str = "",
-    session: AsyncSession = Depends(get_session)
+    cursor: Optional[str] = None,
+    count_mode: Optional[CountMode] = None,
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """獲取偏鄉學校資料 (wide_faraway3)"""
-    from sqlalchemy import text
+    """獲取偏鄉學校資料 (wide_faraway3)
     
-    try:
-        offset = (page - 1) * limit
-        
+    page 分頁以 LIMIT/OFFSET 實作；傳入 cursor（第一頁傳空字串）則改用 keyset 分頁，
+    回應中的 next_cursor 即下一頁的游標；total_mode 表示總數的計算方式（見 count_mode）
+    """
+    county = county.strip()
+    school_name = school_name.strip()
+    count_mode = count_mode or settings.data_count_mode
+
+    async def load():
         # 構建查詢條件
-        where_clauses = []
-        params = {"limit": limit, "offset": offset}
-        
-        if county:
-            where_clauses.append('"縣市名稱" ILIKE :county')
-            params["county"] = f"%{county}%"
-        
-        if school_name:
-            where_clauses.append('"本校名稱" ILIKE :school_name')
-            params["school_name"] = f"%{school_name}%"
-        
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+        filters = SqlFilter()
+        filters.county('"縣市名稱"', "county", [county] if county else None, pattern="%{}%", case_insensitive=True)
+        filters.contains(['"本校名稱"'], "school_name", school_name, rank=True)
         
-        # 查詢資料
-        data_sql = text(f"""
-            SELECT 
+        result = await fetch_wide_page(
+            session,
+            table='wide_faraway3',
+            columns="""
                 "學年度", "縣市名稱", "鄉鎮市區", "學生等級",
                 "本校代碼", "本校名稱", "分校分班名稱",
                 "公/私立", "地區屬性", "班級數",
                 "男學生數[人]", "女學生數[人]", "原住民學生比率",
                 "上學年男畢業生數[人]", "上學年女畢業生數[人]"
-            FROM wide_faraway3
-            WHERE {where_sql}
-            ORDER BY "縣市名稱", "本校名稱"
-            LIMIT :limit OFFSET :offset
-        """)
-        
-        # 查詢總數
-        count_sql = text(f"""
-            SELECT COUNT(*) FROM wide_faraway3
-            WHERE {where_sql}
-        """)
-        
-        result = await session.execute(data_sql, params)
-        rows = result.fetchall()
-        
-        count_result = await session.execute(count_sql, {k: v for k, v in params.items() if k not in ['limit', 'offset']})
-        total = count_result.scalar()
+            """,
+            filters=filters,
+            order=FARAWAY_ORDER,
+            offset_order='"縣市名稱", "本校名稱"',
+            limit=limit,
+            page=page,
+            cursor=cursor,
+            count_mode=count_mode,
+        )
+        rows = result.rows
+        total = result.total
         
         data = []
         for row in rows:
@@ -187,8 +192,21 @@ async def get_faraway_schools(
             "total": total,
             "page": page,
             "limit": limit,
-            "pages": (total + limit - 1) // limit
+            "pages": (total + limit - 1) // limit,
+            "next_cursor": result.next_cursor,
+            "total_mode": result.total_mode
         }
+
+    params = {"page": page, "limit": limit, "county": county, "school_name": school_name, "cursor": cursor, "count_mode": count_mode}
+
+    try:
+        etag = await wide_data_etag(session, "/data/faraway-schools", params)
+        cached = conditional_response(request, response, etag, WIDE_DATA_CACHE_CONTROL)
+        if cached is not None:
+            return cached
+        return await public_query_cache.get_or_load(session, "/data/faraway-schools", params, load)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -198,22 +216,31 @@ async def get_faraway_schools(
 
 @router.get("/data/education-statistics")
 async def get_education_statistics(
+    request: Request,
+    response: Response,
     page: int = 1,
     limit: int = 50,
     county: str = "",
-    session: AsyncSession = Depends(get_session)
+    cursor: Optional[str] = None,
+    count_mode: Optional[CountMode] = None,
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """獲取教育統計資料 (wide_edu_B_1_4)"""
-    from sqlalchemy import text
+    """獲取教育統計資料 (wide_edu_B_1_4)
     
-    try:
-        offset = (page - 1) * limit
-        
-        where_sql = '"縣市別" ILIKE :county' if county else "1=1"
-        params = {"limit": limit, "offset": offset, "county": f"%{county}%"}
+    page 分頁以 LIMIT/OFFSET 實作；傳入 cursor（第一頁傳空字串）則改用 keyset 分頁，
+    回應中的 next_cursor 即下一頁的游標；total_mode 表示總數的計算方式（見 count_mode）
+    """
+    county = county.strip()
+    count_mode = count_mode or settings.data_count_mode
+
+    async def load():
+        filters = SqlFilter()
+        filters.county('"縣市別"', "county", [county] if county else None, pattern="%{}%", case_insensitive=True)
         
-        data_sql = text(f"""
-            SELECT 
+        result = await fetch_wide_page(
+            session,
+            table='"wide_edu_B_1_4"',
+            columns="""
                 "學年度", "縣市別",
                 "幼兒園[人]", "國小[人]", "國中[人]",
                 "高級中等學校-普通科[人]", "高級中等學校-專業群科[人]",
@@ -221,22 +248,17 @@ async def get_education_statistics(
                 "高級中等學校-進修部[人]", "大專校院(全部計入校本部)[人]",
                 "大專校院(跨縣市教學計入所在地縣市)[人]", "宗教研修學院[人]",
                 "國民補習及大專進修學校及空大[人]", "特殊教育學校[人]"
-            FROM "wide_edu_B_1_4"
-            WHERE {where_sql}
-            ORDER BY "學年度" DESC, "縣市別"
-            LIMIT :limit OFFSET :offset
-        """)
-        
-        count_sql = text(f"""
-            SELECT COUNT(*) FROM "wide_edu_B_1_4"
-            WHERE {where_sql}
-        """)
-        
-        result = await session.execute(data_sql, params)
-        rows = result.fetchall()
-        
-        count_result = await session.execute(count_sql, {"county": f"%{county}%"})
-        total = count_result.scalar()
+            """,
+            filters=filters,
+            order=EDUCATION_ORDER,
+            offset_order='"學年度" DESC, "縣市別"',
+            limit=limit,
+            page=page,
+            cursor=cursor,
+            count_mode=count_mode,
+        )
+        rows = result.rows
+        total = result.total
         
         data = []
         for row in rows:
@@ -263,8 +285,21 @@ async def get_education_statistics(
             "total": total,
             "page": page,
             "limit": limit,
-            "pages": (total + limit - 1) // limit
+            "pages": (total + limit - 1) // limit,
+            "next_cursor": result.next_cursor,
+            "total_mode": result.total_mode
         }
+
+    params = {"page": page, "limit": limit, "county": county, "cursor": cursor, "count_mode": count_mode}
+
+    try:
+        etag = await wide_data_etag(session, "/data/education-statistics", params)
+        cached = conditional_response(request, response, etag, WIDE_DATA_CACHE_CONTROL)
+        if cached is not None:
+            return cached
+        return await public_query_cache.get_or_load(session, "/data/education-statistics", params, load)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -274,51 +309,47 @@ async def get_education_statistics(
 
 @router.get("/data/connected-devices")
 async def get_connected_devices(
+    request: Request,
+    response: Response,
     page: int = 1,
     limit: int = 50,
     county: str = "",
     school_name: str = "",
-    session: AsyncSession = Depends(get_session)
+    cursor: Optional[str] = None,
+    count_mode: Optional[CountMode] = None,
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """獲取學校電腦設備資料 (wide_connected_devices)"""
-    from sqlalchemy import text
+    """獲取學校電腦設備資料 (wide_connected_devices)
     
-    try:
-        offset = (page - 1) * limit
-        
-        where_clauses = []
-        params = {"limit": limit, "offset": offset}
-        
-        if county:
-            where_clauses.append('"縣市" ILIKE :county')
-            params["county"] = f"%{county}%"
-        
-        if school_name:
-            where_clauses.append('"學校名稱" ILIKE :school_name')
-            params["school_name"] = f"%{school_name}%"
-        
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+    page 分頁以 LIMIT/OFFSET 實作；傳入 cursor（第一頁傳空字串）則改用 keyset 分頁，
+    回應中的 next_cursor 即下一頁的游標；total_mode 表示總數的計算方式（見 count_mode）
+    """
+    county = county.strip()
+    school_name = school_name.strip()
+    count_mode = count_mode or settings.data_count_mode
+
+    async def load():
+        filters = SqlFilter()
+        filters.county('"縣市"', "county", [county] if county else None, pattern="%{}%", case_insensitive=True)
+        filters.contains(['"學校名稱"'], "school_name", school_name, rank=True)
         
-        data_sql = text(f"""
-            SELECT 
+        result = await fetch_wide_page(
+            session,
+            table='wide_connected_devices',
+            columns="""
                 "縣市", "縣市代碼", "鄉鎮市區",
                 "學校名稱", "教學電腦數"
-            FROM wide_connected_devices
-            WHERE {where_sql}
-            ORDER BY "縣市", "學校名稱"
-            LIMIT :limit OFFSET :offset
-        """)
-        
-        count_sql = text(f"""
-            SELECT COUNT(*) FROM wide_connected_devices
-            WHERE {where_sql}
-        """)
-        
-        result = await session.execute(data_sql, params)
-        rows = result.fetchall()
-        
-        count_result = await session.execute(count_sql, {k: v for k, v in params.items() if k not in ['limit', 'offset']})
-        total = count_result.scalar()
+            """,
+            filters=filters,
+            order=DEVICES_ORDER,
+            offset_order='"縣市", "學校名稱"',
+            limit=limit,
+            page=page,
+            cursor=cursor,
+            count_mode=count_mode,
+        )
+        rows = result.rows
+        total = result.total
         
         data = []
         for row in rows:
@@ -335,8 +366,21 @@ async def get_connected_devices(
             "total": total,
             "page": page,
             "limit": limit,
-            "pages": (total + limit - 1) // limit
+            "pages": (total + limit - 1) // limit,
+            "next_cursor": result.next_cursor,
+            "total_mode": result.total_mode
         }
+
+    params = {"page": page, "limit": limit, "county": county, "school_name": school_name, "cursor": cursor, "count_mode": count_mode}
+
+    try:
+        etag = await wide_data_etag(session, "/data/connected-devices", params)
+        cached = conditional_response(request, response, etag, WIDE_DATA_CACHE_CONTROL)
+        if cached is not None:
+            return cached
+        return await public_query_cache.get_or_load(session, "/data/connected-devices", params, load)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -346,50 +390,46 @@ async def get_connected_devices(
 
 @router.get("/data/volunteer-teams")
 async def get_volunteer_teams(
+    request: Request,
+    response: Response,
     page: int = 1,
     limit: int = 50,
     county: str = "",
     school: str = "",
-    session: AsyncSession = Depends(get_session)
+    cursor: Optional[str] = None,
+    count_mode: Optional[CountMode] = None,
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """獲取資訊志工團隊資料 (wide_volunteer_teams)"""
-    from sqlalchemy import text
+    """獲取資訊志工團隊資料 (wide_volunteer_teams)
     
-    try:
-        offset = (page - 1) * limit
-        
-        where_clauses = []
-        params = {"limit": limit, "offset": offset}
-        
-        if county:
-            where_clauses.append('"縣市" ILIKE :county')
-            params["county"] = f"%{county}%"
-        
-        if school:
-            where_clauses.append('("受服務單位" ILIKE :school OR "志工團隊學校" ILIKE :school)')
-            params["school"] = f"%{school}%"
-        
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+    page 分頁以 LIMIT/OFFSET 實作；傳入 cursor（第一頁傳空字串）則改用 keyset 分頁，
+    回應中的 next_cursor 即下一頁的游標；total_mode 表示總數的計算方式（見 count_mode）
+    """
+    county = county.strip()
+    school = school.strip()
+    count_mode = count_mode or settings.data_count_mode
+
+    async def load():
+        filters = SqlFilter()
+        filters.county('"縣市"', "county", [county] if county else None, pattern="%{}%", case_insensitive=True)
+        filters.contains(['"受服務單位"', '"志工團隊學校"'], "school", school, rank=True)
         
-        data_sql = text(f"""
-            SELECT 
+        result = await fetch_wide_page(
+            session,
+            table='wide_volunteer_teams',
+            columns="""
                 "年度", "縣市", "受服務單位", "志工團隊學校"
-            FROM wide_volunteer_teams
-            WHERE {where_sql}
-            ORDER BY "年度" DESC, "縣市", "受服務單位"
-            LIMIT :limit OFFSET :offset
-        """)
-        
-        count_sql = text(f"""
-            SELECT COUNT(*) FROM wide_volunteer_teams
-            WHERE {where_sql}
-        """)
-        
-        result = await session.execute(data_sql, params)
-        rows = result.fetchall()
-        
-        count_result = await session.execute(count_sql, {k: v for k, v in params.items() if k not in ['limit', 'offset']})
-        total = count_result.scalar()
+            """,
+            filters=filters,
+            order=VOLUNTEER_ORDER,
+            offset_order='"年度" DESC, "縣市", "受服務單位"',
+            limit=limit,
+            page=page,
+            cursor=cursor,
+            count_mode=count_mode,
+        )
+        rows = result.rows
+        total = result.total
         
         data = []
         for row in rows:
@@ -405,8 +445,21 @@ async def get_volunteer_teams(
             "total": total,
             "page": page,
             "limit": limit,
-            "pages": (total + limit - 1) // limit
+            "pages": (total + limit - 1) // limit,
+            "next_cursor": result.next_cursor,
+            "total_mode": result.total_mode
         }
+
+    params = {"page": page, "limit": limit, "county": county, "school": school, "cursor": cursor, "count_mode": count_mode}
+
+    try:
+        etag = await wide_data_etag(session, "/data/volunteer-teams", params)
+        cached = conditional_response(request, response, etag, WIDE_DATA_CACHE_CONTROL)
+        if cached is not None:
+            return cached
+        return await public_query_cache.get_or_load(session, "/data/volunteer-teams", params, load)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -418,79 +471,57 @@ async def get_volunteer_teams(
 
 @router.get("/data/statistics")
 async def get_data_statistics(
-    session: AsyncSession = Depends(get_session)
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """獲取所有 wide 表的統計資訊"""
-    from sqlalchemy import text
-    
-    try:
-        stats = {}
-        
-        # 偏鄉學校統計
-        result = await session.execute(text("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(DISTINCT "縣市名稱") as counties,
-                SUM("班級數") as total_classes,
-                SUM("男學生數[人]" + "女學生數[人]") as total_students
-            FROM wide_faraway3
-        """))
-        row = result.fetchone()
-        stats["faraway_schools"] = {
-            "total_records": row[0],
-            "counties": row[1],
-            "total_classes": row[2],
-            "total_students": row[3]
-        }
-        
-        # 教育統計
-        result = await session.execute(text("""
-            SELECT COUNT(*) FROM "wide_edu_B_1_4"
-        """))
-        stats["education_statistics"] = {
-            "total_records": result.scalar()
-        }
-        
-        # 電腦設備統計
-        result = await session.execute(text("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(DISTINCT "縣市") as counties
-            FROM wide_connected_devices
-        """))
-        row = result.fetchone()
-        stats["connected_devices"] = {
-            "total_records": row[0],
-            "counties": row[1]
-        }
-        
-        # 志工團隊統計
-        result = await session.execute(text("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(DISTINCT "縣市") as counties,
-                COUNT(DISTINCT "志工團隊學校") as volunteer_schools
-            FROM wide_volunteer_teams
-        """))
-        row = result.fetchone()
-        stats["volunteer_teams"] = {
-            "total_records": row[0],
-            "counties": row[1],
-            "volunteer_schools": row[2]
-        }
-        
+    """獲取所有 wide 表的統計資訊（讀取 ingest 後更新的 mv_wide_table_stats）"""
+    async def load():
+        stats = await get_wide_table_stats(session)
+        if stats is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="統計資料尚未產生，請先執行資料匯入"
+            )
         return stats
+
+    try:
+        etag = await wide_data_etag(session, "/data/statistics", {})
+        cached = conditional_response(request, response, etag, WIDE_DATA_CACHE_CONTROL)
+        if cached is not None:
+            return cached
+        return await public_query_cache.get_or_load(session, "/data/statistics", {}, load)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"獲取統計資料失敗: {str(e)}"
         )
 
+
+@router.get("/data/cache_stats")
+async def get_data_cache_stats():
+    """公開查詢快取（/schools、/data/*）的命中統計"""
+    return public_query_cache.stats()
+
+
+@router.get("/db/pool_stats")
+async def get_db_pool_stats():
+    """資料庫連線池（主庫與讀取副本）的使用率、取得連線的等待時間與副本路由統計"""
+    from app.core.db_engine import pool_stats
+    from app.db import engine, engine_profile, replica_engine, replica_router
+    return {
+        "primary": pool_stats(engine, engine_profile),
+        "replica": pool_stats(replica_engine, engine_profile) if replica_engine is not None else None,
+        "replica_routing": replica_router.stats()
+    }
+
 # ==================== 學校需求相關 ====================
 
 @router.get("/school_needs", response_model=List[NeedPublic])
 async def get_school_needs(
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """獲取所有學校需求（只包含真實用戶需求）"""
     needs = await get_all_needs(session)
@@ -499,7 +530,7 @@ async def get_school_needs(
 
 @router.get("/company_needs", response_model=List[NeedPublic])
 async def get_company_needs(
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(require_company_user)
 ):
     """獲取企業可查看的所有需求（包括模擬用戶需求）"""
@@ -677,10 +708,15 @@ async def get_school_dashboard_stats(
 
 @router.get("/platform_stats", response_model=PlatformStats)
 async def get_platform_stats_endpoint(
-    session: AsyncSession = Depends(get_session)
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """獲取平台整體統計數據"""
+    """獲取平台整體統計數據（需求與捐贈隨時會變動，ETag 為內容雜湊，內容未變時回傳 304）"""
     stats = await get_platform_stats(session)
+    cached = conditional_response(request, response, make_etag("platform_stats", stats), REVALIDATE_CACHE_CONTROL)
+    if cached is not None:
+        return cached
     return PlatformStats(**stats)
 
 
@@ -759,18 +795,24 @@ async def sponsor_need(
 # ==================== 最近專案 ====================
 
 @router.get("/recent_projects")
-async def get_recent_projects():
+async def get_recent_projects(request: Request, response: Response):
     """獲取最近專案"""
     # 暫時返回模擬數據，後續可以從數據庫獲取
+    cached = conditional_response(request, response, RECENT_PROJECTS_ETAG, STATIC_CACHE_CONTROL)
+    if cached is not None:
+        return cached
     return RECENT_PROJECTS
 
 
 # ==================== 影響力故事 ====================
 
 @router.get("/impact_stories")
-async def get_impact_stories():
+async def get_impact_stories(request: Request, response: Response):
     """獲取影響力故事"""
     # 暫時返回模擬數據，後續可以從數據庫獲取
+    cached = conditional_response(request, response, IMPACT_STORIES_ETAG, STATIC_CACHE_CONTROL)
+    if cached is not None:
+        return cached
     return IMPACT_STORIES
 
 
@@ -804,20 +846,135 @@ from pydantic import BaseModel
 from typing import Optional
 
 class AIExtractionRequest(BaseModel):
-    """AI 參數提取請求"""
+    """
+    AI 參數提取請求
+
+    帶 session_id（或不帶 conversation_history）時由伺服器保存對話，客戶端只需送出新訊息；
+    只帶 conversation_history 時沿用舊行為
+    """
     query: str
     conversation_history: Optional[List[dict]] = []
+    session_id: Optional[str] = None
 
 class AIExtractionResponse(BaseModel):
     """AI 參數提取響應"""
     extracted_params: dict
     followup_question: Optional[str] = None
     is_complete: bool = False
+    session_id: Optional[str] = None
+    # 對話 session 中跨輪次合併後的參數
+    session_params: Optional[dict] = None
 
 class AIAnalysisRequest(BaseModel):
-    """AI 分析請求"""
-    user_params: dict
+    """AI 分析請求（帶 session_id 時以 session 中合併的參數為基礎，user_params 可覆蓋）"""
+    user_params: Optional[dict] = {}
     conversation_history: Optional[List[dict]] = []
+    session_id: Optional[str] = None
+
+
+async def _load_conversation(request: AIExtractionRequest):
+    """
+    取得本輪的對話 session 與對話歷史（含本輪用戶訊息）
+
+    Returns:
+        (ConversationState 或 None, 對話歷史)；舊版客戶端（只送 conversation_history）回傳 None
+    """
+    from app.core.conversation_store import conversation_store
+
+    if not request.session_id and request.conversation_history:
+        return None, request.conversation_history
+
+    conversation = await conversation_store.get(request.session_id) if request.session_id else None
+    if conversation is None:
+        # 新對話或 session 已過期：建立新的 session，回應中會帶回新的 session_id
+        conversation = await conversation_store.create()
+    history = conversation.turns + [{"role": "user", "content": request.query}]
+    return conversation, history
+
+
+async def _save_conversation_turn(conversation, query: str, reply: Optional[str], extracted_params: dict) -> None:
+    """把本輪的用戶訊息、回覆與提取的參數寫回 session"""
+    if conversation is None:
+        return
+    from app.core.conversation_store import conversation_store
+    await conversation_store.append(
+        conversation,
+        [{"role": "user", "content": query}, {"role": "assistant", "content": reply or ""}],
+        extracted_params
+    )
+
+
+async def _resolve_analysis_params(request: AIAnalysisRequest) -> dict:
+    """分析參數：session 中合併的參數 + 請求中的 user_params"""
+    user_params = request.user_params or {}
+    if not request.session_id:
+        return user_params
+    from app.core.conversation_store import conversation_store, merge_params
+    conversation = await conversation_store.get(request.session_id)
+    if conversation is None:
+        if not user_params:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="對話 session 不存在或已過期"
+            )
+        return user_params
+    return merge_params(conversation.params, user_params)
+
+@router.get("/ai/cache_stats")
+async def get_ai_cache_stats():
+    """
+    AI 回應快取的命中統計
+    """
+    from app.core.ai_service import get_ai_service_async
+    try:
+        ai_service = await get_ai_service_async()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"AI 服務不可用: {str(e)}"
+        )
+    return ai_service.cache_stats()
+
+
+@router.get("/ai/key_stats")
+async def get_ai_key_stats():
+    """
+    Gemini API 金鑰池的健康狀態（冷卻、熔斷、延遲與錯誤率；金鑰只顯示末四碼）
+    """
+    from app.core.ai_service import get_ai_service_async
+    try:
+        ai_service = await get_ai_service_async()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"AI 服務不可用: {str(e)}"
+        )
+    return ai_service.key_pool_stats()
+
+
+@router.get("/ai/sessions/{session_id}")
+async def get_ai_conversation(session_id: str):
+    """
+    取得對話 session 的內容（訊息與合併後的參數），供前端重新整理頁面後還原對話
+    """
+    from app.core.conversation_store import conversation_store
+    conversation = await conversation_store.get(session_id)
+    if conversation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="對話 session 不存在或已過期"
+        )
+    return conversation.as_dict()
+
+
+@router.get("/ai/prompt_stats")
+async def get_ai_prompt_stats():
+    """
+    各類提示詞（extraction / combined / followup / report）的估算 token 數統計
+    """
+    from app.core.prompt_builder import prompt_metrics
+    return prompt_metrics.stats()
+
 
 @router.post("/ai/extract_parameters")
 async def extract_parameters(
@@ -830,21 +987,37 @@ async def extract_parameters(
     print(f"\n{'='*60}")
     print(f"[API] 收到 AI 參數提取請求")
     print(f"[API] 用戶查詢: {request.query}")
-    print(f"[API] 對話歷史長度: {len(request.conversation_history)}")
+    print(f"[API] 對話 session: {request.session_id}，對話歷史長度: {len(request.conversation_history or [])}")
     print(f"{'='*60}\n")
     
     try:
-        from app.core.ai_service import get_ai_service
-        ai_service = get_ai_service()
+        from app.core.ai_service import get_ai_service_async
+        ai_service = await get_ai_service_async()
         
         print(f"[API] AI 服務已初始化")
         
-        # 提取參數
-        print(f"[API] 開始提取參數...")
-        extracted_params = ai_service.extract_donation_parameters(
-            request.query, 
-            request.conversation_history
-        )
+        conversation, conversation_history = await _load_conversation(request)
+        
+        followup_question = None
+        combined = None
+        if settings.ai_combined_extraction:
+            # 單次調用同時取得參數與回覆；失敗時回到兩段式流程
+            logger.info("[API] 開始合併提取參數與回覆...")
+            combined = await ai_service.extract_and_reply_async(
+                request.query,
+                conversation_history
+            )
+
+        if combined is not None:
+            extracted_params = combined["extracted_params"]
+            followup_question = combined["followup_question"]
+        else:
+            # 提取參數
+            print(f"[API] 開始提取參數...")
+            extracted_params = await ai_service.extract_donation_parameters_async(
+                request.query, 
+                conversation_history
+            )
         print(f"[API] 提取的參數: {extracted_params}")
         
         # 清理 null 值，避免覆蓋前端已有的參數
@@ -852,7 +1025,6 @@ async def extract_parameters(
         print(f"[API] 清理後的參數: {extracted_params}")
 
         # 檢查 AI 是否直接回傳了原始回應（非結構化），若有則直接作為回覆
-        followup_question = None
         # 支援 ai_service 返回的診斷 key：_raw_ai_response 或 _raw_ai_error 或 _fallback_reply
         for raw_key in ("_raw_ai_response", "_raw_ai_error", "_fallback_reply"):
             if raw_key in extracted_params:
@@ -862,24 +1034,32 @@ async def extract_parameters(
                 print(f"[API] 偵測到原始 AI 回應，將直接回覆使用者，內容前200字: {str(followup_question)[:200]}")
                 break
 
-        # 檢查必要參數是否都已收集
+        # 檢查必要參數是否都已收集（有 session 時以跨輪次合併後的參數判斷）
         required_fields = ["resource_type", "target_counties"]
-        is_params_complete = all(extracted_params.get(field) for field in required_fields)
+        params_for_check = extracted_params
+        if conversation is not None:
+            from app.core.conversation_store import merge_params
+            params_for_check = merge_params(conversation.params, extracted_params)
+        is_params_complete = all(params_for_check.get(field) for field in required_fields)
         print(f"[API] 參數完整性: {is_params_complete}")
 
         # 若尚未由 AI 直接提供回覆，則生成追問問題或確認問題
         if followup_question is None:
             print(f"[API] 開始生成追問問題...")
-            followup_question = ai_service.generate_followup_question(
+            followup_question = await ai_service.generate_followup_question_async(
                 extracted_params,
-                request.conversation_history
+                conversation_history
             )
             print(f"[API] 追問問題生成完成: {followup_question[:100] if followup_question else 'None'}...")
         
+        await _save_conversation_turn(conversation, request.query, followup_question, extracted_params)
+        
         response_data = AIExtractionResponse(
             extracted_params=extracted_params,
             followup_question=followup_question,
-            is_complete=is_params_complete  # 必要參數都收集完成
+            is_complete=is_params_complete,  # 必要參數都收集完成
+            session_id=conversation.session_id if conversation else None,
+            session_params=conversation.params if conversation else None
         )
         
         print(f"\n[API] ✅ 請求處理完成，準備返回")
@@ -909,45 +1089,89 @@ async def extract_parameters(
         )
 
 
+@router.post("/ai/extract_parameters/stream")
+async def extract_parameters_stream(request: AIExtractionRequest):
+    """
+    /ai/extract_parameters 的 SSE 串流版本
+
+    事件順序：params（提取結果與完整性）→ token（回覆文字片段，可多次）→ done（完整回覆）；
+    失敗時送出 error 事件
+    """
+    from app.core.sse import format_sse, sse_comment, sse_response
+
+    async def event_stream():
+        # 立即送出第一個位元組，避免代理或前端在模型回應前逾時
+        yield sse_comment("connected")
+        try:
+            from app.core.ai_service import get_ai_service_async
+            ai_service = await get_ai_service_async()
+            conversation, conversation_history = await _load_conversation(request)
+
+            extracted_params = await ai_service.extract_donation_parameters_async(
+                request.query,
+                conversation_history
+            )
+            extracted_params = {k: v for k, v in extracted_params.items() if v is not None}
+
+            followup_question = None
+            for raw_key in ("_raw_ai_response", "_raw_ai_error", "_fallback_reply"):
+                if raw_key in extracted_params:
+                    followup_question = extracted_params.pop(raw_key)
+                    break
+
+            required_fields = ["resource_type", "target_counties"]
+            params_for_check = extracted_params
+            if conversation is not None:
+                from app.core.conversation_store import merge_params
+                params_for_check = merge_params(conversation.params, extracted_params)
+            is_params_complete = all(params_for_check.get(field) for field in required_fields)
+            yield format_sse("params", {
+                "extracted_params": extracted_params,
+                "is_complete": is_params_complete,
+                "session_id": conversation.session_id if conversation else None
+            })
+
+            if followup_question is None:
+                parts = []
+                async for text in ai_service.stream_followup_question_async(
+                    extracted_params,
+                    conversation_history
+                ):
+                    parts.append(text)
+                    yield format_sse("token", {"text": text})
+                followup_question = "".join(parts).strip()
+            else:
+                yield format_sse("token", {"text": followup_question})
+
+            await _save_conversation_turn(conversation, request.query, followup_question, extracted_params)
+            yield format_sse("done", {
+                "extracted_params": extracted_params,
+                "followup_question": followup_question,
+                "is_complete": is_params_complete,
+                "session_id": conversation.session_id if conversation else None,
+                "session_params": conversation.params if conversation else None
+            })
+        except Exception as e:
+            print(f"[API] ❌ 串流參數提取失敗: {type(e).__name__}: {e}")
+            yield format_sse("error", {"detail": f"參數提取失敗: {str(e)}"})
+
+    return sse_response(event_stream())
+
+
 @router.post("/ai/analyze")
 async def analyze_donation_strategy(
     request: AIAnalysisRequest,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     根據用戶參數生成捐贈策略分析報告
     """
     try:
-        from app.core.ai_service import get_ai_service
-        ai_service = get_ai_service()
-        
-        # 從數據庫查詢相關學校數據（省 API 方式）
-        school_data = await query_schools_by_criteria(
-            session,
-            counties=request.user_params.get("target_counties"),
-            area_type=request.user_params.get("area_type"),
-            limit=50  # 限制數量以節省處理時間
-        )
-        
-        # 調試日誌
-        print(f"[AI分析] 用戶參數: {request.user_params}")
-        print(f"[AI分析] 查詢到的學校數: {len(school_data.get('faraway_schools', []))}")
-        print(f"[AI分析] 統計數據: {school_data.get('statistics', {})}")
-        if school_data.get('faraway_schools'):
-            print(f"[AI分析] 學校樣本: {school_data['faraway_schools'][:3]}")
-        
-        # 生成分析報告
-        report = ai_service.generate_analysis_report(
-            request.user_params,
-            school_data,
-            school_data.get("statistics", {})
-        )
-        
-        return {
-            "report": report,
-            "school_data": school_data,
-            "statistics": school_data.get("statistics", {})
-        }
+        from app.core.analysis_jobs import run_donation_analysis
+        user_params = await _resolve_analysis_params(request)
+        return await run_donation_analysis(session, user_params)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -958,3 +1182,94 @@ async def analyze_donation_strategy(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"分析失敗: {str(e)}"
         )
+
+
+@router.post("/ai/analyze/stream")
+async def analyze_donation_strategy_stream(request: AIAnalysisRequest):
+    """
+    /ai/analyze 的 SSE 串流版本
+
+    事件順序：school_data（查詢到的學校與統計）→ token（報告 Markdown 片段，可多次）→ done；
+    失敗時送出 error 事件。
+
+    回應內容在端點函式返回後才開始產生，此時 yield 依賴注入的 session 已經關閉，
+    因此學校查詢在 event_stream 內自行開啟 session，查詢完成即歸還連線，不佔用到報告串流結束
+    """
+    from app.core.sse import format_sse, sse_comment, sse_response
+
+    user_params = await _resolve_analysis_params(request)
+
+    async def event_stream():
+        yield sse_comment("connected")
+        try:
+            from app.core.ai_service import get_ai_service_async
+            ai_service = await get_ai_service_async()
+
+            session_factory = await read_session_factory()
+            async with session_factory() as session:
+                school_data = await query_schools_by_criteria(
+                    session,
+                    counties=user_params.get("target_counties"),
+                    area_type=user_params.get("area_type"),
+                    limit=50
+                )
+            statistics = school_data.get("statistics", {})
+            yield format_sse("school_data", {"school_data": school_data, "statistics": statistics})
+
+            async for text in ai_service.stream_analysis_report_async(
+                user_params,
+                school_data,
+                statistics
+            ):
+                yield format_sse("token", {"text": text})
+
+            yield format_sse("done", {})
+        except Exception as e:
+            print(f"[AI分析] ❌ 串流報告生成失敗: {type(e).__name__}: {e}")
+            yield format_sse("error", {"detail": f"分析失敗: {str(e)}"})
+
+    return sse_response(event_stream())
+
+
+@router.post("/ai/analyze/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_analysis_job(
+    request: AIAnalysisRequest,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    提交背景分析工作，立即回傳 job id
+
+    相同參數已有報告時直接回傳已完成的工作；前端以 GET /ai/analyze/jobs/{job_id} 輪詢結果
+    """
+    from app.core.analysis_jobs import analysis_job_queue, job_to_response
+    user_params = await _resolve_analysis_params(request)
+    job = await analysis_job_queue.submit(session, user_params)
+    return job_to_response(job)
+
+
+@router.get("/ai/analyze/jobs/{job_id}")
+async def get_analysis_job_status(
+    job_id: str,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    查詢背景分析工作的狀態；完成時回傳與 /ai/analyze 相同的報告欄位
+    """
+    from app.core.analysis_jobs import job_to_response
+    from app.crud.analysis_report_crud import get_analysis_job
+
+    try:
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID format"
+        )
+
+    job = await get_analysis_job(session, job_uuid)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis job not found"
+        )
+    return job_to_response(job)
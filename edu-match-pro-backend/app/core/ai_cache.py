@@ -0,0 +1,223 @@
+"""
+AI 回應快取
+以「正規化 prompt + 模型名稱 + 人設雜湊」為鍵快取 Gemini 回應：
+- 第一層：行程內 LRU（含 TTL）
+- 第二層（可選）：SQLite 磁碟快取，重啟後仍可命中，依 TTL 與容量淘汰
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.core.cache import LRUTTLCache, MISSING
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """正規化 prompt：去除頭尾空白並壓縮連續空白，讓排版差異不影響命中"""
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+
+def persona_hash(persona: str) -> str:
+    return hashlib.sha256(persona.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(prompt: str, model_name: str, persona_digest: str) -> str:
+    """產生內容定址的快取鍵"""
+    raw = "\x1f".join([model_name or "", persona_digest, normalize_prompt(prompt)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskResponseCache:
+    """以 SQLite 實作的磁碟快取層（跨重啟保存）"""
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_ai_response_cache_last_access ON ai_response_cache (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM ai_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if created_at + self.ttl_seconds <= now:
+                self._conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE ai_response_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> int:
+        """寫入一筆資料，回傳因容量限制而淘汰的筆數"""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO ai_response_cache (key, value, created_at, last_access, size)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value,
+                    created_at = excluded.created_at,
+                    last_access = excluded.last_access,
+                    size = excluded.size
+                """,
+                (key, value, now, now, size),
+            )
+            evicted = self._evict(now)
+            self._conn.commit()
+            return evicted
+
+    def _evict(self, now: float) -> int:
+        """清除過期資料，並在超過容量時依最久未使用順序淘汰"""
+        cur = self._conn.execute(
+            "DELETE FROM ai_response_cache WHERE created_at <= ?", (now - self.ttl_seconds,)
+        )
+        evicted = cur.rowcount or 0
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_response_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return evicted
+
+        rows = self._conn.execute(
+            "SELECT key, size FROM ai_response_cache ORDER BY last_access ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM ai_response_cache")
+            self._conn.commit()
+
+    def entry_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ai_response_cache").fetchone()[0]
+
+
+class AIResponseCache:
+    """兩層式 AI 回應快取（記憶體 LRU + 可選磁碟層）"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.memory: LRUTTLCache[str] = LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk: Optional[DiskResponseCache] = None
+        if disk_dir:
+            try:
+                self.disk = DiskResponseCache(
+                    os.path.join(disk_dir, "ai_responses.sqlite3"),
+                    ttl_seconds=ttl_seconds,
+                    max_bytes=disk_max_bytes,
+                )
+            except Exception as e:
+                # 磁碟層失敗不影響服務，只退回記憶體快取
+                logger.warning(f"[AI快取] 無法開啟磁碟快取 {disk_dir}: {e}")
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not MISSING:
+            return value
+        if self.disk is None:
+            return None
+        try:
+            value = self.disk.get(key)
+        except Exception as e:
+            logger.warning(f"[AI快取] 讀取磁碟快取失敗: {e}")
+            return None
+        if value is None:
+            return None
+        # 回填記憶體層
+        self.disk_hits += 1
+        self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        if self.disk is None:
+            return
+        try:
+            self.disk_evictions += self.disk.set(key, value)
+        except Exception as e:
+            logger.warning(f"[AI快取] 寫入磁碟快取失敗: {e}")
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        memory_stats = self.memory.stats_dict()
+        # 記憶體未命中但磁碟命中時，整體仍視為命中
+        hits = memory_stats["hits"] + self.disk_hits
+        misses = memory_stats["misses"] - self.disk_hits
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "memory": memory_stats,
+            "disk": {
+                "enabled": self.disk is not None,
+                "hits": self.disk_hits,
+                "evictions": self.disk_evictions,
+                "entries": self.disk.entry_count() if self.disk is not None else 0,
+            },
+        }
+
+
+def create_ai_response_cache() -> Optional[AIResponseCache]:
+    """依設定建立 AI 回應快取；停用時回傳 None"""
+    if not settings.ai_cache_enabled:
+        return None
+    return AIResponseCache(
+        max_entries=settings.ai_cache_max_entries,
+        ttl_seconds=settings.ai_cache_ttl_seconds,
+        disk_dir=settings.ai_cache_dir,
+        disk_max_bytes=settings.ai_cache_disk_max_mb * 1024 * 1024,
+    )
@@ -0,0 +1,189 @@
+"""
+本地假模型後端（AI_BACKEND=fake）
+不連網、可重現的 Gemini 替身，用於離線壓測 /ai/* 端點：
+- 可設定的延遲分佈（fixed / uniform / lognormal）
+- 依機率注入 429（配額）與 403（金鑰洩露）錯誤，錯誤訊息與 Gemini 相同，會觸發金鑰池的冷卻
+- 依 prompt 類型回傳固定的回應內容
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.ai_key_pool import GeminiKeyPool, KeyState
+from app.core.ai_model_catalog import ModelCatalog
+from app.core.ai_service import ModelBackend
+from app.core.config import settings
+
+FAKE_MODELS = ["models/gemini-2.5-flash", "models/gemini-2.0-flash"]
+
+RATE_LIMIT_ERROR = "429 Resource has been exhausted (e.g. check quota). retry_delay { seconds: 5 }"
+LEAKED_KEY_ERROR = "403 Your API key was reported as leaked. Please use another API key."
+
+# 依 prompt 類型回傳的固定內容
+CANNED_RESPONSES: Dict[str, str] = {
+    "combined": json.dumps({
+        "params": {
+            "resource_type": "電腦",
+            "quantity": 20,
+            "target_counties": ["臺東縣"],
+            "target_school_level": "國小",
+            "priority_focus": None,
+            "area_type": None,
+        },
+        "reply": "好的，我了解您想捐 20 台電腦給臺東縣的國小。還有其他想法嗎？確認的話我就幫您準備分析報告。",
+    }, ensure_ascii=False),
+    "extraction": json.dumps({
+        "resource_type": "電腦",
+        "quantity": 20,
+        "target_counties": ["臺東縣"],
+        "target_school_level": "國小",
+        "priority_focus": None,
+        "area_type": None,
+    }, ensure_ascii=False),
+    "report": (
+        "## 捐贈策略分析報告\n\n"
+        "### 一、需求概況\n臺東縣偏遠地區國小的數位設備仍有明顯缺口。\n\n"
+        "### 二、建議分配\n優先考慮極偏與特偏學校，每校 2 至 4 台。\n\n"
+        "### 三、預期影響\n約可服務 300 名學生，提升數位學習機會。\n"
+    ),
+    "followup": "了解！請問您希望捐給哪些縣市的學校呢？",
+}
+
+
+def classify_prompt(prompt: str) -> str:
+    """依提示詞內容判斷是哪一種調用（對應 AIService 的各個 prompt builder）"""
+    if '"params"' in prompt and '"reply"' in prompt:
+        return "combined"
+    if "提取捐贈資訊" in prompt:
+        return "extraction"
+    if "撰寫捐贈策略分析報告" in prompt:
+        return "report"
+    return "followup"
+
+
+@dataclass
+class FakeChunk:
+    text: str
+
+
+@dataclass
+class FakeResponse:
+    text: str
+
+
+class FakeModelBackend(ModelBackend):
+    """假模型後端：提供與 Gemini 後端相同的 load_catalog / get_model 介面"""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_ms: float = 800,
+        distribution: str = "lognormal",
+        sigma: float = 0.5,
+        rate_limit_rate: float = 0.0,
+        leaked_key_rate: float = 0.0,
+        seed: Optional[int] = None,
+        responses: Optional[Dict[str, str]] = None,
+        stream_chunks: int = 8,
+    ):
+        self.latency_ms = max(0.0, latency_ms)
+        self.distribution = distribution
+        self.sigma = max(0.0, sigma)
+        self.rate_limit_rate = rate_limit_rate
+        self.leaked_key_rate = leaked_key_rate
+        self.responses = {**CANNED_RESPONSES, **(responses or {})}
+        self.stream_chunks = max(1, stream_chunks)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.injected_errors = 0
+
+    def load_catalog(self, key_pool: GeminiKeyPool) -> ModelCatalog:
+        return ModelCatalog(models=list(FAKE_MODELS), fetched_at=time.time(), source="fake")
+
+    def get_model(self, key_pool: GeminiKeyPool, key: KeyState, model_name: str) -> "FakeModel":
+        return FakeModel(self, key, model_name)
+
+    def sample_latency(self) -> float:
+        """依設定的分佈抽樣一次延遲（秒）"""
+        with self._lock:
+            if self.distribution == "fixed":
+                ms = self.latency_ms
+            elif self.distribution == "uniform":
+                spread = self.latency_ms * self.sigma
+                ms = self._random.uniform(self.latency_ms - spread, self.latency_ms + spread)
+            else:
+                # lognormal：latency_ms 為中位數，sigma 控制長尾
+                ms = self.latency_ms * math.exp(self._random.gauss(0, self.sigma))
+        return max(0.0, ms) / 1000
+
+    def maybe_raise(self) -> None:
+        """依設定機率注入錯誤"""
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            if roll < self.leaked_key_rate:
+                self.injected_errors += 1
+                raise RuntimeError(LEAKED_KEY_ERROR)
+            if roll < self.leaked_key_rate + self.rate_limit_rate:
+                self.injected_errors += 1
+                raise RuntimeError(RATE_LIMIT_ERROR)
+
+    def respond(self, prompt: str) -> str:
+        return self.responses[classify_prompt(prompt)]
+
+    def split_chunks(self, text: str) -> List[str]:
+        size = max(1, math.ceil(len(text) / self.stream_chunks))
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeModel:
+    """模擬 genai.GenerativeModel 的 generate_content / generate_content_async"""
+
+    def __init__(self, backend: FakeModelBackend, key: KeyState, model_name: str):
+        self.backend = backend
+        self.key = key
+        self.model_name = model_name
+
+    def generate_content(self, prompt: str) -> FakeResponse:
+        time.sleep(self.backend.sample_latency())
+        self.backend.maybe_raise()
+        return FakeResponse(self.backend.respond(prompt))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False) -> Any:
+        latency = self.backend.sample_latency()
+        if not stream:
+            await asyncio.sleep(latency)
+            self.backend.maybe_raise()
+            return FakeResponse(self.backend.respond(prompt))
+
+        # 串流：約三成延遲花在第一個片段之前，其餘平均分散在後續片段
+        await asyncio.sleep(latency * 0.3)
+        self.backend.maybe_raise()
+        chunks = self.backend.split_chunks(self.backend.respond(prompt))
+        gap = latency * 0.7 / len(chunks)
+
+        async def iterate():
+            for text in chunks:
+                yield FakeChunk(text)
+                await asyncio.sleep(gap)
+
+        return iterate()
+
+
+def create_fake_backend() -> FakeModelBackend:
+    """依設定建立假模型後端"""
+    return FakeModelBackend(
+        latency_ms=settings.ai_fake_latency_ms,
+        distribution=settings.ai_fake_latency_distribution,
+        sigma=settings.ai_fake_latency_sigma,
+        rate_limit_rate=settings.ai_fake_rate_limit_rate,
+        leaked_key_rate=settings.ai_fake_leaked_key_rate,
+        seed=settings.ai_fake_seed,
+    )
@@ -0,0 +1,395 @@
+"""
+Gemini API 金鑰池
+將請求以輪詢方式分散到所有已設定的金鑰，每把金鑰各自擁有：
+- 獨立的 API client（金鑰以 client_options 傳入，不修改全域的 genai.configure 狀態）
+- 客戶端令牌桶限流（每分鐘請求數 + 突發容量）
+- 429 後依模型分別冷卻（配額按模型計算）、403 後整把金鑰冷卻
+- 熔斷器（連續失敗達門檻後暫停使用，逾時後以單一試探請求恢復）
+- 延遲與錯誤統計
+"""
+import asyncio
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+
+from app.core.config import settings
+
+
+class KeyPoolExhaustedError(ValueError):
+    """在等待上限內沒有任何金鑰可用（與其他金鑰耗盡錯誤一樣是 ValueError）"""
+
+
+# 429 回應中建議的重試秒數，例如 "retry_delay { seconds: 37 }" 或 "Please retry in 12.5s"
+_RETRY_DELAY_RE = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)|retry in\s+([\d.]+)\s*s", re.IGNORECASE)
+
+
+def parse_retry_delay(error_msg: str) -> Optional[float]:
+    """從錯誤訊息解析伺服器建議的等待秒數，解析不到時回傳 None"""
+    match = _RETRY_DELAY_RE.search(error_msg)
+    if not match:
+        return None
+    value = match.group(1) or match.group(2)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """令牌桶限流器：以固定速率補充令牌，容量即允許的突發請求數"""
+
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate_per_second = max(rate_per_minute, 0.001) / 60.0
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_second)
+            self._updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """取得一個令牌前需要等待的秒數（0 表示現在就有令牌）"""
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate_per_second
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self._tokens -= 1
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class BreakerState:
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+@dataclass
+class KeyState:
+    """單一金鑰的狀態與統計"""
+    index: int
+    api_key: str
+    bucket: TokenBucket
+    cooldown_until: float = 0.0
+    cooldown_reason: Optional[str] = None
+    breaker_state: str = BreakerState.closed
+    breaker_opened_at: float = 0.0
+    consecutive_failures: int = 0
+    # half-open 狀態下是否已有試探請求在進行
+    probe_in_flight: bool = False
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    rate_limited: int = 0
+    forbidden: int = 0
+    total_latency: float = 0.0
+    avg_latency_ms: Optional[float] = None
+    last_error: Optional[str] = None
+    # 429 冷卻依模型分別記錄：模型名稱 -> 冷卻結束時間
+    model_cooldowns: Dict[str, float] = field(default_factory=dict)
+    _clients: Dict[str, Any] = field(default_factory=dict, repr=False)
+    _models: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def label(self) -> str:
+        """不暴露完整金鑰的顯示名稱"""
+        return f"key#{self.index + 1} (...{self.api_key[-4:]})"
+
+    def client(self, kind: str):
+        """
+        每把金鑰一組 API client（首次使用時建立）
+
+        Args:
+            kind: generative、generative_async 或 model
+        """
+        client = self._clients.get(kind)
+        if client is None:
+            client_class = {
+                "generative": glm.GenerativeServiceClient,
+                "generative_async": glm.GenerativeServiceAsyncClient,
+                "model": glm.ModelServiceClient,
+            }[kind]
+            client = client_class(client_options={"api_key": self.api_key})
+            self._clients[kind] = client
+        return client
+
+    def cooldown_remaining(self, now: float, model_name: Optional[str] = None) -> float:
+        """金鑰（以及指定模型）還要冷卻多久"""
+        until = self.cooldown_until
+        if model_name is not None:
+            until = max(until, self.model_cooldowns.get(model_name, 0.0))
+        return max(0.0, until - now)
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "key": self.label,
+            "breaker": self.breaker_state,
+            "cooldown_remaining": round(self.cooldown_remaining(now), 1),
+            "model_cooldowns": {
+                name: round(until - now, 1) for name, until in self.model_cooldowns.items() if until > now
+            },
+            "tokens": round(self.bucket.tokens, 2),
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "forbidden": self.forbidden,
+            "error_rate": round(self.failures / self.requests, 4) if self.requests else 0.0,
+            "avg_latency_ms": round(self.avg_latency_ms, 1) if self.avg_latency_ms is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class GeminiKeyModel:
+    """
+    綁定單一金鑰的 Gemini 模型
+
+    以該金鑰的 generativelanguage client 發送請求，回應包裝成 genai 的 response 型別（提供 .text），
+    介面與 genai.GenerativeModel 的 generate_content / generate_content_async 相同
+    """
+
+    def __init__(self, key: KeyState, model_name: str):
+        self.key = key
+        self.model_name = model_name
+
+    def _request(self, prompt: str) -> glm.GenerateContentRequest:
+        return glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])]
+        )
+
+    def generate_content(self, prompt: str):
+        response = self.key.client("generative").generate_content(request=self._request(prompt))
+        return genai.types.GenerateContentResponse.from_response(response)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        client = self.key.client("generative_async")
+        if stream:
+            iterator = await client.stream_generate_content(request=self._request(prompt))
+            return await genai.types.AsyncGenerateContentResponse.from_aiterator(iterator)
+        response = await client.generate_content(request=self._request(prompt))
+        return genai.types.AsyncGenerateContentResponse.from_response(response)
+
+
+class GeminiKeyPool:
+    """
+    以輪詢方式分配金鑰的排程器（執行緒安全，同步與非同步路徑共用）
+
+    每次 acquire 從上次的下一把金鑰開始，挑選第一把「未冷卻（含指定模型的 429 冷卻）、熔斷器允許、
+    令牌桶有令牌」的金鑰；
+    全部不可用時等待最早恢復的那一把，超過 acquire_timeout 則拋出 KeyPoolExhaustedError。
+    """
+
+    # 延遲統計的指數移動平均權重
+    LATENCY_EWMA_ALPHA = 0.2
+
+    def __init__(
+        self,
+        api_keys: List[str],
+        rate_per_minute: float = 10,
+        burst: int = 3,
+        cooldown_seconds: float = 60,
+        forbidden_cooldown_seconds: float = 3600,
+        breaker_threshold: int = 5,
+        breaker_reset_seconds: float = 30,
+        acquire_timeout: float = 30,
+    ):
+        if not api_keys:
+            raise ValueError("金鑰池至少需要一把 API 金鑰")
+        self.keys = [
+            KeyState(index=i, api_key=key, bucket=TokenBucket(rate_per_minute, burst))
+            for i, key in enumerate(api_keys)
+        ]
+        self.cooldown_seconds = cooldown_seconds
+        self.forbidden_cooldown_seconds = forbidden_cooldown_seconds
+        self.breaker_threshold = max(1, breaker_threshold)
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.acquire_timeout = acquire_timeout
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _availability(self, key: KeyState, now: float, model_name: Optional[str] = None) -> float:
+        """金鑰（用於指定模型時）還要多久才可用（0 表示現在可用）"""
+        if key.breaker_state == BreakerState.open:
+            reopen_in = key.breaker_opened_at + self.breaker_reset_seconds - now
+            if reopen_in > 0:
+                return reopen_in
+            key.breaker_state = BreakerState.half_open
+            key.probe_in_flight = False
+        if key.breaker_state == BreakerState.half_open and key.probe_in_flight:
+            # 等待試探請求的結果
+            return self.breaker_reset_seconds
+        return max(key.cooldown_remaining(now, model_name), key.bucket.wait_time(now))
+
+    def try_acquire(self, model_name: Optional[str] = None) -> Tuple[Optional[KeyState], float]:
+        """
+        嘗試立即取得一把金鑰
+
+        Args:
+            model_name: 要呼叫的模型（跳過在該模型上 429 冷卻中的金鑰）
+
+        Returns:
+            (金鑰, 0) 或 (None, 最早可用前需等待的秒數)
+        """
+        with self._lock:
+            now = time.monotonic()
+            soonest = float("inf")
+            count = len(self.keys)
+            for offset in range(count):
+                key = self.keys[(self._cursor + offset) % count]
+                wait = self._availability(key, now, model_name)
+                if wait <= 0:
+                    key.bucket.consume(now)
+                    if key.breaker_state == BreakerState.half_open:
+                        key.probe_in_flight = True
+                    key.requests += 1
+                    self._cursor = (key.index + 1) % count
+                    return key, 0.0
+                soonest = min(soonest, wait)
+            return None, soonest
+
+    def acquire(self, model_name: Optional[str] = None) -> KeyState:
+        """取得金鑰（同步版本，必要時以 time.sleep 等待）"""
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            key, wait = self.try_acquire(model_name)
+            if key is not None:
+                return key
+            self._check_deadline(deadline, wait)
+            time.sleep(min(wait, 1.0))
+
+    async def acquire_async(self, model_name: Optional[str] = None) -> KeyState:
+        """取得金鑰（非同步版本，等待期間不阻塞 event loop）"""
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            key, wait = self.try_acquire(model_name)
+            if key is not None:
+                return key
+            self._check_deadline(deadline, wait)
+            await asyncio.sleep(min(wait, 1.0))
+
+    def _check_deadline(self, deadline: float, wait: float) -> None:
+        if time.monotonic() + wait > deadline:
+            raise KeyPoolExhaustedError(
+                f"所有 {len(self.keys)} 個 API 金鑰都在冷卻或限流中（最快 {wait:.0f}s 後恢復）"
+            )
+
+    def model_cooling_down(self, model_name: str) -> bool:
+        """所有金鑰是否都在該模型的 429 冷卻中（此時應改用其他模型，而不是等待）"""
+        with self._lock:
+            now = time.monotonic()
+            return all(key.cooldown_remaining(now, model_name) > 0 for key in self.keys)
+
+    def model_for(self, key: KeyState, model_name: str) -> GeminiKeyModel:
+        """取得綁定在該金鑰 client 上的模型（依模型名稱快取）"""
+        model = key._models.get(model_name)
+        if model is None:
+            model = GeminiKeyModel(key, model_name)
+            key._models[model_name] = model
+        return model
+
+    def list_models(self, key: KeyState):
+        """使用該金鑰列出可用模型"""
+        return key.client("model").list_models(request=glm.ListModelsRequest())
+
+    def record_success(self, key: KeyState, latency: float) -> None:
+        with self._lock:
+            key.successes += 1
+            key.consecutive_failures = 0
+            key.probe_in_flight = False
+            key.breaker_state = BreakerState.closed
+            key.total_latency += latency
+            latency_ms = latency * 1000
+            if key.avg_latency_ms is None:
+                key.avg_latency_ms = latency_ms
+            else:
+                alpha = self.LATENCY_EWMA_ALPHA
+                key.avg_latency_ms = alpha * latency_ms + (1 - alpha) * key.avg_latency_ms
+
+    def record_failure(
+        self,
+        key: KeyState,
+        error_msg: str,
+        kind: str = "error",
+        model_name: Optional[str] = None
+    ) -> None:
+        """
+        記錄一次失敗
+
+        Args:
+            kind: rate_limited（429，依建議秒數或預設值冷卻）、
+                  forbidden（403 / 金鑰洩露，長時間冷卻）、error（其他錯誤，計入熔斷器）
+            model_name: 發生失敗的模型；429 只冷卻該金鑰在這個模型上的使用
+        """
+        with self._lock:
+            now = time.monotonic()
+            key.failures += 1
+            key.probe_in_flight = False
+            key.last_error = error_msg[:200]
+            if kind == "rate_limited":
+                key.rate_limited += 1
+                until = now + (parse_retry_delay(error_msg) or self.cooldown_seconds)
+                if model_name is None:
+                    key.cooldown_until = max(key.cooldown_until, until)
+                    key.cooldown_reason = kind
+                else:
+                    key.model_cooldowns[model_name] = max(key.model_cooldowns.get(model_name, 0.0), until)
+                return
+            if kind == "forbidden":
+                key.forbidden += 1
+                key.cooldown_until = max(key.cooldown_until, now + self.forbidden_cooldown_seconds)
+                key.cooldown_reason = kind
+                return
+
+            key.consecutive_failures += 1
+            if key.breaker_state == BreakerState.half_open or key.consecutive_failures >= self.breaker_threshold:
+                key.breaker_state = BreakerState.open
+                key.breaker_opened_at = now
+
+    def release(self, key: KeyState) -> None:
+        """請求未完成即取消時呼叫，讓 half-open 的金鑰可以再次試探"""
+        with self._lock:
+            key.probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            keys = [key.stats(now) for key in self.keys]
+        return {
+            "key_count": len(keys),
+            "available": sum(
+                1 for k in keys if k["breaker"] != BreakerState.open and k["cooldown_remaining"] == 0
+            ),
+            "requests": sum(k["requests"] for k in keys),
+            "keys": keys,
+        }
+
+
+def create_key_pool(api_keys: List[str]) -> GeminiKeyPool:
+    """依設定建立金鑰池"""
+    return GeminiKeyPool(
+        api_keys,
+        rate_per_minute=settings.ai_key_rpm,
+        burst=settings.ai_key_burst,
+        cooldown_seconds=settings.ai_key_cooldown_seconds,
+        forbidden_cooldown_seconds=settings.ai_key_forbidden_cooldown_seconds,
+        breaker_threshold=settings.ai_key_breaker_threshold,
+        breaker_reset_seconds=settings.ai_key_breaker_reset_seconds,
+        acquire_timeout=settings.ai_key_acquire_timeout_seconds,
+    )
@@ -0,0 +1,105 @@
+"""
+Gemini 模型目錄
+啟動時取得一次支援 generateContent 的模型清單並寫入 JSON 檔；
+檔案在刷新間隔內直接讀取，不再於每次初始化或輪換金鑰時呼叫 list_models
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.core.ai_key_pool import GeminiKeyPool
+from app.core.config import settings
+
+
+@dataclass
+class ModelCatalog:
+    """可用模型清單與其來源"""
+    models: List[str] = field(default_factory=list)
+    fetched_at: float = 0.0
+    # file（讀取快取檔）、remote（剛從 API 取得）、stale_file（API 失敗時退回過期檔案）
+    source: str = "remote"
+
+    def age_seconds(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+
+def read_catalog_file(path: str) -> Optional[ModelCatalog]:
+    """讀取目錄檔；不存在或格式錯誤時回傳 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        models = [m for m in data.get("models", []) if isinstance(m, str)]
+        if not models:
+            return None
+        return ModelCatalog(models=models, fetched_at=float(data.get("fetched_at", 0)), source="file")
+    except (OSError, ValueError, TypeError, AttributeError):
+        return None
+
+
+def write_catalog_file(path: str, catalog: ModelCatalog) -> None:
+    """寫入目錄檔（先寫暫存檔再取代，避免多個 worker 同時寫入時讀到半份檔案）"""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": catalog.fetched_at, "models": catalog.models}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[AI服務] 無法寫入模型目錄 {path}: {e}")
+
+
+def fetch_catalog(key_pool: GeminiKeyPool) -> ModelCatalog:
+    """依序使用金鑰池中的金鑰呼叫 list_models，直到成功為止"""
+    last_error: Optional[Exception] = None
+    for key in key_pool.keys:
+        try:
+            models = [
+                m.name for m in key_pool.list_models(key)
+                if 'generateContent' in getattr(m, 'supported_generation_methods', [])
+            ]
+            print(f"[AI服務] 以 {key.label} 取得 {len(models)} 個可用模型")
+            return ModelCatalog(models=models, fetched_at=time.time(), source="remote")
+        except Exception as e:
+            last_error = e
+            error_msg = str(e).lower()
+            print(f"[AI服務] {key.label} 列出模型失敗: {e}")
+            kind = "forbidden" if any(k in error_msg for k in ['403', 'permission denied', 'leaked']) else "error"
+            key_pool.record_failure(key, error_msg, kind)
+    raise ValueError(f"所有 API 密鑰初始化都失敗: {last_error}")
+
+
+def load_model_catalog(
+    key_pool: GeminiKeyPool,
+    path: Optional[str] = None,
+    refresh_seconds: Optional[float] = None,
+) -> ModelCatalog:
+    """
+    取得模型目錄
+
+    目錄檔在刷新間隔內直接使用；過期或不存在時重新取得並寫回。
+    重新取得失敗但仍有過期檔案時，退回使用過期的清單。
+    """
+    if path is None:
+        path = settings.ai_model_catalog_path
+    if refresh_seconds is None:
+        refresh_seconds = settings.ai_model_catalog_refresh_hours * 3600
+
+    cached = read_catalog_file(path) if path else None
+    if cached and cached.age_seconds() < refresh_seconds:
+        print(f"[AI服務] 使用模型目錄快取 {path}（{len(cached.models)} 個模型）")
+        return cached
+
+    try:
+        catalog = fetch_catalog(key_pool)
+    except ValueError:
+        if cached:
+            print(f"[AI服務] 無法更新模型目錄，沿用過期的快取 {path}")
+            cached.source = "stale_file"
+            return cached
+        raise
+
+    if path and catalog.models:
+        write_catalog_file(path, catalog)
+    return catalog
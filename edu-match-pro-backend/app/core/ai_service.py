@@ -6,11 +6,134 @@ import os
 import json
 import re
 import time
+import asyncio
 import logging
+import threading
 import traceback
-from typing import Dict, Any, List, Optional
-import google.generativeai as genai
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from app.core.config import settings
+from app.core.ai_cache import create_ai_response_cache, make_cache_key, persona_hash
+from app.core.ai_key_pool import GeminiKeyPool, KeyState, create_key_pool
+from app.core.ai_model_catalog import ModelCatalog, load_model_catalog
+from app.core.prompt_builder import (
+    compact_params, compact_table, fit_rows_to_budget, format_history, prompt_metrics
+)
+
+
+# 追問生成（含 fallback）全部失敗時的固定回覆
+FOLLOWUP_FALLBACK_REPLY = "抱歉，我剛恍神了，可以再說一次嗎？"
+
+
+def _extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
+    """嘗試從 text 中抽出 JSON 物件或陣列並解析返回 dict（失敗回傳 None）。"""
+    # 1) 移除常見 code block 標記
+    t = text.strip()
+    # 若包含 ```json ... ```，抽取中間部分
+    m = re.search(r"```json\s*(.*?)\s*```", t, re.S | re.I)
+    if m:
+        candidate = m.group(1).strip()
+        try:
+            return json.loads(candidate)
+        except Exception:
+            pass
+
+    # 2) 若包含 ``` ... ``` 無指定語法，抽取中間部分
+    m = re.search(r"```\s*(.*?)\s*```", t, re.S)
+    if m:
+        candidate = m.group(1).strip()
+        try:
+            return json.loads(candidate)
+        except Exception:
+            pass
+
+    # 3) 嘗試找出第一個 { ... } 的區塊（從第一個 { 到最後一個 }）
+    if '{' in t and '}' in t:
+        first = t.find('{')
+        last = t.rfind('}')
+        if first < last:
+            candidate = t[first:last+1]
+            # 嘗試修正常見單引號情況
+            try:
+                return json.loads(candidate)
+            except Exception:
+                # 嘗試用替換單引號為雙引號後解析（謹慎）
+                cand2 = candidate.replace("\'", '"')
+                try:
+                    return json.loads(cand2)
+                except Exception:
+                    pass
+
+    # 4) 嘗試找出第一個 [ ... ] 的區塊
+    if '[' in t and ']' in t:
+        first = t.find('[')
+        last = t.rfind(']')
+        if first < last:
+            candidate = t[first:last+1]
+            try:
+                parsed = json.loads(candidate)
+                # 若是 list 轉成 dict under a key
+                return {"_list_result": parsed}
+            except Exception:
+                pass
+
+    return None
+
+
+def _log_followup_failure(e: Exception) -> None:
+    """輸出追問生成失敗的診斷資訊"""
+    print(f"[AI生成失敗] 錯誤類型: {type(e).__name__}")
+    print(f"[AI生成失敗] 錯誤訊息: {str(e)}")
+    print(f"[AI生成失敗] 完整錯誤:\n{traceback.format_exc()}")
+
+
+class ModelBackend(ABC):
+    """
+    模型後端介面
+    
+    AIService 透過後端取得模型目錄與「綁定某把金鑰的模型」，模型需提供
+    generate_content(prompt) 與 generate_content_async(prompt, stream=False)。
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    def load_catalog(self, key_pool: GeminiKeyPool) -> ModelCatalog:
+        """載入可用的模型目錄"""
+    
+    @abstractmethod
+    def get_model(self, key_pool: GeminiKeyPool, key: KeyState, model_name: str):
+        """取得綁定指定金鑰的模型"""
+
+
+@dataclass
+class ServedModel:
+    """實際回應本次調用的模型（預設為主要模型；重試迴圈改用備援模型成功時更新）"""
+    model_name: str
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini API（預設）"""
+    
+    name = "gemini"
+    
+    def load_catalog(self, key_pool: GeminiKeyPool) -> ModelCatalog:
+        return load_model_catalog(key_pool)
+    
+    def get_model(self, key_pool: GeminiKeyPool, key: KeyState, model_name: str):
+        return key_pool.model_for(key, model_name)
+
+
+def create_model_backend(name: Optional[str] = None) -> ModelBackend:
+    """依設定建立模型後端（gemini 或離線壓測用的 fake）"""
+    name = (name or settings.ai_backend).lower()
+    if name == "fake":
+        from app.core.ai_fake_backend import create_fake_backend
+        return create_fake_backend()
+    if name != "gemini":
+        raise ValueError(f"未知的 AI_BACKEND: {name}")
+    return GeminiBackend()
 
 
 class AIService:
@@ -50,129 +173,168 @@ class AIService:
 
 重要：對話時使用純文字，不要用 Markdown 格式（不要用 ** 粗體、不要用 * 列表、不要用 # 標題）。"""
     
-    def __init__(self):
-        """初始化 AI 服務（支援多API密鑰輪換）"""
+    # 精簡人設：用於不需要對話個性的調用（參數提取、報告），節省提示詞長度
+    PERSONA_BRIEF = """你是「小匯」，智匯偏鄉平台的AI教育公益顧問。智匯偏鄉是台灣專為偏鄉教育設計的資源媒合平台，連接學校的教育需求與企業的社會責任。
+你熟悉台灣偏鄉教育現況，以專業顧問的口吻自信地提供建議，優先使用提供的真實數據。"""
+    
+    def __init__(self, backend: Optional[ModelBackend] = None, api_keys: Optional[List[str]] = None):
+        """
+        初始化 AI 服務（支援多API密鑰輪換）
+        
+        Args:
+            backend: 模型後端（預設依 AI_BACKEND 建立）
+            api_keys: API 金鑰（預設讀取 GEMINI_API_KEY 等設定）
+        """
+        self.backend = backend or create_model_backend()
+        
         # 從 settings 獲取所有 API 金鑰
-        self.api_keys = settings.get_gemini_api_keys()
+        self.api_keys = list(api_keys) if api_keys is not None else settings.get_gemini_api_keys()
+        if not self.api_keys and self.backend.name == "fake":
+            # 假模型後端不需要真的金鑰，仍以多把假金鑰走完整的金鑰池流程
+            self.api_keys = [f"fake-key-{i + 1:04d}" for i in range(max(1, settings.ai_fake_key_count))]
         if not self.api_keys:
             raise ValueError("未設置任何 GEMINI_API_KEY 環境變量或配置")
         
-        self.current_key_index = 0
-        self.model = None
+        # 金鑰池：請求輪詢分散到所有金鑰，各自限流、冷卻與熔斷
+        self.key_pool = create_key_pool(self.api_keys)
         # 優先模型，可由環境變量覆蓋
         self.forced_model_name = os.environ.get('GEMINI_PREFERRED_MODEL', 'models/gemini-2.5-flash')
         
-        # 嘗試使用第一個可用的 API 金鑰初始化
-        self._initialize_with_current_key()
+        # 回應快取（鍵：正規化 prompt + 模型名稱 + 人設雜湊）
+        self.response_cache = create_ai_response_cache()
+        self._persona_digest = persona_hash(self.PERSONA)
+        
+        # 非同步調用的並發上限（避免單一 worker 同時打出過多 Gemini 請求）
+        self._call_semaphore = asyncio.Semaphore(max(1, settings.ai_max_concurrency))
+        
+        # 模型目錄：優先讀取目錄檔，過期才呼叫 list_models；切換模型時只查這份清單
+        self.model_catalog = self.backend.load_catalog(self.key_pool)
+        self.available_models = self.model_catalog.models
+        self.model_name = self._select_model(self.available_models)
         
         # 設定 logger
         self.logger = logging.getLogger(__name__)
         self.logger.info(f"[AI服務] 已初始化，使用模型: {self.model_name}，可用API密鑰數: {len(self.api_keys)}")
+        print(f"[AI服務] 使用模型: {self.model_name}（模型目錄來源: {self.model_catalog.source}）")
     
-    def _initialize_with_current_key(self):
-        """使用當前索引的API密鑰初始化模型"""
-        if self.current_key_index >= len(self.api_keys):
-            raise ValueError("所有 API 密鑰都已達到限制")
-        
-        api_key = self.api_keys[self.current_key_index]
-        genai.configure(api_key=api_key)
-        
-        # 選擇模型
-        try:
-            # 取得所有支援 generateContent 的模型，並儲存為實例可用模型列表
-            available_models = [
-                m.name for m in genai.list_models()
-                if 'generateContent' in getattr(m, 'supported_generation_methods', [])
-            ]
-            self.available_models = available_models
-
-            # 擴充預設偏好模型（優先使用 2.5 版本，再回落到 2.0）
-            preferred_models = [
-                'models/gemini-2.5-flash', 'models/gemini-2.5-pro',
-                'models/gemini-2.0-flash-exp', 'models/gemini-2.0-flash',
-                'models/gemini-1.5-flash', 'models/gemini-1.5-pro'
-            ]
-
-            model_name = None
-
-            # 如果有外部強制模型名稱，且可用則優先使用
-            forced = getattr(self, 'forced_model_name', None)
-            if forced and forced in available_models:
-                model_name = forced
-
-            if not model_name:
-                for preferred in preferred_models:
-                    if preferred in available_models:
-                        model_name = preferred
-                        break
-
-            if not model_name:
-                model_name = available_models[0] if available_models else 'models/gemini-pro'
-
-            self.model = genai.GenerativeModel(model_name)
-            self.model_name = model_name
-            print(f"[AI服務] 使用API密鑰 #{self.current_key_index + 1}，模型: {self.model_name}")
-        except Exception as e:
-            print(f"[AI服務] API密鑰 #{self.current_key_index + 1} 初始化失敗: {e}")
-            # 嘗試下一個密鑰
-            self.current_key_index += 1
-            if self.current_key_index < len(self.api_keys):
-                print(f"[AI服務] 切換到API密鑰 #{self.current_key_index + 1}")
-                self._initialize_with_current_key()
-            else:
-                raise ValueError("所有 API 密鑰初始化都失敗")
+    def _select_model(self, available_models: List[str]) -> str:
+        """從模型目錄中選擇要使用的模型（不需要網路）"""
+        # 擴充預設偏好模型（優先使用 2.5 版本，再回落到 2.0）
+        preferred_models = [
+            'models/gemini-2.5-flash', 'models/gemini-2.5-pro',
+            'models/gemini-2.0-flash-exp', 'models/gemini-2.0-flash',
+            'models/gemini-1.5-flash', 'models/gemini-1.5-pro'
+        ]
+
+        # 如果有外部強制模型名稱，且可用則優先使用
+        forced = getattr(self, 'forced_model_name', None)
+        if forced and forced in available_models:
+            return forced
+
+        for preferred in preferred_models:
+            if preferred in available_models:
+                return preferred
+
+        return available_models[0] if available_models else 'models/gemini-pro'
+
+    def _next_model_for_call(self, model_name: str, tried: List[str]) -> Optional[str]:
+        """
+        目錄中下一個本次調用尚未嘗試的模型（從目前模型往後輪換；沒有時回傳 None）
+
+        模型只在單次調用內切換，不修改共用的 self.model_name，也不清除任何金鑰的冷卻
+        """
+        models = self.available_models
+        start = models.index(model_name) + 1 if model_name in models else 0
+        for candidate in models[start:] + models[:start]:
+            if candidate not in tried:
+                return candidate
+        return None
+
+    def _model_for_attempt(
+        self,
+        model_name: str,
+        tried: List[str],
+        attempts: int,
+        max_retries: int,
+        last_error: Optional[Exception]
+    ) -> Tuple[str, int]:
+        """
+        決定下一次嘗試使用的模型與重試次數
+
+        目前模型已用所有金鑰重試過，或所有金鑰都在該模型的 429 冷卻中時，改用下一個模型
+        （配額按模型計算，有機會某模型仍有配額）；重試次數用完且沒有其他模型時拋出 ValueError
+        """
+        exhausted = attempts >= max_retries
+        if not exhausted and not self.key_pool.model_cooling_down(model_name):
+            return model_name, attempts
+
+        next_model = self._next_model_for_call(model_name, tried)
+        if next_model is not None:
+            tried.append(next_model)
+            self.logger.info(f"[AI服務] {model_name} 的所有 API 金鑰皆受限，本次調用改用模型: {next_model}")
+            return next_model, 0
+        if exhausted:
+            raise ValueError(f"所有 {len(self.api_keys)} 個API密鑰都已達到限制或失敗: {last_error}")
+        # 沒有其他模型可用，交由金鑰池等待冷卻結束
+        return model_name, attempts
+
+    def _model_for(self, key: KeyState, model_name: str):
+        """取得綁定該金鑰的指定模型"""
+        return self.backend.get_model(self.key_pool, key, model_name)
     
-    def _switch_to_next_key(self):
-        """切換到下一個API密鑰"""
-        self.current_key_index += 1
-        if self.current_key_index >= len(self.api_keys):
-            print(f"[AI服務] 所有 {len(self.api_keys)} 個API密鑰都已嘗試")
-            return False
-        
-        print(f"[AI服務] 切換到API密鑰 #{self.current_key_index + 1}/{len(self.api_keys)}")
-        try:
-            self._initialize_with_current_key()
-            return True
-        except Exception as e:
-            print(f"[AI服務] 切換失敗: {e}")
-            return False
+    def _classify_key_error(self, error_msg: str) -> Optional[str]:
+        """
+        判斷錯誤是否屬於金鑰層級的問題（需要換一把金鑰）
+        
+        Returns:
+            "rate_limited"（速率限制/配額）、"forbidden"（授權錯誤或金鑰洩露），其他錯誤回傳 None
+        """
+        if any(k in error_msg for k in ['403', 'permission denied', 'forbidden', 'leaked', 'reported as leaked', 'api key was reported']):
+            return "forbidden"
+        if any(k in error_msg for k in ['429', 'quota', 'rate limit', 'resource exhausted', 'rate_limited']):
+            return "rate_limited"
+        return None
 
-    def _switch_to_next_model(self) -> bool:
-        """切換到下一個可用模型（輪換 self.available_models）。"""
-        if not hasattr(self, 'available_models') or not self.available_models:
-            return False
+    def _handle_call_failure(self, error: Exception, key: KeyState, model_name: str, attempts: int) -> int:
+        """
+        處理一次調用失敗（同步與非同步路徑共用）
+        
+        失敗會記錄到該金鑰的狀態（429 依模型冷卻、403 整把金鑰冷卻、其他錯誤計入熔斷），
+        下一次 acquire 自動改用其他金鑰，等待時間由金鑰池的令牌桶與冷卻時間決定，這裡不再額外退避。
+        
+        Args:
+            error: 調用時拋出的異常
+            key: 本次使用的金鑰
+            model_name: 本次使用的模型
+            attempts: 目前已重試次數
+        
+        Returns:
+            更新後的重試次數；無法重試時直接拋出異常
+        """
+        error_msg = str(error).lower()
 
-        try:
-            current = getattr(self, 'model_name', None)
-            idx = self.available_models.index(current) if current in self.available_models else -1
-        except Exception:
-            idx = -1
+        # 記錄完整錯誤以便除錯
+        self.logger.warning(f"[AI服務] 調用失敗（{key.label}）: {error_msg}")
+        self.logger.debug(traceback.format_exc())
 
-        # 循環尋找下一個模型，若只有一個則回傳 False
-        if len(self.available_models) <= 1:
-            return False
+        kind = self._classify_key_error(error_msg)
+        self.key_pool.record_failure(key, error_msg, kind or "error", model_name)
+        if kind is None:
+            # 其他類型的錯誤，直接拋出以便上層處理
+            self.logger.error(f"[AI服務] 無法處理的錯誤: {error_msg}")
+            raise error
 
-        next_idx = (idx + 1) % len(self.available_models)
-        if next_idx == idx:
-            return False
+        self.logger.info(f"[AI服務] {key.label} 暫時不可用（{kind}），改用其他金鑰重試...")
+        return attempts + 1
 
-        next_model = self.available_models[next_idx]
-        try:
-            self.model = genai.GenerativeModel(next_model)
-            self.model_name = next_model
-            print(f"[AI服務] 已切換模型到: {next_model}")
-            return True
-        except Exception as e:
-            print(f"[AI服務] 切換模型失敗: {e}")
-            return False
-    
-    def _call_with_retry(self, prompt: str, max_retries: int = None) -> str:
+    def _call_with_retry(self, prompt: str, max_retries: int = None, served: Optional[ServedModel] = None) -> str:
         """
-        使用重試機制調用API（自動切換密鑰）
+        使用重試機制調用API（由金鑰池分配金鑰，同步版本，供 scripts 使用）
         
         Args:
             prompt: 提示詞
             max_retries: 最大重試次數（None表示嘗試所有密鑰）
+            served: 成功時記錄實際回應的模型
         
         Returns:
             API回應文本
@@ -180,74 +342,228 @@ class AIService:
         if max_retries is None:
             max_retries = len(self.api_keys)
         
+        model_name = self.model_name
+        tried = [model_name]
         attempts = 0
         last_error = None
 
-        while attempts < max_retries:
+        while True:
+            model_name, attempts = self._model_for_attempt(model_name, tried, attempts, max_retries, last_error)
+            key = self.key_pool.acquire(model_name)
+            started = time.monotonic()
             try:
-                response = self.model.generate_content(prompt)
-                return response.text
+                response = self._model_for(key, model_name).generate_content(prompt)
+                text = response.text
             except Exception as e:
                 last_error = e
-                error_msg = str(e).lower()
-
-                # 記錄完整錯誤以便除錯
-                tb = traceback.format_exc()
-                self.logger.warning(f"[AI服務] 調用失敗（key #{self.current_key_index + 1}）: {error_msg}")
-                self.logger.debug(tb)
-
-                # 如果是速率限制或配額、或金鑰被舉報洩露/授權錯誤，嘗試切換金鑰並重試
-                if any(k in error_msg for k in ['429', 'quota', 'rate limit', 'resource exhausted', 'rate_limited'] ) \
-                   or any(k in error_msg for k in ['403', 'permission denied', 'forbidden', 'leaked', 'reported as leaked', 'api key was reported']):
-                    self.logger.info(f"[AI服務] API密鑰 #{self.current_key_index + 1} 看似不可用（{error_msg[:200]}），嘗試切換金鑰...")
-                    # 嘗試切換到下一個密鑰
-                    if self._switch_to_next_key():
-                        attempts += 1
-                        # 指數退避
-                        sleep_time = min(2 ** attempts, 30)
-                        self.logger.info(f"[AI服務] 等待 {sleep_time}s 後重試 (attempt {attempts}/{max_retries})")
-                        time.sleep(sleep_time)
-                        continue
-                    else:
-                        # 如果所有金鑰都嘗試過，嘗試切換模型再重試（有機會某模型在某專案/金鑰上無配額）
-                        self.logger.info("[AI服務] 所有 API 金鑰已嘗試，嘗試切換模型後重試...")
-                        if self._switch_to_next_model():
-                            # 重置 key index 並從頭嘗試
-                            self.current_key_index = 0
-                            attempts = 0
-                            # 小睡一下再試
-                            time.sleep(1)
-                            continue
-                        else:
-                            raise ValueError(f"所有 {len(self.api_keys)} 個API密鑰都已達到限制或失敗: {error_msg}")
-                else:
-                    # 其他類型的錯誤，直接拋出以便上層處理
-                    self.logger.error(f"[AI服務] 無法處理的錯誤: {error_msg}")
-                    raise e
-
-        # 如果所有重試都失敗
-        raise ValueError(f"API調用失敗，已嘗試 {attempts} 次: {last_error}")
-    
-    def extract_donation_parameters(self, user_query: str, conversation_history: List[Dict] = None) -> Dict[str, Any]:
+                attempts = self._handle_call_failure(e, key, model_name, attempts)
+                continue
+            self.key_pool.record_success(key, time.monotonic() - started)
+            if served is not None:
+                served.model_name = model_name
+            return text
+
+    async def _call_with_retry_async(
+        self,
+        prompt: str,
+        max_retries: int = None,
+        served: Optional[ServedModel] = None
+    ) -> str:
         """
-        從用戶查詢中提取捐贈參數
+        使用重試機制調用API（非同步版本，不阻塞 event loop）
+        
+        金鑰由金鑰池輪詢分配；等待令牌或冷卻時不佔用並發信號量，
+        讓同一個 worker 上的其他請求可以繼續進行。
         
         Args:
-            user_query: 用戶的查詢文本
-            conversation_history: 對話歷史（可選）
+            prompt: 提示詞
+            max_retries: 最大重試次數（None表示嘗試所有密鑰）
+            served: 成功時記錄實際回應的模型
         
         Returns:
-            提取的參數字典
+            API回應文本
         """
-        context = ""
-        if conversation_history:
-            context = "\n對話歷史:\n" + "\n".join([
-                f"- {msg['role']}: {msg['content']}" 
-                for msg in conversation_history[-3:]  # 只保留最近3輪對話
-            ])
+        if max_retries is None:
+            max_retries = len(self.api_keys)
         
-        prompt = f"""
-{self.PERSONA}
+        model_name = self.model_name
+        tried = [model_name]
+        attempts = 0
+        last_error = None
+
+        while True:
+            model_name, attempts = self._model_for_attempt(model_name, tried, attempts, max_retries, last_error)
+            key = await self.key_pool.acquire_async(model_name)
+            started = time.monotonic()
+            try:
+                async with self._call_semaphore:
+                    response = await self._model_for(key, model_name).generate_content_async(prompt)
+                text = response.text
+            except asyncio.CancelledError:
+                self.key_pool.release(key)
+                raise
+            except Exception as e:
+                last_error = e
+                attempts = self._handle_call_failure(e, key, model_name, attempts)
+                continue
+            self.key_pool.record_success(key, time.monotonic() - started)
+            if served is not None:
+                served.model_name = model_name
+            return text
+    
+    def _response_cache_key(self, prompt: str) -> Optional[str]:
+        """計算 prompt 的快取鍵；未啟用快取時回傳 None"""
+        if self.response_cache is None:
+            return None
+        return make_cache_key(prompt, self.model_name, self._persona_digest)
+
+    def _cacheable(self, served: ServedModel) -> bool:
+        """
+        回應是否可寫入快取
+
+        快取鍵以主要模型計算，備援模型的回應若寫入會在之後被當成主要模型的回應重播，因此不快取
+        """
+        if served.model_name == self.model_name:
+            return True
+        self.logger.info(f"[AI服務] 回應來自備援模型 {served.model_name}，不寫入快取")
+        return False
+
+    def _generate(self, prompt: str) -> str:
+        """經過回應快取的模型調用（同步版本）"""
+        key = self._response_cache_key(prompt)
+        if key is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                self.logger.info(f"[AI服務] 回應快取命中 ({key[:12]})")
+                return cached
+
+        served = ServedModel(self.model_name)
+        response_text = self._call_with_retry(prompt, served=served)
+        if key is not None and self._cacheable(served):
+            self.response_cache.set(key, response_text)
+        return response_text
+
+    async def _cache_get_async(self, key: Optional[str]) -> Optional[str]:
+        """讀取回應快取（磁碟層讀取在執行緒中進行，避免阻塞 event loop）"""
+        if key is None:
+            return None
+        cache = self.response_cache
+        cached = cache.get(key) if cache.disk is None else await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            self.logger.info(f"[AI服務] 回應快取命中 ({key[:12]})")
+        return cached
+
+    async def _cache_set_async(self, key: Optional[str], value: str) -> None:
+        """寫入回應快取（磁碟層寫入在執行緒中進行）"""
+        if key is None:
+            return
+        cache = self.response_cache
+        if cache.disk is None:
+            cache.set(key, value)
+        else:
+            await asyncio.to_thread(cache.set, key, value)
+
+    async def _generate_async(self, prompt: str) -> str:
+        """經過回應快取的模型調用（非同步版本）"""
+        key = self._response_cache_key(prompt)
+        cached = await self._cache_get_async(key)
+        if cached is not None:
+            return cached
+
+        served = ServedModel(self.model_name)
+        response_text = await self._call_with_retry_async(prompt, served=served)
+        if self._cacheable(served):
+            await self._cache_set_async(key, response_text)
+        return response_text
+
+    async def _stream_with_retry_async(
+        self,
+        prompt: str,
+        max_retries: int = None,
+        served: Optional[ServedModel] = None
+    ) -> AsyncIterator[str]:
+        """
+        以串流方式調用API，逐段產出模型文字（與 _call_with_retry_async 共用金鑰輪換與重試邏輯）
+        
+        尚未輸出任何內容前失敗會改用其他金鑰重試；已輸出部分內容後失敗則直接拋出，
+        避免客戶端收到重複的片段。served 在串流完成時記錄實際回應的模型。
+        """
+        if max_retries is None:
+            max_retries = len(self.api_keys)
+        
+        model_name = self.model_name
+        tried = [model_name]
+        attempts = 0
+        last_error = None
+
+        while True:
+            model_name, attempts = self._model_for_attempt(model_name, tried, attempts, max_retries, last_error)
+            emitted = False
+            key = await self.key_pool.acquire_async(model_name)
+            started = time.monotonic()
+            try:
+                async with self._call_semaphore:
+                    response = await self._model_for(key, model_name).generate_content_async(prompt, stream=True)
+                    async for chunk in response:
+                        text = chunk.text
+                        if text:
+                            emitted = True
+                            yield text
+            except (asyncio.CancelledError, GeneratorExit):
+                # 客戶端中斷連線
+                self.key_pool.release(key)
+                raise
+            except Exception as e:
+                if emitted:
+                    # 已輸出部分內容，不再重試；仍依錯誤類型記錄（429 依模型冷卻、403 整把金鑰冷卻）
+                    error_msg = str(e).lower()
+                    kind = self._classify_key_error(error_msg)
+                    self.key_pool.record_failure(key, error_msg, kind or "error", model_name)
+                    raise
+                last_error = e
+                attempts = self._handle_call_failure(e, key, model_name, attempts)
+                continue
+            self.key_pool.record_success(key, time.monotonic() - started)
+            if served is not None:
+                served.model_name = model_name
+            return
+
+    async def _generate_stream_async(self, prompt: str) -> AsyncIterator[str]:
+        """經過回應快取的串流調用：命中時一次輸出完整內容，完成後寫入快取"""
+        key = self._response_cache_key(prompt)
+        cached = await self._cache_get_async(key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts: List[str] = []
+        served = ServedModel(self.model_name)
+        async for text in self._stream_with_retry_async(prompt, served=served):
+            parts.append(text)
+            yield text
+        if self._cacheable(served):
+            await self._cache_set_async(key, "".join(parts))
+
+    def key_pool_stats(self) -> Dict[str, Any]:
+        """各 API 金鑰的健康狀態與統計"""
+        return self.key_pool.stats()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """回應快取的命中統計"""
+        if self.response_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.response_cache.stats()}
+
+    def _build_extraction_prompt(self, user_query: str, conversation_history: List[Dict] = None) -> str:
+        """組合參數提取的提示詞"""
+        def render(turns: int) -> str:
+            history = format_history(
+                conversation_history, recent_turns=turns,
+                max_chars_per_turn=settings.ai_history_turn_max_chars
+            )
+            context = f"\n對話歷史:\n{history}" if history else ""
+            return f"""
+{self.PERSONA_BRIEF}
 
 ---
 
@@ -271,108 +587,75 @@ class AIService:
 
 輸出JSON：
 """
-        
-        def _extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
-            """嘗試從 text 中抽出 JSON 物件或陣列並解析返回 dict（失敗回傳 None）。"""
-            # 1) 移除常見 code block 標記
-            t = text.strip()
-            # 若包含 ```json ... ```，抽取中間部分
-            m = re.search(r"```json\s*(.*?)\s*```", t, re.S | re.I)
-            if m:
-                candidate = m.group(1).strip()
-                try:
-                    return json.loads(candidate)
-                except Exception:
-                    pass
-
-            # 2) 若包含 ``` ... ``` 無指定語法，抽取中間部分
-            m = re.search(r"```\s*(.*?)\s*```", t, re.S)
-            if m:
-                candidate = m.group(1).strip()
-                try:
-                    return json.loads(candidate)
-                except Exception:
-                    pass
+        return self._fit_history_prompt("extraction", render, 3)
 
-            # 3) 嘗試找出第一個 { ... } 的區塊（從第一個 { 到最後一個 }）
-            if '{' in t and '}' in t:
-                first = t.find('{')
-                last = t.rfind('}')
-                if first < last:
-                    candidate = t[first:last+1]
-                    # 嘗試修正常見單引號情況
-                    try:
-                        return json.loads(candidate)
-                    except Exception:
-                        # 嘗試用替換單引號為雙引號後解析（謹慎）
-                        cand2 = candidate.replace("\'", '"')
-                        try:
-                            return json.loads(cand2)
-                        except Exception:
-                            pass
-
-            # 4) 嘗試找出第一個 [ ... ] 的區塊
-            if '[' in t and ']' in t:
-                first = t.find('[')
-                last = t.rfind(']')
-                if first < last:
-                    candidate = t[first:last+1]
-                    try:
-                        parsed = json.loads(candidate)
-                        # 若是 list 轉成 dict under a key
-                        return {"_list_result": parsed}
-                    except Exception:
-                        pass
+    def _fit_history_prompt(self, kind: str, render, recent_turns: int) -> str:
+        """在聊天提示詞預算內保留最多的最近對話輪次，並記錄提示詞大小"""
+        budget = settings.ai_prompt_budget_chat_tokens
+        prompt, turns = fit_rows_to_budget(render, recent_turns, budget, min_rows=1)
+        prompt_metrics.record(kind, prompt, budget, trimmed=turns < recent_turns)
+        return prompt
 
-            return None
+    def _parse_extraction_response(self, response_text: str) -> Dict[str, Any]:
+        """解析參數提取的模型回應；無法解析時回傳含原始回應的診斷 dict"""
+        cleaned = response_text.strip().replace("```json", "").replace("```", "").strip()
 
+        # 直接嘗試解析整個回應
         try:
-            response_text = self._call_with_retry(prompt)
-            cleaned = response_text.strip().replace("```json", "").replace("```", "").strip()
-
-            # 直接嘗試解析整個回應
-            try:
-                parsed = json.loads(cleaned)
+            return json.loads(cleaned)
+        except Exception:
+            # 嘗試多種抽取策略
+            parsed = _extract_json_from_text(response_text)
+            if parsed is not None:
                 return parsed
-            except Exception:
-                # 嘗試多種抽取策略
-                parsed = _extract_json_from_text(response_text)
-                if parsed is not None:
-                    return parsed
-
-            # 若所有解析策略都失敗，回傳包含原始回應以便前端/日誌診斷
-            print(f"[AI服務] 解析 JSON 失敗，將回傳原始回應供診斷: {response_text[:200]}")
-            return {"_raw_ai_response": response_text}
-        except Exception as e:
-            print(f"[AI服務] 參數提取失敗: {e}")
-            return {"_raw_ai_error": str(e)}
+
+        # 若所有解析策略都失敗，回傳包含原始回應以便前端/日誌診斷
+        print(f"[AI服務] 解析 JSON 失敗，將回傳原始回應供診斷: {response_text[:200]}")
+        return {"_raw_ai_response": response_text}
     
-    def generate_followup_question(self, extracted_params: Dict[str, Any], conversation_history: List[Dict] = None) -> Optional[str]:
+    def extract_donation_parameters(self, user_query: str, conversation_history: List[Dict] = None) -> Dict[str, Any]:
         """
-        根據已提取的參數生成追問問題
+        從用戶查詢中提取捐贈參數
         
         Args:
-            extracted_params: 已提取的參數
-            conversation_history: 對話歷史
+            user_query: 用戶的查詢文本
+            conversation_history: 對話歷史（可選）
         
         Returns:
-            追問問題字符串，如果信息已足夠則返回 None
+            提取的參數字典
         """
-        # 格式化對話歷史
-        conversation_text = ""
-        if conversation_history and len(conversation_history) > 0:
-            conversation_text = "\n".join([
-                f"{'用戶' if msg.get('role') == 'user' else '小匯'}: {msg.get('content', '')}"
-                for msg in conversation_history[-5:]  # 只保留最近5輪對話
-            ])
-        
+        prompt = self._build_extraction_prompt(user_query, conversation_history)
+        try:
+            response_text = self._generate(prompt)
+            return self._parse_extraction_response(response_text)
+        except Exception as e:
+            print(f"[AI服務] 參數提取失敗: {e}")
+            return {"_raw_ai_error": str(e)}
+
+    async def extract_donation_parameters_async(self, user_query: str, conversation_history: List[Dict] = None) -> Dict[str, Any]:
+        """extract_donation_parameters 的非同步版本（供 API 端點使用）"""
+        prompt = self._build_extraction_prompt(user_query, conversation_history)
+        try:
+            response_text = await self._generate_async(prompt)
+            return self._parse_extraction_response(response_text)
+        except Exception as e:
+            print(f"[AI服務] 參數提取失敗: {e}")
+            return {"_raw_ai_error": str(e)}
+    
+    def _build_followup_prompts(self, extracted_params: Dict[str, Any], conversation_history: List[Dict] = None) -> Tuple[str, str]:
+        """組合追問問題的提示詞，回傳 (主要 prompt, fallback prompt)"""
         # 獲取最近的用戶訊息
         recent_message = ""
         if conversation_history and len(conversation_history) > 0:
             recent_message = conversation_history[-1].get('content', '')
         
         # 統一交給 AI 處理，讓它自己判斷
-        prompt = f"""
+        def render(turns: int) -> str:
+            conversation_text = format_history(
+                conversation_history, recent_turns=turns,
+                max_chars_per_turn=settings.ai_history_turn_max_chars
+            )
+            return f"""
 {self.PERSONA}
 
 ==對話記錄==
@@ -382,39 +665,182 @@ class AIService:
 用戶: {recent_message}
 
 ==已掌握資訊==
-{json.dumps(extracted_params, ensure_ascii=False, indent=2)}
+{compact_params(extracted_params)}
 
 ---
 
 基於完整的對話上下文，自然回應最新訊息。用純文字回覆，不要用Markdown格式。
 """
-        try:
-            print(f"[AI] 正在調用 generate_content，prompt長度: {len(prompt)}")
-            response_text = self._call_with_retry(prompt)
-            print(f"[AI] 成功生成回應: {response_text[:100]}...")
-            return response_text.strip()
-        except Exception as e:
-            print(f"[AI生成失敗] 錯誤類型: {type(e).__name__}")
-            print(f"[AI生成失敗] 錯誤訊息: {str(e)}")
-            import traceback
-            print(f"[AI生成失敗] 完整錯誤:\n{traceback.format_exc()}")
-            # fallback 也讓 AI 簡單回應
-            fallback_prompt = f"""
+        prompt = self._fit_history_prompt("followup", render, settings.ai_history_recent_turns)
+        
+        # fallback 也讓 AI 簡單回應（只帶最近兩則）
+        fallback_text = format_history(conversation_history, recent_turns=2, max_chars_per_turn=settings.ai_history_turn_max_chars)
+        fallback_prompt = f"""
 {self.PERSONA}
 
 對話記錄:
-{conversation_text if conversation_text else recent_message}
+{fallback_text if fallback_text else recent_message}
 
 簡短回應。用純文字，不要用Markdown格式。
 """
+        return prompt, fallback_prompt
+
+    def generate_followup_question(self, extracted_params: Dict[str, Any], conversation_history: List[Dict] = None) -> Optional[str]:
+        """
+        根據已提取的參數生成追問問題
+        
+        Args:
+            extracted_params: 已提取的參數
+            conversation_history: 對話歷史
+        
+        Returns:
+            追問問題字符串，如果信息已足夠則返回 None
+        """
+        prompt, fallback_prompt = self._build_followup_prompts(extracted_params, conversation_history)
+        try:
+            print(f"[AI] 正在調用 generate_content，prompt長度: {len(prompt)}")
+            response_text = self._generate(prompt)
+            print(f"[AI] 成功生成回應: {response_text[:100]}...")
+            return response_text.strip()
+        except Exception as e:
+            _log_followup_failure(e)
             try:
                 print(f"[AI] 嘗試 fallback prompt")
-                fallback_text = self._call_with_retry(fallback_prompt)
+                fallback_text = self._generate(fallback_prompt)
                 print(f"[AI] Fallback 成功")
                 return fallback_text.strip()
             except Exception as e2:
                 print(f"[AI] Fallback 也失敗: {str(e2)}")
-                return "抱歉，我剛恍神了，可以再說一次嗎？"
+                return FOLLOWUP_FALLBACK_REPLY
+
+    async def generate_followup_question_async(self, extracted_params: Dict[str, Any], conversation_history: List[Dict] = None) -> Optional[str]:
+        """generate_followup_question 的非同步版本（供 API 端點使用）"""
+        prompt, fallback_prompt = self._build_followup_prompts(extracted_params, conversation_history)
+        try:
+            print(f"[AI] 正在調用 generate_content_async，prompt長度: {len(prompt)}")
+            response_text = await self._generate_async(prompt)
+            print(f"[AI] 成功生成回應: {response_text[:100]}...")
+            return response_text.strip()
+        except Exception as e:
+            _log_followup_failure(e)
+            try:
+                self.logger.info("[AI] 嘗試 fallback prompt")
+                fallback_text = await self._generate_async(fallback_prompt)
+                self.logger.info("[AI] Fallback 成功")
+                return fallback_text.strip()
+            except Exception as e2:
+                print(f"[AI] Fallback 也失敗: {str(e2)}")
+                return FOLLOWUP_FALLBACK_REPLY
+    
+    async def stream_followup_question_async(self, extracted_params: Dict[str, Any], conversation_history: List[Dict] = None) -> AsyncIterator[str]:
+        """generate_followup_question 的串流版本，逐段產出回覆文字"""
+        prompt, fallback_prompt = self._build_followup_prompts(extracted_params, conversation_history)
+        emitted = False
+        try:
+            async for text in self._generate_stream_async(prompt):
+                emitted = True
+                yield text
+            return
+        except Exception as e:
+            if emitted:
+                raise
+            _log_followup_failure(e)
+        try:
+            self.logger.info("[AI] 嘗試 fallback prompt")
+            yield (await self._generate_async(fallback_prompt)).strip()
+        except Exception as e2:
+            print(f"[AI] Fallback 也失敗: {str(e2)}")
+            yield FOLLOWUP_FALLBACK_REPLY
+    
+    def _build_combined_prompt(self, user_query: str, conversation_history: List[Dict] = None) -> str:
+        """組合「提取參數 + 回覆」合併模式的提示詞（一次調用同時取得兩者）"""
+        def render(turns: int) -> str:
+            conversation_text = format_history(
+                conversation_history, recent_turns=turns,
+                max_chars_per_turn=settings.ai_history_turn_max_chars
+            )
+            return f"""
+{self.PERSONA}
+
+==對話記錄==
+{conversation_text if conversation_text else "(首次對話)"}
+
+==最新訊息==
+用戶: "{user_query}"
+
+---
+
+完成兩件事，只輸出一個JSON物件：
+1. params：從對話提取捐贈資訊（沒提到就 null）
+2. reply：基於完整對話自然回應最新訊息；若已知道捐什麼和捐到哪些縣市，總結理解的內容並詢問還有沒有其他想法，說確認後會準備報告。reply 用純文字，不要用Markdown格式
+
+{{
+  "params": {{
+    "resource_type": "捐什麼",
+    "quantity": 數量,
+    "target_counties": ["花蓮縣", "台東縣"],
+    "target_school_level": "學校類型",
+    "priority_focus": "關注重點",
+    "area_type": "偏遠程度"
+  }},
+  "reply": "給用戶的回覆"
+}}
+
+提示：花東=花蓮+台東，中部=台中+彰化+南投，閒聊時 params 全null
+
+輸出JSON：
+"""
+        return self._fit_history_prompt("combined", render, settings.ai_history_recent_turns)
+
+    def _parse_combined_response(self, response_text: str) -> Optional[Dict[str, Any]]:
+        """解析合併模式的回應；缺少 params 或 reply 時回傳 None（交由兩段式流程處理）"""
+        cleaned = response_text.strip().replace("```json", "").replace("```", "").strip()
+        try:
+            parsed = json.loads(cleaned)
+        except Exception:
+            parsed = _extract_json_from_text(response_text)
+
+        if not isinstance(parsed, dict):
+            return None
+        params = parsed.get("params")
+        reply = parsed.get("reply")
+        if not isinstance(params, dict) or not isinstance(reply, str) or not reply.strip():
+            return None
+        return {"extracted_params": params, "followup_question": reply.strip()}
+
+    def extract_and_reply(self, user_query: str, conversation_history: List[Dict] = None) -> Optional[Dict[str, Any]]:
+        """
+        單次調用同時提取捐贈參數並生成回覆
+        
+        Args:
+            user_query: 用戶的查詢文本
+            conversation_history: 對話歷史（可選）
+        
+        Returns:
+            {"extracted_params": ..., "followup_question": ...}；調用或解析失敗時回傳 None，
+            呼叫端應改用 extract_donation_parameters + generate_followup_question
+        """
+        prompt = self._build_combined_prompt(user_query, conversation_history)
+        try:
+            result = self._parse_combined_response(self._generate(prompt))
+        except Exception as e:
+            self.logger.warning(f"[AI服務] 合併提取失敗，改用兩段式流程: {e}")
+            return None
+        if result is None:
+            self.logger.warning("[AI服務] 合併提取回應格式不符，改用兩段式流程")
+        return result
+
+    async def extract_and_reply_async(self, user_query: str, conversation_history: List[Dict] = None) -> Optional[Dict[str, Any]]:
+        """extract_and_reply 的非同步版本（供 API 端點使用）"""
+        prompt = self._build_combined_prompt(user_query, conversation_history)
+        try:
+            result = self._parse_combined_response(await self._generate_async(prompt))
+        except Exception as e:
+            self.logger.warning(f"[AI服務] 合併提取失敗，改用兩段式流程: {e}")
+            return None
+        if result is None:
+            self.logger.warning("[AI服務] 合併提取回應格式不符，改用兩段式流程")
+        return result
     
     def _generate_confirmation_question(self, extracted_params: Dict[str, Any]) -> str:
         """
@@ -436,7 +862,7 @@ class AIService:
 """
         
         try:
-            response_text = self._call_with_retry(prompt)
+            response_text = self._generate(prompt)
             return response_text.strip()
         except Exception as e:
             # 如果生成失敗，使用預設模板
@@ -459,61 +885,61 @@ class AIService:
 
 還有其他想法嗎？確認的話我就幫您準備分析報告。"""
     
-    def generate_analysis_report(
+    def _build_report_prompt(
         self, 
         user_params: Dict[str, Any], 
         school_data: Dict[str, List[Dict]], 
         statistics: Dict[str, Any]
     ) -> str:
-        """
-        生成分析報告
-        
-        Args:
-            user_params: 用戶參數
-            school_data: 學校數據（來自各個表）
-            statistics: 統計數據
-        
-        Returns:
-            Markdown 格式的分析報告
-        """
-        # 提取学校数据列表用于报告
-        schools_list = []
-        for school in school_data.get("faraway_schools", [])[:30]:  # 增加到30所
-            schools_list.append({
-                "name": f"{school.get('county', '')}{school.get('school_name', '')}",
-                "county": school.get("county", ""),
-                "students": school.get("students", 0),
-                "area_type": school.get("area_type", ""),
-                "classes": school.get("classes", 0)
-            })
-        
-        # 提取設備資訊
-        devices_summary = []
-        for device in school_data.get("devices_info", [])[:10]:
-            devices_summary.append({
-                "school": device.get("school_name", ""),
-                "computers": device.get("computers", 0)
-            })
-        
-        prompt = f"""
-{self.PERSONA}
+        """組合分析報告的提示詞（學校與設備資料以緊湊表格呈現，列數依 token 預算調整）"""
+        schools = school_data.get("faraway_schools", [])[:30]
+        devices = school_data.get("devices_info", [])[:10]
+        budget = settings.ai_prompt_budget_report_tokens
+
+        def render(rows: int) -> str:
+            schools_table = compact_table(schools[:rows], [
+                ("county", "縣市"), ("school_name", "學校"), ("area_type", "地區屬性"),
+                ("students", "學生數"), ("classes", "班級數"),
+            ])
+            devices_table = compact_table(devices[:min(len(devices), rows)], [
+                ("school_name", "學校"), ("computers", "電腦數"),
+            ])
+            return self._render_report_prompt(
+                user_params, statistics, len(schools), min(rows, len(schools)), schools_table, devices_table
+            )
+
+        prompt, rows = fit_rows_to_budget(render, 15, budget)
+        prompt_metrics.record("report", prompt, budget, trimmed=rows < min(15, len(schools)))
+        return prompt
+
+    def _render_report_prompt(
+        self,
+        user_params: Dict[str, Any],
+        statistics: Dict[str, Any],
+        total_schools: int,
+        shown_schools: int,
+        schools_table: str,
+        devices_table: str
+    ) -> str:
+        return f"""
+{self.PERSONA_BRIEF}
 
 ## 📊 數據
 
-學校資料（前15所）：
-{json.dumps(schools_list[:15], ensure_ascii=False, indent=2)}
+學校資料（前{shown_schools}所）：
+{schools_table}
 
 設備資訊：
-{json.dumps(devices_summary, ensure_ascii=False, indent=2)}
+{devices_table}
 
 統計：
-- {len(schools_list)} 所學校
+- {total_schools} 所學校
 - {statistics.get('total_students', 0)} 位學生
 - {', '.join(statistics.get('counties_covered', []))}
 
 ## 💼 客戶需求
 
-{json.dumps(user_params, ensure_ascii=False, indent=2)}
+{compact_params(user_params)}
 
 ---
 
@@ -544,14 +970,64 @@ class AIService:
 - 不要提及數據來源的局限性或不確定性
 - 用Markdown格式，表格要清晰完整
 """
+
+
+    def generate_analysis_report(
+        self, 
+        user_params: Dict[str, Any], 
+        school_data: Dict[str, List[Dict]], 
+        statistics: Dict[str, Any]
+    ) -> str:
+        """
+        生成分析報告
+        
+        Args:
+            user_params: 用戶參數
+            school_data: 學校數據（來自各個表）
+            statistics: 統計數據
         
+        Returns:
+            Markdown 格式的分析報告
+        """
+        prompt = self._build_report_prompt(user_params, school_data, statistics)
         try:
-            response_text = self._call_with_retry(prompt)
-            return response_text
+            return self._generate(prompt)
         except Exception as e:
             print(f"[AI服務] 報告生成失敗: {e}")
             return f"## 報告生成失敗\n\n錯誤信息: {str(e)}"
 
+    async def generate_analysis_report_async(
+        self, 
+        user_params: Dict[str, Any], 
+        school_data: Dict[str, List[Dict]], 
+        statistics: Dict[str, Any],
+        raise_errors: bool = False
+    ) -> str:
+        """
+        generate_analysis_report 的非同步版本（供 API 端點使用）
+        
+        raise_errors 為 True 時直接拋出異常，而不是回傳錯誤訊息報告（背景工作需要區分成功與失敗）
+        """
+        prompt = self._build_report_prompt(user_params, school_data, statistics)
+        try:
+            return await self._generate_async(prompt)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"[AI服務] 報告生成失敗: {e}")
+            return f"## 報告生成失敗\n\n錯誤信息: {str(e)}"
+
+
+    async def stream_analysis_report_async(
+        self, 
+        user_params: Dict[str, Any], 
+        school_data: Dict[str, List[Dict]], 
+        statistics: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """generate_analysis_report 的串流版本，逐段產出 Markdown 報告"""
+        prompt = self._build_report_prompt(user_params, school_data, statistics)
+        async for text in self._generate_stream_async(prompt):
+            yield text
 
 # 創建全局 AI 服務實例（延遲初始化）
 _ai_service_instance = None
@@ -563,3 +1039,21 @@ def get_ai_service() -> AIService:
         _ai_service_instance = AIService()
     return _ai_service_instance
 
+
+_ai_service_init_lock = threading.Lock()
+
+
+async def get_ai_service_async() -> AIService:
+    """
+    獲取 AI 服務實例（非同步版本）
+    
+    首次初始化需要呼叫 list_models 等阻塞的網路操作，改在執行緒中完成，避免卡住 event loop。
+    """
+    if _ai_service_instance is not None:
+        return _ai_service_instance
+
+    def _init() -> AIService:
+        with _ai_service_init_lock:
+            return get_ai_service()
+
+    return await asyncio.to_thread(_init)
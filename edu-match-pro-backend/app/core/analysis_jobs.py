@@ -0,0 +1,266 @@
+"""
+背景分析工作佇列
+/ai/analyze 的資料查詢與報告生成改由背景 worker 執行：提交後立即回傳 job id，
+前端輪詢狀態端點取得結果。結果寫入 analysis_report 表，相同參數的請求直接重用
+"""
+import asyncio
+import json
+import math
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.exceptions import ServiceUnavailableError
+from app.crud.analysis_report_crud import (
+    hash_analysis_params, get_analysis_job, get_reusable_report, get_inflight_job,
+    create_analysis_job, update_analysis_job
+)
+from app.crud.smart_exploration_crud import query_schools_by_criteria
+from app.db import async_session_local
+from app.models.analysis_report import AnalysisReport, AnalysisJobStatus
+
+
+async def run_donation_analysis(
+    session: AsyncSession,
+    user_params: Dict[str, Any],
+    raise_errors: bool = False
+) -> Dict[str, Any]:
+    """
+    執行一次完整的捐贈策略分析（查詢學校數據 + 生成報告）
+
+    Args:
+        session: 數據庫會話
+        user_params: 用戶參數
+        raise_errors: 報告生成失敗時是否拋出異常
+
+    Returns:
+        包含 report、school_data、statistics 的字典
+    """
+    from app.core.ai_service import get_ai_service_async
+    ai_service = await get_ai_service_async()
+
+    # 從數據庫查詢相關學校數據（省 API 方式）
+    school_data = await query_schools_by_criteria(
+        session,
+        counties=user_params.get("target_counties"),
+        area_type=user_params.get("area_type"),
+        limit=50  # 限制數量以節省處理時間
+    )
+
+    # 調試日誌
+    print(f"[AI分析] 用戶參數: {user_params}")
+    print(f"[AI分析] 查詢到的學校數: {len(school_data.get('faraway_schools', []))}")
+    print(f"[AI分析] 統計數據: {school_data.get('statistics', {})}")
+    if school_data.get('faraway_schools'):
+        print(f"[AI分析] 學校樣本: {school_data['faraway_schools'][:3]}")
+
+    # 生成分析報告
+    report = await ai_service.generate_analysis_report_async(
+        user_params,
+        school_data,
+        school_data.get("statistics", {}),
+        raise_errors=raise_errors
+    )
+
+    return {
+        "report": report,
+        "school_data": school_data,
+        "statistics": school_data.get("statistics", {})
+    }
+
+
+def job_run_timeout() -> timedelta:
+    """單一工作從開始執行起的逾時時間"""
+    return timedelta(seconds=settings.analysis_job_timeout_seconds)
+
+
+def job_queue_timeout() -> timedelta:
+    """
+    工作排隊等待的上限：佇列滿載時最後一筆工作需等前面每一輪工作都跑到逾時
+    超過此時間仍在排隊，表示持有佇列的 worker 行程已重啟、工作不會再被執行
+    """
+    rounds = math.ceil(max(1, settings.analysis_job_max_pending) / max(1, settings.analysis_job_workers))
+    return job_run_timeout() * (rounds + 1)
+
+
+def is_job_stale(job: AnalysisReport, now: Optional[datetime] = None) -> bool:
+    """
+    排隊或執行中但超過逾時時間的工作（例如 worker 行程已重啟）
+
+    執行時間從 started_at 起算，排隊等待 worker 的時間不計入執行逾時
+    """
+    now = now or datetime.utcnow()
+    if job.status == AnalysisJobStatus.running:
+        return (job.started_at or job.created_at) < now - job_run_timeout()
+    if job.status == AnalysisJobStatus.queued:
+        return job.created_at < now - job_queue_timeout()
+    return False
+
+
+def job_to_response(job: AnalysisReport) -> Dict[str, Any]:
+    """將分析工作轉換為 API 回應格式（完成時與 /ai/analyze 的回應欄位一致）"""
+    status = job.status
+    error = job.error
+    if is_job_stale(job):
+        status = AnalysisJobStatus.failed
+        error = "分析工作逾時，請重新提交"
+
+    response: Dict[str, Any] = {
+        "job_id": str(job.id),
+        "status": status,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+    }
+    if status == AnalysisJobStatus.completed:
+        school_data = json.loads(job.school_data) if job.school_data else {}
+        response.update({
+            "report": job.report,
+            "school_data": school_data,
+            "statistics": school_data.get("statistics", {})
+        })
+    elif status == AnalysisJobStatus.failed:
+        response["error"] = error
+    return response
+
+
+@dataclass(frozen=True)
+class QueuedJob:
+    """佇列中的一筆分析工作"""
+    job_id: uuid.UUID
+    params_hash: str
+    user_params: Dict[str, Any]
+
+
+class AnalysisJobQueue:
+    """
+    行程內的分析工作佇列
+
+    - worker 數量與待處理上限由設定控制（每個 uvicorn worker 各自一組）
+    - 工作狀態存於 analysis_report 表，因此任何 worker 都能回答輪詢
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        session_factory: async_sessionmaker = async_session_local
+    ):
+        self.worker_count = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._session_factory = session_factory
+        self._queue: Optional["asyncio.Queue[QueuedJob]"] = None
+        self._workers: List[asyncio.Task] = []
+        # 本行程中排隊/執行中的參數雜湊 -> job id（避免同時重複提交）
+        self._inflight: Dict[str, uuid.UUID] = {}
+
+    def _ensure_started(self) -> None:
+        """在第一次提交時於目前的 event loop 啟動 worker"""
+        if self._queue is not None and self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"analysis-job-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        print(f"[分析工作] 已啟動 {self.worker_count} 個 worker，佇列上限 {self.max_pending}")
+
+    async def submit(self, session: AsyncSession, user_params: Dict[str, Any]) -> AnalysisReport:
+        """
+        提交分析工作
+
+        相同參數若已有有效報告或正在處理中的工作，直接回傳該工作，不重複生成
+        """
+        params_hash = hash_analysis_params(user_params)
+
+        max_age = timedelta(hours=settings.analysis_report_max_age_hours)
+        existing = await get_reusable_report(session, params_hash, max_age)
+        if existing:
+            print(f"[分析工作] 重用已完成的報告 {existing.id}")
+            return existing
+
+        local_job_id = self._inflight.get(params_hash)
+        if local_job_id:
+            local_job = await get_analysis_job(session, local_job_id)
+            if local_job:
+                return local_job
+
+        inflight = await get_inflight_job(session, params_hash, job_queue_timeout(), job_run_timeout())
+        if inflight:
+            print(f"[分析工作] 相同參數的工作 {inflight.id} 正在處理中")
+            return inflight
+
+        self._ensure_started()
+        assert self._queue is not None
+        if self._queue.full():
+            raise ServiceUnavailableError("分析工作佇列已滿，請稍後再試")
+
+        entry = QueuedJob(job_id=uuid.uuid4(), params_hash=params_hash, user_params=user_params)
+        job = await create_analysis_job(session, entry.job_id, params_hash, user_params)
+        self._inflight[params_hash] = entry.job_id
+        self._queue.put_nowait(entry)
+        print(f"[分析工作] 已排入工作 {entry.job_id}（佇列長度 {self._queue.qsize()}）")
+        return job
+
+    async def _worker(self, index: int) -> None:
+        assert self._queue is not None
+        while True:
+            entry = await self._queue.get()
+            try:
+                await self._run_job(entry.job_id, entry.user_params)
+            except Exception as e:
+                print(f"[分析工作] worker #{index} 處理 {entry.job_id} 時發生未預期錯誤: {e}")
+            finally:
+                self._inflight.pop(entry.params_hash, None)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: uuid.UUID, user_params: Dict[str, Any]) -> None:
+        async with self._session_factory() as session:
+            await update_analysis_job(session, job_id, AnalysisJobStatus.running)
+            try:
+                result = await asyncio.wait_for(
+                    run_donation_analysis(session, user_params, raise_errors=True),
+                    timeout=settings.analysis_job_timeout_seconds
+                )
+            except Exception as e:
+                await session.rollback()
+                error = str(e) or type(e).__name__
+                print(f"[分析工作] 工作 {job_id} 失敗: {error}")
+                await update_analysis_job(session, job_id, AnalysisJobStatus.failed, error=error)
+                return
+
+            await update_analysis_job(
+                session,
+                job_id,
+                AnalysisJobStatus.completed,
+                report=result["report"],
+                school_data=result["school_data"]
+            )
+            print(f"[分析工作] 工作 {job_id} 完成")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count,
+            "max_pending": self.max_pending,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "inflight": len(self._inflight),
+        }
+
+    async def shutdown(self) -> None:
+        """停止所有 worker（應用程式關閉時呼叫）"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._inflight.clear()
+
+
+analysis_job_queue = AnalysisJobQueue(
+    workers=settings.analysis_job_workers,
+    max_pending=settings.analysis_job_max_pending
+)
@@ -1,11 +1,28 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 from pydantic import field_validator
 
+# /data/* 列表總數的計算方式（見 app/crud/wide_table_crud.py）
+CountMode = Literal["exact", "cached", "estimated"]
+
 
 class Settings(BaseSettings):
     database_url: str
     test_database_url: Optional[str] = None
+    # 資料庫引擎設定檔：dev（echo SQL）、prod、test（不使用連線池）；以下 DB_* 未設定時沿用設定檔預設
+    db_profile: str = "prod"
+    db_echo: Optional[bool] = None
+    db_pool_size: Optional[int] = None
+    db_max_overflow: Optional[int] = None
+    db_pool_timeout_seconds: Optional[float] = None
+    db_pool_recycle_seconds: Optional[int] = None
+    db_pool_pre_ping: Optional[bool] = None
+    db_statement_cache_size: Optional[int] = None
+    db_statement_timeout_ms: Optional[int] = None
+    # 讀取副本：唯讀端點使用；無法連線或複寫延遲超過上限時退回主庫（None 表示不檢查延遲）
+    replica_database_url: Optional[str] = None
+    replica_max_lag_seconds: Optional[float] = 30
+    replica_health_check_seconds: int = 10
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
@@ -15,6 +32,86 @@ class Settings(BaseSettings):
     gemini_api_key_2: Optional[str] = None
     gemini_api_key_3: Optional[str] = None
     gemini_api_key_4: Optional[str] = None
+    # 每個 worker 同時進行中的 Gemini 呼叫上限（非同步路徑）
+    ai_max_concurrency: int = 4
+    # API 金鑰池：每把金鑰的客戶端限流、429/403 冷卻與熔斷器
+    ai_key_rpm: int = 10
+    ai_key_burst: int = 3
+    ai_key_cooldown_seconds: int = 60
+    ai_key_forbidden_cooldown_seconds: int = 3600
+    ai_key_breaker_threshold: int = 5
+    ai_key_breaker_reset_seconds: int = 30
+    # 所有金鑰都不可用時最多等待的秒數
+    ai_key_acquire_timeout_seconds: int = 30
+    # Gemini 模型目錄：啟動時載入，超過刷新間隔才重新呼叫 list_models
+    ai_model_catalog_path: Optional[str] = ".cache/gemini_models.json"
+    ai_model_catalog_refresh_hours: int = 24
+    # 提示詞預算（估算 token 數）：聊天類調用與分析報告；超出時減少對話輪次或學校列數
+    ai_prompt_budget_chat_tokens: int = 1500
+    ai_prompt_budget_report_tokens: int = 2500
+    # 原文保留的最近對話則數（更早的壓成摘要）與每則最長字數
+    ai_history_recent_turns: int = 4
+    ai_history_turn_max_chars: int = 300
+    # /ai/extract_parameters 以單次調用同時提取參數與生成回覆（失敗時回到兩段式流程）
+    ai_combined_extraction: bool = True
+    # 模型後端：gemini（預設）或 fake（本地假模型，離線壓測用，不需要 API 金鑰）
+    ai_backend: str = "gemini"
+    ai_fake_key_count: int = 2
+    # 假模型延遲分佈：fixed / uniform / lognormal（latency_ms 為中位數，sigma 控制長尾）
+    ai_fake_latency_distribution: str = "lognormal"
+    ai_fake_latency_ms: float = 800
+    ai_fake_latency_sigma: float = 0.5
+    # 假模型注入 429 / 403（金鑰洩露）錯誤的機率
+    ai_fake_rate_limit_rate: float = 0.0
+    ai_fake_leaked_key_rate: float = 0.0
+    ai_fake_seed: Optional[int] = None
+    # 啟動時預先初始化 AI 服務，讓第一個 AI 請求不必等待
+    ai_warmup_on_startup: bool = True
+    # AI 回應快取：記憶體 LRU + 可選磁碟層（設定 AI_CACHE_DIR 啟用，重啟後保留）
+    ai_cache_enabled: bool = True
+    ai_cache_ttl_seconds: int = 3600
+    ai_cache_max_entries: int = 512
+    ai_cache_dir: Optional[str] = None
+    ai_cache_disk_max_mb: int = 64
+    
+    # 學校名稱自動完成：行程內索引（/schools 不查資料庫），每隔幾秒檢查一次 data_version
+    school_autocomplete_enabled: bool = True
+    school_autocomplete_refresh_seconds: int = 60
+    
+    # /data/* 列表總數：exact（精確）、cached（依條件快取，ingest 後失效）、estimated（無條件時用 planner 統計）
+    data_count_mode: CountMode = "cached"
+    data_count_cache_max_entries: int = 1024
+    data_count_cache_ttl_seconds: int = 3600
+    # 多久重新讀取一次 data_version（秒）
+    data_version_check_seconds: int = 30
+    
+    # 公開查詢快取（/schools、/data/*）：鍵含 data_version，ingest 後整批失效
+    public_query_cache_enabled: bool = True
+    public_query_cache_max_entries: int = 2048
+    public_query_cache_ttl_seconds: int = 600
+    
+    # HTTP 快取標頭（ETag 重新驗證之外）：瀏覽器 max-age、CDN s-maxage、靜態內容 max-age（秒）
+    http_cache_max_age_seconds: int = 60
+    http_cache_shared_max_age_seconds: int = 300
+    http_cache_static_max_age_seconds: int = 3600
+    
+    # 學校 / 企業儀表板讀取增量維護的彙總表（false 則每次即時計算）
+    dashboard_stats_rollups: bool = True
+    
+    # 智能探索：四個 wide 表查詢是否以獨立連線並行執行（每次分析最多多用 4 條連線）
+    smart_exploration_concurrent_queries: bool = True
+    
+    # AI 對話 session（客戶端只送新訊息）：memory 或 db（多 worker 共用）；閒置超過 TTL 即失效
+    conversation_store_backend: str = "memory"
+    conversation_ttl_minutes: int = 120
+    conversation_max_sessions: int = 1000
+    
+    # 背景分析工作（/ai/analyze/jobs）- 以每個 worker 行程為單位
+    analysis_job_workers: int = 2
+    analysis_job_max_pending: int = 20
+    analysis_job_timeout_seconds: int = 300
+    # 相同參數的已完成報告在此時間內直接重用
+    analysis_report_max_age_hours: int = 24
     
     # Demo user passwords (for local/demo only)
     demo_school_password: str = "demo_school_2024"
@@ -0,0 +1,145 @@
+"""
+AI 對話 session 儲存
+客戶端每輪只送出新訊息與 session_id，伺服器依 session 重建對話歷史並合併各輪提取的參數：
+- 記憶體層：LRU + 滑動 TTL（每次寫入重新計時）
+- 可選 DB 層（CONVERSATION_STORE_BACKEND=db）：訊息只新增不修改，多個 worker 共用；
+  每次讀取都查詢資料庫，參數在資料庫內合併（各 worker 的記憶體副本可能已過期，不作為快取）
+"""
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.cache import LRUTTLCache, MISSING
+from app.core.config import settings
+from app.crud.conversation_crud import (
+    create_conversation, get_conversation, append_conversation_turns, purge_expired_conversations
+)
+from app.db import async_session_local
+
+
+@dataclass
+class ConversationState:
+    """一個對話 session 的內容"""
+    session_id: str
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "turns": self.turns, "params": self.params}
+
+
+def merge_params(current: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """合併參數：新一輪的非空值覆蓋舊值，未提到的保留（與前端原本的合併規則相同）"""
+    merged = dict(current)
+    for key, value in new.items():
+        if key.startswith("_") or value in (None, "", []):
+            continue
+        merged[key] = value
+    return merged
+
+
+class ConversationStore:
+    """對話 session 儲存（記憶體，或多個 worker 共用的 DB）"""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_sessions: int,
+        backend: str = "memory",
+        session_factory: async_sessionmaker = async_session_local
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._cache: LRUTTLCache[ConversationState] = LRUTTLCache(max_entries=max_sessions, ttl_seconds=ttl_seconds)
+        self._session_factory = session_factory
+        self._last_purge = 0.0
+
+    @property
+    def use_db(self) -> bool:
+        return self.backend == "db"
+
+    async def create(self) -> ConversationState:
+        """建立新的 session"""
+        if self.use_db:
+            async with self._session_factory() as session:
+                await self._maybe_purge(session)
+                conversation = await create_conversation(session)
+            return ConversationState(session_id=str(conversation.id))
+        state = ConversationState(session_id=str(uuid.uuid4()))
+        self._cache.set(state.session_id, state)
+        return state
+
+    async def get(self, session_id: str) -> Optional[ConversationState]:
+        """取得 session；不存在或已過期時回傳 None"""
+        if not self.use_db:
+            state = self._cache.get(session_id)
+            return None if state is MISSING else state
+
+        try:
+            conversation_id = uuid.UUID(session_id)
+        except (ValueError, TypeError):
+            return None
+        async with self._session_factory() as session:
+            found = await get_conversation(session, conversation_id, timedelta(seconds=self.ttl_seconds))
+        if not found:
+            return None
+
+        conversation, turns = found
+        return ConversationState(
+            session_id=session_id,
+            turns=[{"role": t.role, "content": t.content} for t in turns],
+            params=json.loads(conversation.params or "{}")
+        )
+
+    async def append(
+        self,
+        state: ConversationState,
+        turns: List[Dict[str, str]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> ConversationState:
+        """新增本輪訊息並合併參數（DB 模式下 state.params 更新為資料庫中合併後的結果）"""
+        turns = [t for t in turns if t.get("content")]
+        state.turns.extend(turns)
+        if not self.use_db:
+            if params:
+                state.params = merge_params(state.params, params)
+            # 重新寫入以延長存活時間
+            self._cache.set(state.session_id, state)
+            return state
+
+        # 只送出本輪有值的參數，由資料庫合併到最新的 session 參數上
+        async with self._session_factory() as session:
+            merged = await append_conversation_turns(
+                session, uuid.UUID(state.session_id), turns, merge_params({}, params or {})
+            )
+        if merged is None:
+            print(f"[對話] session {state.session_id} 已過期，本輪內容未保存")
+            state.params = merge_params(state.params, params or {})
+        else:
+            state.params = merged
+        return state
+
+    async def _maybe_purge(self, session) -> None:
+        """DB 模式下定期清除過期 session（最多每四分之一個 TTL 一次）"""
+        now = time.monotonic()
+        if now - self._last_purge < self.ttl_seconds / 4:
+            return
+        self._last_purge = now
+        purged = await purge_expired_conversations(session, timedelta(seconds=self.ttl_seconds))
+        if purged:
+            print(f"[對話] 已清除 {purged} 個過期的對話 session")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, **self._cache.stats_dict()}
+
+
+conversation_store = ConversationStore(
+    ttl_seconds=settings.conversation_ttl_minutes * 60,
+    max_sessions=settings.conversation_max_sessions,
+    backend=settings.conversation_store_backend
+)
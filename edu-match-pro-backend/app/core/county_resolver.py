@@ -0,0 +1,114 @@
+"""
+縣市名稱正規化與別名解析
+各 wide 表的縣市欄位格式不一致（「[13]屏東縣」、「13屏東縣」、「台東縣」、打錯字的「臺東線」），
+這裡將各種寫法解析為 dim_county 的整數主鍵（內政部縣市代碼），查詢時改用 county_id 等值比對
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (county_id, 名稱)；county_id 即內政部縣市代碼，與 dim_county.id 一致
+COUNTIES: List[Tuple[int, str]] = [
+    (63000, "臺北市"),
+    (64000, "高雄市"),
+    (65000, "新北市"),
+    (66000, "臺中市"),
+    (67000, "臺南市"),
+    (68000, "桃園市"),
+    (10002, "宜蘭縣"),
+    (10004, "新竹縣"),
+    (10005, "苗栗縣"),
+    (10007, "彰化縣"),
+    (10008, "南投縣"),
+    (10009, "雲林縣"),
+    (10010, "嘉義縣"),
+    (10013, "屏東縣"),
+    (10014, "臺東縣"),
+    (10015, "花蓮縣"),
+    (10016, "澎湖縣"),
+    (10017, "基隆市"),
+    (10018, "新竹市"),
+    (10020, "嘉義市"),
+    (9020, "金門縣"),
+    (9007, "連江縣"),
+]
+
+COUNTY_NAMES: Dict[int, str] = dict(COUNTIES)
+
+# 改制前的名稱與其他常見別名
+_EXTRA_ALIASES: Dict[str, str] = {
+    "臺北縣": "新北市",
+    "桃園縣": "桃園市",
+    "臺中縣": "臺中市",
+    "臺南縣": "臺南市",
+    "高雄縣": "高雄市",
+    "馬祖": "連江縣",
+}
+
+# 開頭的編號，例如「[13]」「13」「(13)」
+_PREFIX_RE = re.compile(r"^[\[\(（]?\d+[\]\)）]?")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _build_alias_index() -> Dict[str, int]:
+    ids_by_name = {name: county_id for county_id, name in COUNTIES}
+    index: Dict[str, int] = {name: county_id for county_id, name in COUNTIES}
+    # 省略「縣」「市」的簡稱，例如「臺東」；新竹、嘉義同時有縣與市，簡稱有歧義所以不收錄
+    shorts: Dict[str, List[int]] = {}
+    for county_id, name in COUNTIES:
+        shorts.setdefault(name[:-1], []).append(county_id)
+    for short, county_ids in shorts.items():
+        if len(county_ids) == 1:
+            index[short] = county_ids[0]
+    for alias, name in _EXTRA_ALIASES.items():
+        index[alias] = ids_by_name[name]
+    return index
+
+
+_ALIAS_INDEX = _build_alias_index()
+
+
+def normalize_county_name(raw: Optional[str]) -> str:
+    """去除編號前綴與空白，並統一「台」為「臺」"""
+    if not raw:
+        return ""
+    name = _SPACE_RE.sub("", str(raw))
+    name = _PREFIX_RE.sub("", name)
+    return name.replace("台", "臺")
+
+
+def resolve_county_id(raw: Optional[str]) -> Optional[int]:
+    """將任意寫法的縣市名稱解析為 county_id，無法辨識時回傳 None"""
+    name = normalize_county_name(raw)
+    if not name:
+        return None
+    county_id = _ALIAS_INDEX.get(name)
+    if county_id is None and name.endswith("線"):
+        # 資料中的錯字：「臺東線」
+        county_id = _ALIAS_INDEX.get(name[:-1] + "縣")
+    return county_id
+
+
+def canonical_county_name(raw: Optional[str]) -> Optional[str]:
+    """回傳標準縣市名稱，無法辨識時回傳 None"""
+    county_id = resolve_county_id(raw)
+    return COUNTY_NAMES.get(county_id) if county_id is not None else None
+
+
+def resolve_county_ids(values: Optional[Iterable[str]]) -> Tuple[List[int], List[str]]:
+    """
+    解析一組縣市名稱
+
+    Returns:
+        (去重後的 county_id 列表, 無法辨識的原始名稱列表)
+    """
+    ids: List[int] = []
+    unresolved: List[str] = []
+    for value in values or []:
+        if not value or not str(value).strip():
+            continue
+        county_id = resolve_county_id(value)
+        if county_id is None:
+            unresolved.append(str(value).strip())
+        elif county_id not in ids:
+            ids.append(county_id)
+    return ids, unresolved
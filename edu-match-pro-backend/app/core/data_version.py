@@ -0,0 +1,44 @@
+"""
+資料版本監看
+ingest 後 data_version 會遞增；記憶體中的衍生資料（列表總數、查詢結果快取）以版本號作為快取鍵的一部分，
+版本變動後舊的項目自然不再命中。版本號本身每隔 refresh_seconds 才重新讀取一次
+"""
+import time
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+
+class DataVersionWatcher:
+    """快取 data_version 的讀取結果，避免每個請求都多一次資料庫往返"""
+
+    def __init__(self, refresh_seconds: float = 30, name: Optional[str] = None):
+        self.refresh_seconds = refresh_seconds
+        self.name = name
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+
+    async def current(self, session: AsyncSession) -> int:
+        """目前的資料版本（必要時以傳入的 session 重新讀取）"""
+        if self._version is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self._version
+        from app.crud.data_version_crud import WIDE_TABLES_DATASET, get_data_version
+
+        self._version = await get_data_version(session, self.name or WIDE_TABLES_DATASET)
+        self._checked_at = time.monotonic()
+        return self._version
+
+    @property
+    def version(self) -> Optional[int]:
+        """最近一次讀到的版本（尚未讀取時為 None）"""
+        return self._version
+
+    def invalidate(self) -> None:
+        """下次呼叫 current() 時強制重新讀取"""
+        self._checked_at = 0.0
+
+
+# wide 表資料版本（/data/* 總數快取與公開查詢快取共用，同一行程只需一份）
+data_version_watcher = DataVersionWatcher(refresh_seconds=settings.data_version_check_seconds)
@@ -0,0 +1,187 @@
+"""
+資料庫引擎設定檔與連線池監控
+依 DB_PROFILE（dev / prod / test）決定 SQL echo、連線池大小、pre-ping、
+asyncpg prepared statement 快取與伺服器端 statement_timeout；個別 DB_* 設定可覆寫設定檔的預設值。
+連線池使用 InstrumentedAsyncQueuePool，記錄取得連線的等待時間與使用率
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Deque, Dict, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+
+@dataclass(frozen=True)
+class EngineProfile:
+    echo: bool = False
+    # None 表示不使用連線池（NullPool，每次都建立新連線）
+    pool_size: Optional[int] = 5
+    max_overflow: int = 10
+    pool_timeout_seconds: float = 30
+    pool_recycle_seconds: int = 1800
+    pool_pre_ping: bool = True
+    # SQLAlchemy asyncpg 方言的 prepared statement LRU 快取大小（經 PgBouncer transaction 模式時需設為 0）
+    statement_cache_size: int = 100
+    # 伺服器端 statement_timeout（毫秒），None 表示不限制
+    statement_timeout_ms: Optional[int] = None
+
+
+ENGINE_PROFILES: Dict[str, EngineProfile] = {
+    # 本機開發：印出 SQL 方便除錯
+    "dev": EngineProfile(echo=True),
+    # 正式環境：不在請求路徑上同步輸出 SQL，連線池依 worker 數調整（每個 worker 一個池）
+    "prod": EngineProfile(
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout_seconds=10,
+        statement_cache_size=500,
+        statement_timeout_ms=15000,
+    ),
+    # 測試：不保留連線，避免跨 event loop 重用
+    "test": EngineProfile(pool_size=None, pool_pre_ping=False, statement_timeout_ms=30000),
+}
+
+
+def resolve_profile(settings: Any) -> EngineProfile:
+    """取得設定檔並套用個別 DB_* 覆寫"""
+    name = settings.db_profile
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"未知的 DB_PROFILE: {name}（可用：{', '.join(ENGINE_PROFILES)}）")
+    overrides = {
+        "echo": settings.db_echo,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout_seconds": settings.db_pool_timeout_seconds,
+        "pool_recycle_seconds": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "statement_cache_size": settings.db_statement_cache_size,
+        "statement_timeout_ms": settings.db_statement_timeout_ms,
+    }
+    return replace(ENGINE_PROFILES[name], **{k: v for k, v in overrides.items() if v is not None})
+
+
+def engine_url(database_url: str, profile: EngineProfile) -> URL:
+    """asyncpg 的 prepared statement 快取大小由 URL 參數設定"""
+    url = make_url(database_url)
+    if url.drivername.endswith("+asyncpg"):
+        url = url.update_query_dict({"prepared_statement_cache_size": str(profile.statement_cache_size)})
+    return url
+
+
+def engine_options(database_url: str, profile: EngineProfile, name: str = "primary") -> Dict[str, Any]:
+    """create_async_engine 的關鍵字參數（name 用來區分主庫與副本的連線池統計）"""
+    options: Dict[str, Any] = {"echo": profile.echo, "pool_pre_ping": profile.pool_pre_ping}
+    if profile.pool_size is None:
+        options["poolclass"] = NullPool
+    else:
+        options.update({
+            "poolclass": InstrumentedAsyncQueuePool,
+            "pool_size": profile.pool_size,
+            "max_overflow": profile.max_overflow,
+            "pool_timeout": profile.pool_timeout_seconds,
+            "pool_recycle": profile.pool_recycle_seconds,
+            "pool_logging_name": name,
+        })
+    if profile.statement_timeout_ms and make_url(database_url).drivername.endswith("+asyncpg"):
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(profile.statement_timeout_ms)}
+        }
+    return options
+
+
+class PoolMetrics:
+    """連線取得等待時間（含 pre-ping 與新建連線）與逾時次數"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent: Deque[float] = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self._recent.append(wait_seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self.checkouts = self.timeouts = 0
+            self.total_wait_seconds = self.max_wait_seconds = 0.0
+
+    @staticmethod
+    def _percentile(ordered: list, fraction: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts = self.checkouts
+            return {
+                "checkouts": checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.total_wait_seconds / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+                "wait_ms_p50": round(self._percentile(recent, 0.50) * 1000, 3),
+                "wait_ms_p95": round(self._percentile(recent, 0.95) * 1000, 3),
+            }
+
+
+# 連線池名稱（pool_logging_name）-> 統計
+_pool_metrics: Dict[str, PoolMetrics] = {}
+_pool_metrics_lock = threading.Lock()
+
+
+def metrics_for(name: Optional[str]) -> PoolMetrics:
+    name = name or "primary"
+    with _pool_metrics_lock:
+        if name not in _pool_metrics:
+            _pool_metrics[name] = PoolMetrics()
+        return _pool_metrics[name]
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """記錄每次取得連線所花時間的 AsyncAdaptedQueuePool"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            metrics_for(self.logging_name).record_timeout()
+            raise
+        metrics_for(self.logging_name).record(time.perf_counter() - start)
+        return connection
+
+
+def pool_stats(engine: Any, profile: EngineProfile) -> Dict[str, Any]:
+    """連線池目前狀態與等待時間統計"""
+    pool = engine.sync_engine.pool
+    data: Dict[str, Any] = {"pool_class": type(pool).__name__, "echo": profile.echo}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        capacity = pool.size() + max(profile.max_overflow, 0)
+        checked_out = pool.checkedout()
+        data.update({
+            "pool_size": pool.size(),
+            "max_overflow": profile.max_overflow,
+            "checked_out": checked_out,
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "utilization": round(checked_out / capacity, 4) if capacity else 0.0,
+        })
+        data.update(metrics_for(pool.logging_name).stats())
+    return data
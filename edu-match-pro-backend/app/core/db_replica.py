@@ -0,0 +1,99 @@
+"""
+讀取副本（read replica）路由
+唯讀端點透過 get_read_session 連到 REPLICA_DATABASE_URL；副本無法連線或複寫延遲超過
+REPLICA_MAX_LAG_SECONDS 時退回主庫。健康狀態每隔 REPLICA_HEALTH_CHECK_SECONDS 才重新檢查一次
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# 不是副本（例如本機測試用的第二個獨立實例）或已重播完所有收到的 WAL 時延遲為 0；
+# 只看 pg_last_xact_replay_timestamp() 會把閒置主庫的副本誤判為落後
+REPLICATION_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """決定唯讀請求是否使用副本，並記錄路由統計"""
+
+    def __init__(
+        self,
+        engine: Optional[AsyncEngine],
+        check_interval_seconds: float = 10,
+        max_lag_seconds: Optional[float] = 30,
+        check_timeout_seconds: float = 2,
+    ):
+        self.engine = engine
+        self.check_interval_seconds = check_interval_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.check_timeout_seconds = check_timeout_seconds
+        self._healthy = False
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.replica_sessions = 0
+        self.primary_fallbacks = 0
+
+    @property
+    def configured(self) -> bool:
+        return self.engine is not None
+
+    async def _measure_lag(self) -> float:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(REPLICATION_LAG_SQL)
+            return float(result.scalar() or 0)
+
+    async def check(self) -> bool:
+        """立即檢查副本的連線與複寫延遲"""
+        try:
+            lag = await asyncio.wait_for(self._measure_lag(), timeout=self.check_timeout_seconds)
+        except Exception as e:
+            if self._healthy or self._checked_at is None:
+                print(f"[讀取副本] 無法使用副本，改用主庫: {type(e).__name__}: {e}")
+            self._healthy = False
+            self.lag_seconds = None
+            self.last_error = f"{type(e).__name__}: {e}"
+        else:
+            self.lag_seconds = lag
+            self.last_error = None
+            healthy = self.max_lag_seconds is None or lag <= self.max_lag_seconds
+            if self._healthy and not healthy:
+                print(f"[讀取副本] 複寫延遲 {lag:.1f} 秒超過上限，改用主庫")
+            self._healthy = healthy
+        self._checked_at = time.monotonic()
+        return self._healthy
+
+    async def use_replica(self) -> bool:
+        """此次請求是否使用副本（同時更新路由統計）"""
+        if not self.configured:
+            return False
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval_seconds:
+            async with self._lock:
+                # 等待鎖期間可能已由其他請求完成檢查
+                if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval_seconds:
+                    await self.check()
+        if self._healthy:
+            self.replica_sessions += 1
+        else:
+            self.primary_fallbacks += 1
+        return self._healthy
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.configured,
+            "healthy": self._healthy,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "last_error": self.last_error,
+            "replica_sessions": self.replica_sessions,
+            "primary_fallbacks": self.primary_fallbacks,
+        }
@@ -47,6 +47,12 @@ class ConflictError(EduMatchProException):
         super().__init__(message, status.HTTP_409_CONFLICT)
 
 
+class ServiceUnavailableError(EduMatchProException):
+    """服務暫時不可用錯誤（例如背景工作佇列已滿）"""
+    def __init__(self, message: str = "Service unavailable"):
+        super().__init__(message, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 async def global_exception_handler(request: Request, exc: Exception) -> JSONResponse:
     """全局異常處理器"""
     
@@ -0,0 +1,66 @@
+"""
+HTTP 條件式請求（ETag / If-None-Match）與 Cache-Control
+- wide 表資料：ETag 由「端點 + 正規化查詢參數 + data_version」產生，不需查詢資料即可判斷是否變動
+- 其他唯讀資源：ETag 為回應內容的雜湊
+客戶端（或前端與 ngrok / GitHub Pages 之間的 CDN）帶回相同 ETag 時回傳 304，不重送內容
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.data_version import data_version_watcher
+from app.core.query_cache import normalize_params
+
+# wide 表只在 ingest 時變動：瀏覽器短暫快取，CDN 可快取較久，過期後以 ETag 重新驗證
+WIDE_DATA_CACHE_CONTROL = (
+    f"public, max-age={settings.http_cache_max_age_seconds}, "
+    f"s-maxage={settings.http_cache_shared_max_age_seconds}"
+)
+# 隨時可能變動的統計：每次都需重新驗證（內容未變時仍只回 304）
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+# 靜態內容（目前為模擬資料，只在部署時變動）
+STATIC_CACHE_CONTROL = f"public, max-age={settings.http_cache_static_max_age_seconds}"
+
+
+def make_etag(*parts: Any) -> str:
+    """以任意可 JSON 化的內容產生弱 ETag（表示語意相同，不保證位元組完全相同）"""
+    raw = json.dumps(jsonable_encoder(parts), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return f'W/"{hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否包含此 ETag（依 RFC 9110 使用弱比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def conditional_response(request: Request, response: Response, etag: str, cache_control: str) -> Optional[Response]:
+    """
+    設定 ETag 與 Cache-Control；客戶端的快取仍有效時回傳 304 回應（呼叫端直接回傳即可），否則回傳 None
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+async def wide_data_etag(session: AsyncSession, endpoint: str, params: Dict[str, Any]) -> str:
+    """wide 表端點的 ETag（資料版本在 data_version_check_seconds 內不會重新查詢）"""
+    version = await data_version_watcher.current(session)
+    return make_etag(endpoint, normalize_params(params), version)
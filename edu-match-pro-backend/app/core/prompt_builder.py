@@ -0,0 +1,157 @@
+"""
+提示詞組裝工具
+在送給模型前壓縮提示詞：估算 token 數、以緊湊表格序列化學校資料、
+摘要較早的對話輪次，並讓每次調用不超過 token 預算；同時記錄提示詞大小統計
+"""
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# CJK 文字（含全形標點）大約一字一個 token，其他文字大約四個字元一個 token
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估文字的 token 數（不呼叫 API，誤差約一至兩成）"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value).replace("|", "/").replace("\n", " ").strip()
+
+
+def compact_table(rows: Sequence[Dict[str, Any]], columns: Sequence[Tuple[str, str]]) -> str:
+    """
+    將資料列序列化為以 | 分隔的緊湊表格（比縮排 JSON 少很多 token）
+
+    Args:
+        rows: 資料列
+        columns: (欄位鍵, 表頭名稱) 列表；所有列都為空的欄位會被省略
+    """
+    if not rows:
+        return "（無資料）"
+    used = [(key, header) for key, header in columns if any(_format_cell(row.get(key)) for row in rows)]
+    if not used:
+        return "（無資料）"
+    lines = ["|".join(header for _, header in used)]
+    for row in rows:
+        lines.append("|".join(_format_cell(row.get(key)) for key, _ in used))
+    return "\n".join(lines)
+
+
+def compact_params(params: Dict[str, Any]) -> str:
+    """以「鍵: 值」的單行格式列出非空參數"""
+    parts = []
+    for key, value in params.items():
+        if value in (None, "", [], {}):
+            continue
+        if isinstance(value, (list, tuple)):
+            value = "、".join(str(v) for v in value)
+        parts.append(f"{key}: {value}")
+    return "；".join(parts) if parts else "（尚無）"
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def format_history(
+    history: Optional[List[Dict]],
+    recent_turns: int,
+    max_chars_per_turn: int = 300,
+    user_label: str = "用戶",
+    assistant_label: str = "小匯",
+    summary_max_chars: int = 200,
+) -> str:
+    """
+    格式化對話歷史：最近 recent_turns 則保留原文（過長時截斷），
+    更早的只保留用戶說過的重點，壓成一行摘要
+    """
+    if not history:
+        return ""
+
+    older = history[:-recent_turns] if recent_turns > 0 else history
+    recent = history[-recent_turns:] if recent_turns > 0 else []
+
+    lines = []
+    older_user = [_truncate(m.get("content", ""), 60) for m in older if m.get("role") == "user" and m.get("content")]
+    if older_user:
+        lines.append(f"（較早對話摘要，用戶提過：{_truncate('；'.join(older_user), summary_max_chars)}）")
+    for msg in recent:
+        label = user_label if msg.get("role") == "user" else assistant_label
+        lines.append(f"{label}: {_truncate(msg.get('content', ''), max_chars_per_turn)}")
+    return "\n".join(lines)
+
+
+def fit_rows_to_budget(
+    render: Callable[[int], str],
+    max_rows: int,
+    budget_tokens: int,
+    min_rows: int = 3,
+) -> Tuple[str, int]:
+    """
+    在 token 預算內放入最多的資料列
+
+    Args:
+        render: 給定列數，產生完整提示詞的函式
+        max_rows: 最多列數
+        budget_tokens: token 預算
+        min_rows: 即使超出預算也至少保留的列數
+
+    Returns:
+        (提示詞, 實際使用的列數)
+    """
+    rows = max_rows
+    prompt = render(rows)
+    while rows > min_rows and estimate_tokens(prompt) > budget_tokens:
+        # 依超出比例縮減，避免逐列重算
+        over = estimate_tokens(prompt) / budget_tokens
+        rows = max(min_rows, min(rows - 1, int(rows / over)))
+        prompt = render(rows)
+    return prompt, rows
+
+
+class PromptMetrics:
+    """各類提示詞的大小統計（估算 token 數）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, kind: str, prompt: str, budget_tokens: Optional[int] = None, trimmed: bool = False) -> int:
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            entry = self._data.setdefault(kind, {
+                "calls": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0,
+                "over_budget": 0, "trimmed": 0, "budget_tokens": budget_tokens,
+            })
+            entry["calls"] += 1
+            entry["total_tokens"] += tokens
+            entry["max_tokens"] = max(entry["max_tokens"], tokens)
+            entry["last_tokens"] = tokens
+            if trimmed:
+                entry["trimmed"] += 1
+            if budget_tokens is not None and tokens > budget_tokens:
+                entry["over_budget"] += 1
+        return tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for kind, entry in self._data.items():
+                data = dict(entry)
+                data["avg_tokens"] = round(entry["total_tokens"] / entry["calls"], 1) if entry["calls"] else 0
+                result[kind] = data
+            return result
+
+
+prompt_metrics = PromptMetrics()
@@ -0,0 +1,93 @@
+"""
+公開查詢快取
+/schools、/data/* 等端點的結果與使用者無關，只在 ingest 時變動：
+以「端點 + 正規化查詢參數 + 資料版本」為鍵快取整個回應。
+ingest 遞增 data_version 後所有舊項目一次失效（不再命中，之後由 LRU / TTL 淘汰）
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUTTLCache, MISSING
+from app.core.config import settings
+from app.core.data_version import DataVersionWatcher, data_version_watcher
+
+
+def normalize_params(params: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """
+    正規化查詢參數：字串去除頭尾空白、None 視同未提供，依名稱排序
+    空字串仍保留（例如 cursor="" 代表 keyset 第一頁，與未提供 cursor 不同）
+    """
+    normalized = []
+    for name, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        normalized.append((name, value))
+    return tuple(sorted(normalized))
+
+
+class PublicQueryCache:
+    """以資料版本戳記失效的唯讀查詢快取"""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 600,
+        enabled: bool = True,
+        version_watcher: Optional[DataVersionWatcher] = None,
+    ):
+        self.enabled = enabled
+        self.version_watcher = version_watcher or data_version_watcher
+        self._cache: LRUTTLCache[Any] = LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._endpoint_stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict[str, Any], version: int) -> Hashable:
+        return endpoint, normalize_params(params), version
+
+    async def get_or_load(
+        self,
+        session: AsyncSession,
+        endpoint: str,
+        params: Dict[str, Any],
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        命中時直接回傳快取的回應，否則呼叫 loader 並寫入快取
+        loader 拋出的例外不會被快取
+        """
+        if not self.enabled:
+            return await loader()
+
+        key = self.make_key(endpoint, params, await self.version_watcher.current(session))
+        counters = self._endpoint_stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+        cached = self._cache.get(key)
+        if cached is not MISSING:
+            counters["hits"] += 1
+            return cached
+
+        counters["misses"] += 1
+        value = await loader()
+        self._cache.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        data = self._cache.stats_dict()
+        data.update({
+            "enabled": self.enabled,
+            "data_version": self.version_watcher.version,
+            "endpoints": {name: dict(counters) for name, counters in self._endpoint_stats.items()},
+        })
+        return data
+
+
+public_query_cache = PublicQueryCache(
+    max_entries=settings.public_query_cache_max_entries,
+    ttl_seconds=settings.public_query_cache_ttl_seconds,
+    enabled=settings.public_query_cache_enabled,
+)
@@ -0,0 +1,177 @@
+"""
+學校名稱自動完成索引（行程內）
+wide_faraway3 的學校 / 分校名稱只有數千筆，且只在 ingest 後才會變動；
+啟動時一次載入並建立字元 n-gram 倒排索引，之後每次輸入都直接在記憶體中查詢。
+ingest 腳本會遞增 data_version，索引定期比對版本號，變動時才重新載入。
+"""
+import asyncio
+import heapq
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+
+def normalize_name(text: str) -> str:
+    """比對用的正規化：去空白、統一「台」為「臺」、英文轉小寫"""
+    return "".join(str(text).split()).replace("台", "臺").lower()
+
+
+def _grams(text: str, n: int) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SchoolNameIndex:
+    """
+    不可變的名稱索引：單字與雙字（bigram）倒排表
+
+    排序規則：完全相同 > 開頭相同 > 分校名稱開頭相同 > 包含（越前面越好）> 名稱越短越好；
+    沒有任何名稱包含搜尋字串時，退回以 bigram 重疊比例做模糊比對（容忍打錯一兩個字）。
+    """
+
+    # 模糊比對時至少需要重疊的 bigram 比例
+    FUZZY_MIN_OVERLAP = 0.5
+
+    def __init__(self, names: List[str], version: int = 0):
+        self.names = sorted(set(n for n in names if n))
+        self.version = version
+        self.built_at = time.time()
+        self._normalized = [normalize_name(n) for n in self.names]
+        self._unigrams: Dict[str, List[int]] = {}
+        self._bigrams: Dict[str, List[int]] = {}
+        for i, name in enumerate(self._normalized):
+            for gram in _grams(name, 1):
+                self._unigrams.setdefault(gram, []).append(i)
+            for gram in _grams(name, 2):
+                self._bigrams.setdefault(gram, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _candidates(self, query: str) -> Set[int]:
+        """包含查詢字串所有 n-gram 的名稱（仍需驗證是否真的包含）"""
+        if len(query) == 1:
+            return set(self._unigrams.get(query, []))
+        postings = [self._bigrams.get(gram) for gram in _grams(query, 2)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+            if not result:
+                break
+        return result
+
+    def _rank(self, i: int, query: str) -> Optional[Tuple[int, int, int, str]]:
+        name = self._normalized[i]
+        position = name.find(query)
+        if position < 0:
+            return None
+        if name == query:
+            tier = 0
+        elif position == 0:
+            tier = 1
+        elif name[position - 1] == "-":
+            # 「本校名稱-分校分班名稱」的分校部分開頭相同
+            tier = 2
+        else:
+            tier = 3
+        return tier, position, len(name), self.names[i]
+
+    def _fuzzy(self, query: str, limit: int) -> List[str]:
+        query_grams = _grams(query, 2)
+        if not query_grams:
+            return []
+        overlap: Dict[int, int] = {}
+        for gram in query_grams:
+            for i in self._bigrams.get(gram, []):
+                overlap[i] = overlap.get(i, 0) + 1
+        needed = max(1, int(len(query_grams) * self.FUZZY_MIN_OVERLAP + 0.999))
+        scored = [
+            (-count, len(self._normalized[i]), self.names[i])
+            for i, count in overlap.items() if count >= needed
+        ]
+        return [name for _, _, name in heapq.nsmallest(limit, scored)]
+
+    def search(self, query: str = "", limit: int = 100) -> List[str]:
+        """回傳最相符的前 limit 個名稱；空字串時依名稱排序回傳"""
+        query = normalize_name(query or "")
+        if not query:
+            return self.names[:limit]
+        ranked = [rank for rank in (self._rank(i, query) for i in self._candidates(query)) if rank]
+        if ranked:
+            return [rank[-1] for rank in heapq.nsmallest(limit, ranked)]
+        return self._fuzzy(query, limit)
+
+
+class SchoolNameAutocomplete:
+    """
+    管理目前使用中的索引：第一次查詢（或啟動預熱）時建立，
+    之後每隔 refresh_seconds 讀一次 data_version，版本變動才重新載入
+    """
+
+    def __init__(self, refresh_seconds: float = 60, session_factory: Optional[Callable[[], AsyncSession]] = None):
+        self.refresh_seconds = refresh_seconds
+        self._session_factory = session_factory
+        self._index: Optional[SchoolNameIndex] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.rebuilds = 0
+
+    async def _factory(self) -> Callable[[], AsyncSession]:
+        if self._session_factory is not None:
+            return self._session_factory
+        # 索引只讀取資料：設定讀取副本時使用副本
+        from app.db import read_session_factory
+        return await read_session_factory()
+
+    async def _refresh(self) -> SchoolNameIndex:
+        from app.crud.data_version_crud import get_data_version
+        from app.crud.school_search_crud import list_school_names
+
+        async with self._lock:
+            if self._index is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+                return self._index
+            async with (await self._factory())() as session:
+                version = await get_data_version(session)
+                if self._index is None or self._index.version != version:
+                    started = time.perf_counter()
+                    names = await list_school_names(session)
+                    self._index = SchoolNameIndex(names, version=version)
+                    self.rebuilds += 1
+                    print(f"[學校索引] 已載入 {len(self._index)} 個學校名稱（資料版本 {version}，"
+                          f"{(time.perf_counter() - started) * 1000:.0f}ms）")
+            self._checked_at = time.monotonic()
+            return self._index
+
+    async def get_index(self) -> SchoolNameIndex:
+        if self._index is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self._index
+        try:
+            return await self._refresh()
+        except Exception as e:
+            if self._index is None:
+                raise
+            # 版本檢查失敗時沿用舊索引，下次再試
+            print(f"[學校索引] 無法檢查資料版本，沿用目前的索引: {e}")
+            self._checked_at = time.monotonic()
+            return self._index
+
+    async def search(self, query: str = "", limit: int = 100) -> List[str]:
+        return (await self.get_index()).search(query, limit)
+
+    def stats(self) -> Dict[str, object]:
+        index = self._index
+        return {
+            "loaded": index is not None,
+            "names": len(index) if index else 0,
+            "version": index.version if index else None,
+            "built_at": index.built_at if index else None,
+            "rebuilds": self.rebuilds,
+        }
+
+
+school_name_autocomplete = SchoolNameAutocomplete(refresh_seconds=settings.school_autocomplete_refresh_seconds)
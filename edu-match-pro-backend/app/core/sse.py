@@ -0,0 +1,30 @@
+"""
+Server-Sent Events 工具
+將事件格式化為 text/event-stream，並建立適合 ngrok / 反向代理的串流回應
+"""
+import json
+from typing import Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+# 關閉代理緩衝，讓每個事件立即送達客戶端
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """格式化單一 SSE 事件；data 以 JSON 編碼，內容中的換行不會破壞事件邊界"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_comment(text: str = "") -> str:
+    """SSE 註解行（客戶端會忽略），用來立即送出第一個位元組或保持連線"""
+    return f": {text}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,56 @@
+"""
+彙總 materialized view CRUD
+wide 表的統計數字只在 ingest 後才會變動，預先彙總成 materialized view，
+API 只讀一列（或依縣市索引讀取）；ingest 完成後以 REFRESH ... CONCURRENTLY 更新，更新期間讀取不會被阻塞
+"""
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# 每個 view 都有唯一索引，才能使用 CONCURRENTLY
+AGGREGATE_VIEWS = ["mv_wide_table_stats", "mv_county_education_stats"]
+
+
+async def refresh_aggregate_view(session: AsyncSession, view: str) -> None:
+    """更新單一 materialized view（不會 commit，由呼叫端決定交易範圍）"""
+    if view not in AGGREGATE_VIEWS:
+        raise ValueError(f"未知的 materialized view: {view}")
+    await session.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+
+
+async def get_wide_table_stats(session: AsyncSession) -> Optional[Dict[str, Any]]:
+    """讀取 /data/statistics 的彙總數字；view 尚未有資料時回傳 None"""
+    result = await session.execute(text("""
+        SELECT faraway_total, faraway_counties, faraway_total_classes, faraway_total_students,
+               education_total,
+               devices_total, devices_counties,
+               volunteer_total, volunteer_counties, volunteer_schools,
+               refreshed_at
+        FROM mv_wide_table_stats
+        WHERE id = 1
+    """))
+    row = result.fetchone()
+    if row is None:
+        return None
+    return {
+        "faraway_schools": {
+            "total_records": row[0],
+            "counties": row[1],
+            "total_classes": row[2],
+            "total_students": row[3]
+        },
+        "education_statistics": {
+            "total_records": row[4]
+        },
+        "connected_devices": {
+            "total_records": row[5],
+            "counties": row[6]
+        },
+        "volunteer_teams": {
+            "total_records": row[7],
+            "counties": row[8],
+            "volunteer_schools": row[9]
+        },
+        "refreshed_at": row[10].isoformat() if row[10] else None
+    }
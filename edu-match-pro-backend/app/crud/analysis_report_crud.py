@@ -0,0 +1,120 @@
+import json
+import uuid
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, or_, select
+from sqlmodel import col
+from app.models.analysis_report import AnalysisReport, AnalysisJobStatus
+
+
+def hash_analysis_params(user_params: Dict[str, Any]) -> str:
+    """計算分析參數的雜湊（忽略空值與鍵順序），用來辨識相同的參數組合"""
+    normalized = {k: v for k, v in user_params.items() if v not in (None, "", [], {})}
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_analysis_job(session: AsyncSession, job_id: uuid.UUID) -> Optional[AnalysisReport]:
+    """根據 job id 獲取分析工作"""
+    result = await session.execute(
+        select(AnalysisReport).where(AnalysisReport.id == job_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_reusable_report(session: AsyncSession, params_hash: str, max_age: timedelta) -> Optional[AnalysisReport]:
+    """獲取相同參數且仍在有效期內的已完成報告"""
+    result = await session.execute(
+        select(AnalysisReport)
+        .where(
+            AnalysisReport.params_hash == params_hash,
+            AnalysisReport.status == AnalysisJobStatus.completed,
+            col(AnalysisReport.completed_at) >= datetime.utcnow() - max_age
+        )
+        .order_by(col(AnalysisReport.completed_at).desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_inflight_job(
+    session: AsyncSession,
+    params_hash: str,
+    queue_timeout: timedelta,
+    run_timeout: timedelta
+) -> Optional[AnalysisReport]:
+    """
+    獲取相同參數、尚在排隊或執行中的工作
+
+    排隊超過 queue_timeout（從建立起算）或執行超過 run_timeout（從 started_at 起算）的視為已失效
+    """
+    now = datetime.utcnow()
+    started_at = func.coalesce(col(AnalysisReport.started_at), col(AnalysisReport.created_at))
+    result = await session.execute(
+        select(AnalysisReport)
+        .where(
+            AnalysisReport.params_hash == params_hash,
+            or_(
+                and_(AnalysisReport.status == AnalysisJobStatus.queued,
+                     col(AnalysisReport.created_at) >= now - queue_timeout),
+                and_(AnalysisReport.status == AnalysisJobStatus.running,
+                     started_at >= now - run_timeout),
+            )
+        )
+        .order_by(col(AnalysisReport.created_at).desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def create_analysis_job(
+    session: AsyncSession,
+    job_id: uuid.UUID,
+    params_hash: str,
+    user_params: Dict[str, Any]
+) -> AnalysisReport:
+    """建立排隊中的分析工作（job_id 由呼叫端產生，排入佇列時不需再讀取 job.id）"""
+    job = AnalysisReport(
+        id=job_id,
+        params_hash=params_hash,
+        user_params=json.dumps(user_params, ensure_ascii=False, default=str),
+        status=AnalysisJobStatus.queued
+    )
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+
+async def update_analysis_job(
+    session: AsyncSession,
+    job_id: uuid.UUID,
+    status: AnalysisJobStatus,
+    report: Optional[str] = None,
+    school_data: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None
+) -> Optional[AnalysisReport]:
+    """更新分析工作的狀態與結果"""
+    job = await get_analysis_job(session, job_id)
+    if not job:
+        return None
+
+    now = datetime.utcnow()
+    job.status = status
+    job.updated_at = now
+    if report is not None:
+        job.report = report
+    if school_data is not None:
+        job.school_data = json.dumps(school_data, ensure_ascii=False, default=str)
+    if error is not None:
+        job.error = error[:1000]
+    if status == AnalysisJobStatus.running:
+        job.started_at = now
+    if status in (AnalysisJobStatus.completed, AnalysisJobStatus.failed):
+        job.completed_at = now
+
+    await session.commit()
+    await session.refresh(job)
+    return job
@@ -3,7 +3,7 @@
 提供通用的數據庫操作和錯誤處理
 """
 import uuid
-from typing import TypeVar, Generic, List, Optional, Type, Any, Dict
+from typing import TypeVar, Generic, List, Optional, Type, Any, Awaitable, Callable, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from sqlalchemy.exc import IntegrityError, NoResultFound
@@ -13,6 +13,8 @@ from app.models.base import BaseModel
 ModelType = TypeVar("ModelType", bound=BaseModel)
 CreateSchemaType = TypeVar("CreateSchemaType")
 UpdateSchemaType = TypeVar("UpdateSchemaType")
+# 在 commit 前於同一交易內執行的額外寫入（例如更新彙總表）
+BeforeCommit = Optional[Callable[[Any], Awaitable[None]]]
 
 
 class BaseCRUD(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
@@ -76,7 +78,7 @@ class BaseCRUD(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 detail=f"Failed to get {self.model.__name__} list: {str(e)}"
             )
     
-    async def create(self, session: AsyncSession, obj_in: CreateSchemaType) -> ModelType:
+    async def create(self, session: AsyncSession, obj_in: CreateSchemaType, before_commit: BeforeCommit = None) -> ModelType:
         """創建新記錄"""
         try:
             # 將 Pydantic 模型轉換為 SQLModel 實例
@@ -87,6 +89,8 @@ class BaseCRUD(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             
             db_obj = self.model(**obj_data)
             session.add(db_obj)
+            if before_commit:
+                await before_commit(db_obj)
             await session.commit()
             await session.refresh(db_obj)
             return db_obj
@@ -107,7 +111,8 @@ class BaseCRUD(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         self, 
         session: AsyncSession, 
         db_obj: ModelType, 
-        obj_in: UpdateSchemaType
+        obj_in: UpdateSchemaType,
+        before_commit: BeforeCommit = None
     ) -> ModelType:
         """更新記錄"""
         try:
@@ -120,6 +125,8 @@ class BaseCRUD(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 if hasattr(db_obj, field):
                     setattr(db_obj, field, value)
             
+            if before_commit:
+                await before_commit(db_obj)
             await session.commit()
             await session.refresh(db_obj)
             return db_obj
@@ -130,7 +137,7 @@ class BaseCRUD(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 detail=f"Failed to update {self.model.__name__}: {str(e)}"
             )
     
-    async def delete(self, session: AsyncSession, id: uuid.UUID) -> bool:
+    async def delete(self, session: AsyncSession, id: uuid.UUID, before_commit: BeforeCommit = None) -> bool:
         """刪除記錄"""
         try:
             result = await session.execute(
@@ -145,6 +152,8 @@ class BaseCRUD(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 )
             
             await session.delete(db_obj)
+            if before_commit:
+                await before_commit(db_obj)
             await session.commit()
             return True
         except HTTPException:
@@ -0,0 +1,103 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Text, cast, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from app.models.conversation import ConversationSession, ConversationTurn
+
+
+async def create_conversation(session: AsyncSession) -> ConversationSession:
+    """建立新的對話 session"""
+    conversation = ConversationSession(params="{}", updated_at=datetime.utcnow())
+    session.add(conversation)
+    await session.commit()
+    await session.refresh(conversation)
+    return conversation
+
+
+async def get_conversation(
+    session: AsyncSession,
+    conversation_id: uuid.UUID,
+    max_age: timedelta
+) -> Optional[Tuple[ConversationSession, List[ConversationTurn]]]:
+    """獲取未過期的對話 session 及其所有訊息（依順序）"""
+    result = await session.execute(
+        select(ConversationSession).where(
+            ConversationSession.id == conversation_id,
+            ConversationSession.updated_at >= datetime.utcnow() - max_age  # type: ignore[operator]
+        )
+    )
+    conversation = result.scalar_one_or_none()
+    if not conversation:
+        return None
+
+    turns = await session.execute(
+        select(ConversationTurn)
+        .where(ConversationTurn.session_id == conversation_id)
+        .order_by(ConversationTurn.seq)
+    )
+    return conversation, list(turns.scalars().all())
+
+
+async def append_conversation_turns(
+    session: AsyncSession,
+    conversation_id: uuid.UUID,
+    turns: List[Dict[str, str]],
+    params: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    新增訊息並把本輪參數合併進 session，回傳合併後的參數（session 不存在時回傳 None）
+
+    先以 SELECT ... FOR UPDATE 鎖住 session 列，多個 worker 同時寫入同一個 session 時依序進行、
+    訊息序號不重複；參數在資料庫內以 jsonb || 合併，不會以過期的副本覆蓋其他 worker 寫入的參數
+    """
+    locked = await session.execute(
+        select(ConversationSession.id)
+        .where(ConversationSession.id == conversation_id)
+        .with_for_update()
+    )
+    if locked.scalar_one_or_none() is None:
+        await session.rollback()
+        return None
+
+    result = await session.execute(
+        select(func.coalesce(func.max(ConversationTurn.seq), -1))
+        .where(ConversationTurn.session_id == conversation_id)
+    )
+    next_seq = result.scalar_one() + 1
+
+    for offset, turn in enumerate(turns):
+        session.add(ConversationTurn(
+            session_id=conversation_id,
+            seq=next_seq + offset,
+            role=turn.get("role", "user"),
+            content=turn.get("content", "")
+        ))
+
+    delta = literal(json.dumps(params, ensure_ascii=False, default=str), Text)
+    merged = await session.execute(
+        update(ConversationSession)
+        .where(ConversationSession.id == conversation_id)
+        .values(
+            params=cast(cast(ConversationSession.params, JSONB).op("||")(cast(delta, JSONB)), Text),
+            updated_at=datetime.utcnow()
+        )
+        .returning(ConversationSession.params)
+        .execution_options(synchronize_session=False)
+    )
+    merged_params = merged.scalar_one()
+    await session.commit()
+    return json.loads(merged_params)
+
+
+async def purge_expired_conversations(session: AsyncSession, max_age: timedelta) -> int:
+    """刪除超過存活時間的對話 session（訊息由外鍵 ON DELETE CASCADE 一併刪除）"""
+    result = await session.execute(
+        delete(ConversationSession).where(
+            ConversationSession.updated_at < datetime.utcnow() - max_age  # type: ignore[operator]
+        )
+    )
+    await session.commit()
+    return result.rowcount or 0
@@ -1,157 +1,132 @@
+import logging
 import uuid
 from typing import Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import Integer, and_, cast, func, select, true
+from sqlalchemy.exc import SQLAlchemyError
 from app.models.need import Need, NeedStatus
 from app.models.donation import Donation, DonationStatus
+from app.core.config import settings
+from app.crud.stats_rollup_crud import get_company_stats, get_school_stats
+
+logger = logging.getLogger(__name__)
 
 
 async def _get_need_stats(session: AsyncSession, school_id: uuid.UUID = None, company_id: uuid.UUID = None) -> Dict[str, int]:
-    """獲取需求統計數據的通用函數"""
-    base_query = select(Need)
-    if school_id:
-        base_query = base_query.where(Need.school_id == school_id)
-    
-    # 總需求數
-    total_result = await session.execute(
-        select(func.count(Need.id)).where(base_query.where() if school_id else Need.id.isnot(None))
-    )
-    total = total_result.scalar() or 0
-    
-    # 活躍需求數
-    active_result = await session.execute(
-        select(func.count(Need.id)).where(
-            base_query.where() if school_id else Need.id.isnot(None),
-            Need.status == NeedStatus.active
-        )
+    """獲取需求統計數據的通用函數（以 FILTER 條件聚合，一次查詢取得所有數字）"""
+    completed = Need.status == NeedStatus.completed
+    query = select(
+        func.count(Need.id),
+        func.count(Need.id).filter(Need.status == NeedStatus.active),
+        func.count(Need.id).filter(completed),
+        func.coalesce(func.sum(Need.student_count).filter(completed), 0)
     )
-    active = active_result.scalar() or 0
-    
-    # 已完成需求數
-    completed_result = await session.execute(
-        select(func.count(Need.id)).where(
-            base_query.where() if school_id else Need.id.isnot(None),
-            Need.status == NeedStatus.completed
-        )
-    )
-    completed = completed_result.scalar() or 0
+    if school_id:
+        # 由 ix_need_school_id_status 支援
+        query = query.where(Need.school_id == school_id)
     
-    # 受益學生數
-    students_result = await session.execute(
-        select(func.coalesce(func.sum(Need.student_count), 0)).where(
-            base_query.where() if school_id else Need.id.isnot(None),
-            Need.status == NeedStatus.completed
-        )
-    )
-    students = students_result.scalar() or 0
+    total, active, completed_count, students = (await session.execute(query)).one()
     
     return {
-        "total": total,
-        "active": active,
-        "completed": completed,
-        "students": students
+        "total": total or 0,
+        "active": active or 0,
+        "completed": completed_count or 0,
+        "students": students or 0
     }
 
 
 async def get_school_dashboard_stats(session: AsyncSession, school_id: uuid.UUID) -> Dict[str, Any]:
-    """獲取學校儀表板統計數據"""
-    
-    # 串行查詢所有統計數據（避免 SQLAlchemy 並行問題）
-    # 查詢總需求數
-    total_needs_result = await session.execute(
-        select(func.count(Need.id)).where(Need.school_id == school_id)
-    )
-    total_needs = total_needs_result.scalar() or 0
-    
-    # 查詢活躍需求數
-    active_needs_result = await session.execute(
-        select(func.count(Need.id)).where(
-            Need.school_id == school_id,
-            Need.status == NeedStatus.active
-        )
-    )
-    active_needs = active_needs_result.scalar() or 0
+    """獲取學校儀表板統計數據（預設讀取 school_stats 彙總列）"""
     
-    # 查詢已完成需求數
-    completed_needs_result = await session.execute(
-        select(func.count(Need.id)).where(
-            Need.school_id == school_id,
-            Need.status == NeedStatus.completed
-        )
-    )
-    completed_needs = completed_needs_result.scalar() or 0
-    
-    # 查詢受益學生數（已完成需求的學生數總和）
-    students_benefited_result = await session.execute(
-        select(func.coalesce(func.sum(Need.student_count), 0)).where(
-            Need.school_id == school_id,
-            Need.status == NeedStatus.completed
-        )
-    )
-    students_benefited = students_benefited_result.scalar() or 0
+    stats = None
+    if settings.dashboard_stats_rollups:
+        try:
+            rollup = await get_school_stats(session, school_id)
+            stats = {
+                "total": rollup.total_needs if rollup else 0,
+                "active": rollup.active_needs if rollup else 0,
+                "completed": rollup.completed_needs if rollup else 0,
+                "students": rollup.students_benefited if rollup else 0
+            }
+        except SQLAlchemyError as e:
+            logger.warning(f"[儀表板] 讀取學校彙總數據時發生錯誤，改用即時計算: {e}")
+            await session.rollback()
+    if stats is None:
+        stats = await _get_need_stats(session, school_id=school_id)
+    total_needs = stats["total"]
+    completed_needs = stats["completed"]
     
     return {
         "totalNeeds": total_needs,
-        "activeNeeds": active_needs,
+        "activeNeeds": stats["active"],
         "completedNeeds": completed_needs,
-        "studentsBenefited": students_benefited,
+        "studentsBenefited": stats["students"],
         "avgResponseTime": 0,  # 暫時設為 0，需要更複雜的計算
         "successRate": round((completed_needs / total_needs * 100) if total_needs > 0 else 0, 2)
     }
 
 
 async def get_company_dashboard_stats(session: AsyncSession, company_id: uuid.UUID) -> Dict[str, Any]:
-    """獲取企業儀表板統計數據（優化版本）"""
+    """獲取企業儀表板統計數據（預設讀取 company_stats 彙總列，成本不隨捐贈歷史增加）"""
+    
+    if settings.dashboard_stats_rollups:
+        try:
+            rollup, sdg_contributions = await get_company_stats(session, company_id)
+            total_donations = rollup.total_donations if rollup else 0
+            completed_donations = rollup.completed_donations if rollup else 0
+            with_duration = rollup.completed_with_duration if rollup else 0
+            return {
+                "completedProjects": completed_donations,
+                "studentsHelped": rollup.students_helped if rollup else 0,
+                "totalDonation": 0,  # 暫時設為 0，需要添加金額字段
+                "volunteerHours": 0,  # 暫時設為 0，需要添加志工時數字段
+                "avgProjectDuration": rollup.completed_duration_days // with_duration if with_duration else 0,
+                "successRate": round((completed_donations / total_donations * 100) if total_donations > 0 else 0, 2),
+                "sdgContributions": sdg_contributions
+            }
+        except SQLAlchemyError as e:
+            logger.warning(f"[儀表板] 讀取企業彙總數據時發生錯誤，改用即時計算: {e}")
+            await session.rollback()
     
     try:
-        # 優化：使用 JOIN 查詢一次性獲取所有關聯數據，避免 N+1 查詢
+        # 在資料庫中聚合，只回傳純量（記憶體用量不隨捐贈數增加）
+        completed = Donation.status == DonationStatus.completed
+        completed_with_dates = and_(completed, Donation.created_at.isnot(None), Donation.updated_at.isnot(None))
+        # 與 timedelta.days 相同：取間隔的完整天數
+        duration_days = cast(func.extract("day", Donation.updated_at - Donation.created_at), Integer)
         result = await session.execute(
-            select(Donation, Need)
+            select(
+                func.count(Donation.id),
+                func.count(Donation.id).filter(completed),
+                func.coalesce(func.sum(Need.student_count).filter(completed), 0),
+                # 整數除法，與原本的 total_days // 筆數 一致
+                func.coalesce(
+                    func.sum(duration_days).filter(completed_with_dates)
+                    // func.nullif(func.count(Donation.id).filter(completed_with_dates), 0),
+                    0
+                )
+            )
             .join(Need, Donation.need_id == Need.id)
             .where(Donation.company_id == company_id)
         )
-        donations_with_needs = result.all()
-        
-        # 分離數據
-        donations = [row[0] for row in donations_with_needs]
-        needs = [row[1] for row in donations_with_needs]
-        
-        # 計算基本統計
-        total_donations = len(donations)
-        completed_donations = len([d for d in donations if d.status == DonationStatus.completed])
-        
-        # 計算受惠學生數和 SDG 貢獻（優化版本）
-        students_helped = 0
-        sdg_contributions = {}
-        
-        # 創建 need_id 到 need 的映射，避免重複查詢
-        need_map = {need.id: need for need in needs}
-        
-        for donation in donations:
-            if donation.status == DonationStatus.completed:
-                need = need_map.get(donation.need_id)
-                if need:
-                    students_helped += need.student_count
-                    
-                    # 統計 SDG 貢獻
-                    if need.sdgs:
-                        for sdg in need.sdgs:
-                            sdg_key = str(sdg)
-                            sdg_contributions[sdg_key] = sdg_contributions.get(sdg_key, 0) + 1
-        
-        # 計算平均專案天數
-        completed_with_dates = [
-            d for d in donations 
-            if d.status == DonationStatus.completed and d.created_at and d.updated_at
-        ]
-        
-        avg_project_duration = 0
-        if completed_with_dates:
-            total_days = sum([
-                (d.updated_at - d.created_at).days 
-                for d in completed_with_dates
-            ])
-            avg_project_duration = total_days // len(completed_with_dates)
+        total_donations, completed_donations, students_helped, avg_project_duration = result.one()
+        total_donations = total_donations or 0
+        completed_donations = completed_donations or 0
+        students_helped = students_helped or 0
+        avg_project_duration = int(avg_project_duration or 0)
+        
+        # SDG 貢獻：展開需求的 sdgs 陣列後分組計數
+        sdg = func.unnest(Need.sdgs).table_valued("sdg").render_derived(name="s")
+        sdg_result = await session.execute(
+            select(sdg.c.sdg, func.count())
+            .select_from(Donation)
+            .join(Need, Donation.need_id == Need.id)
+            .join(sdg, true())
+            .where(Donation.company_id == company_id, completed)
+            .group_by(sdg.c.sdg)
+            .order_by(sdg.c.sdg)
+        )
+        sdg_contributions = {str(sdg_id): count for sdg_id, count in sdg_result.all()}
         
         # 計算成功率
         success_rate = (completed_donations / total_donations * 100) if total_donations > 0 else 0
@@ -184,32 +159,25 @@ async def get_platform_stats(session: AsyncSession) -> Dict[str, Any]:
     """獲取平台整體統計數據"""
     
     try:
-        # 串行查詢所有統計數據（避免 SQLAlchemy 並行問題）
-        # 查詢總學校數（有需求的學校）
-        total_schools_result = await session.execute(
-            select(func.count(func.distinct(Need.school_id)))
-        )
-        total_schools = total_schools_result.scalar() or 0
-        
-        # 查詢總需求數
-        total_needs_result = await session.execute(
-            select(func.count(Need.id))
+        # 單一查詢：需求表的條件聚合，已完成捐贈數以純量子查詢一併取得
+        completed_donations_subquery = (
+            select(func.count(Donation.id))
+            .where(Donation.status == DonationStatus.completed)
+            .scalar_subquery()
         )
-        total_needs = total_needs_result.scalar() or 0
-        
-        # 查詢已完成捐贈數
-        completed_donations_result = await session.execute(
-            select(func.count(Donation.id)).where(Donation.status == DonationStatus.completed)
-        )
-        completed_donations = completed_donations_result.scalar() or 0
-        
-        # 查詢受益學生數（已完成需求的學生數總和）
-        students_benefited_result = await session.execute(
-            select(func.coalesce(func.sum(Need.student_count), 0)).where(
-                Need.status == NeedStatus.completed
+        result = await session.execute(
+            select(
+                func.count(func.distinct(Need.school_id)),
+                func.count(Need.id),
+                func.coalesce(func.sum(Need.student_count).filter(Need.status == NeedStatus.completed), 0),
+                completed_donations_subquery
             )
         )
-        students_benefited = students_benefited_result.scalar() or 0
+        total_schools, total_needs, students_benefited, completed_donations = result.one()
+        total_schools = total_schools or 0
+        total_needs = total_needs or 0
+        students_benefited = students_benefited or 0
+        completed_donations = completed_donations or 0
         
         # 計算配對成功率
         success_rate = round((completed_donations / total_needs * 100) if total_needs > 0 else 0, 2)
@@ -0,0 +1,34 @@
+"""
+資料版本 CRUD
+ingest 腳本匯入 wide 表後遞增版本號；API 行程比對版本號，決定是否重建記憶體中的索引或快取
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# 四張 wide 表共用的資料集名稱
+WIDE_TABLES_DATASET = "wide_tables"
+
+
+async def get_data_version(session: AsyncSession, name: str = WIDE_TABLES_DATASET) -> int:
+    """讀取資料集目前的版本號；尚未有紀錄時回傳 0"""
+    result = await session.execute(
+        text("SELECT version FROM data_version WHERE name = :name"),
+        {"name": name}
+    )
+    version = result.scalar_one_or_none()
+    return int(version) if version is not None else 0
+
+
+async def bump_data_version(session: AsyncSession, name: str = WIDE_TABLES_DATASET) -> int:
+    """遞增資料集的版本號並回傳新版本（不會 commit，由呼叫端決定交易範圍）"""
+    result = await session.execute(
+        text("""
+            INSERT INTO data_version (name, version, updated_at)
+            VALUES (:name, 1, now())
+            ON CONFLICT (name) DO UPDATE
+            SET version = data_version.version + 1, updated_at = now()
+            RETURNING version
+        """),
+        {"name": name}
+    )
+    return int(result.scalar_one())
@@ -10,6 +10,7 @@ from app.models.activity_log import ActivityType
 from app.schemas.donation_schemas import DonationCreate
 from app.crud.activity_log_crud import create_activity_log
 from app.crud.base_crud import BaseCRUD
+from app.crud.stats_rollup_crud import DonationSnapshot, NeedSnapshot, record_donation_change, record_need_change
 
 # 創建 Donation CRUD 實例
 donation_crud = BaseCRUD(Donation)
@@ -32,6 +33,7 @@ async def create_donation(session: AsyncSession, donation_in: DonationCreate, co
         return None
     
     # 更新 Need 狀態為 in_progress
+    need_before = NeedSnapshot.from_need(need)
     need.status = NeedStatus.in_progress
     
     # 建立新的 Donation 物件
@@ -47,6 +49,10 @@ async def create_donation(session: AsyncSession, donation_in: DonationCreate, co
     # 將 Donation 物件加入 session
     session.add(db_donation)
     
+    # 在同一交易內更新學校與企業的儀表板彙總
+    await record_need_change(session, need.school_id, need_before, NeedSnapshot.from_need(need))
+    await record_donation_change(session, company_id, None, DonationSnapshot.from_donation(db_donation, need))
+    
     # 提交交易
     await session.commit()
     await session.refresh(db_donation)
@@ -113,6 +119,8 @@ async def update_donation_progress(session: AsyncSession, donation_id: uuid.UUID
     if not donation:
         return None
     
+    previous_status = donation.status
+    
     # 更新進度
     donation.progress = progress
     
@@ -121,6 +129,13 @@ async def update_donation_progress(session: AsyncSession, donation_id: uuid.UUID
         donation.status = DonationStatus.completed
         donation.completion_date = datetime.utcnow()
     
+    # 狀態變更時在同一交易內更新企業儀表板彙總（完成時才會計入學生數與 SDG）
+    if donation.status != previous_status:
+        need = await session.get(Need, donation.need_id)
+        after = DonationSnapshot.from_donation(donation, need)
+        before = DonationSnapshot(previous_status, after.student_count, after.sdgs, after.duration_days)
+        await record_donation_change(session, donation.company_id, before, after)
+    
     await session.commit()
     await session.refresh(donation)
     
@@ -0,0 +1,103 @@
+"""
+Keyset（游標）分頁
+以排序鍵的最後一筆值作為下一頁的起點（WHERE 排序鍵 > 上一頁最後一筆），
+不論翻到第幾頁都只讀取 limit 筆，成本不隨頁數增加；游標對客戶端是不透明字串
+"""
+import base64
+import json
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class InvalidCursorError(ValueError):
+    """游標格式錯誤或與目前的排序不相符"""
+
+
+@dataclass(frozen=True)
+class KeysetColumn:
+    """排序鍵的一欄"""
+    # SQL 運算式（必須與支援此排序的索引一致，例如 COALESCE("縣市", '')）
+    expression: str
+    descending: bool = False
+    # 從游標還原參數值（例如 uuid.UUID）
+    parse: Callable[[Any], Any] = lambda value: value
+
+
+class KeysetOrder:
+    """
+    一組排序鍵；最後一欄必須唯一（通常是 id），確保排序是全序，翻頁不會漏掉或重複
+    """
+
+    def __init__(self, name: str, columns: Sequence[KeysetColumn]):
+        self.name = name
+        self.columns = list(columns)
+
+    def order_sql(self) -> str:
+        return "ORDER BY " + ", ".join(
+            f"{c.expression} DESC" if c.descending else c.expression for c in self.columns
+        )
+
+    def select_sql(self, prefix: str = "_k") -> str:
+        """附加在 SELECT 清單中的排序鍵欄位，用來產生下一頁的游標"""
+        return ", ".join(f"{c.expression} AS {prefix}{i}" for i, c in enumerate(self.columns))
+
+    def after_clause(self, prefix: str = "cursor_") -> str:
+        """
+        「排在游標之後」的條件
+
+        排序方向一致時使用 row comparison，PostgreSQL 可直接以複合索引做範圍掃描；
+        方向混合時展開為 OR 條件，並加上第一欄的範圍條件讓索引仍能縮小掃描範圍
+        """
+        params = [f":{prefix}{i}" for i in range(len(self.columns))]
+        directions = {c.descending for c in self.columns}
+        if len(directions) == 1:
+            operator = "<" if self.columns[0].descending else ">"
+            left = ", ".join(c.expression for c in self.columns)
+            return f"({left}) {operator} ({', '.join(params)})"
+
+        def expand(i: int) -> str:
+            column = self.columns[i]
+            operator = "<" if column.descending else ">"
+            strict = f"{column.expression} {operator} {params[i]}"
+            if i == len(self.columns) - 1:
+                return strict
+            return f"({strict} OR ({column.expression} = {params[i]} AND {expand(i + 1)}))"
+
+        first = self.columns[0]
+        bound = f"{first.expression} {'<=' if first.descending else '>='} {params[0]}"
+        return f"({bound} AND {expand(0)})"
+
+    def encode(self, values: Sequence[Any]) -> str:
+        payload = json.dumps({"o": self.name, "k": [str(v) if isinstance(v, uuid.UUID) else v for v in values]},
+                             ensure_ascii=False, separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode(self, cursor: str, prefix: str = "cursor_") -> Dict[str, Any]:
+        """解碼游標為查詢參數；格式錯誤時拋出 InvalidCursorError"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+            values = payload["k"]
+            if payload.get("o") != self.name or len(values) != len(self.columns):
+                raise InvalidCursorError("游標與此列表的排序不相符")
+            return {f"{prefix}{i}": column.parse(value) for i, (column, value) in enumerate(zip(self.columns, values))}
+        except InvalidCursorError:
+            raise
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise InvalidCursorError(f"無效的游標: {e}") from e
+
+    def split_row(self, row: Sequence[Any], data_columns: int) -> Tuple[Sequence[Any], List[Any]]:
+        """將查詢結果列拆成 (資料欄位, 排序鍵值)"""
+        return row[:data_columns], list(row[data_columns:data_columns + len(self.columns)])
+
+
+def uuid_key(value: Any) -> uuid.UUID:
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def next_cursor(order: KeysetOrder, last_keys: Optional[List[Any]], fetched: int, limit: int) -> Optional[str]:
+    """多抓一筆判斷是否還有下一頁：fetched > limit 才回傳游標"""
+    if last_keys is None or fetched <= limit:
+        return None
+    return order.encode(last_keys)
@@ -7,6 +7,7 @@ from app.models.activity_log import ActivityType
 from app.schemas.need_schemas import NeedCreate, NeedUpdate
 from app.crud.activity_log_crud import create_activity_log
 from app.crud.base_crud import BaseCRUD
+from app.crud.stats_rollup_crud import NeedSnapshot, record_need_change
 from app.core.exceptions import NotFoundError, ValidationError
 
 
@@ -27,8 +28,11 @@ async def create_need(session: AsyncSession, need_in: NeedCreate, school_id: uui
     need_data['school_id'] = school_id
     need_data['status'] = NeedStatus.active  # 設置默認狀態
     
-    # 使用 BaseCRUD 的 create 方法
-    return await need_crud.create(session, need_data)
+    async def update_rollup(db_need: Need) -> None:
+        await record_need_change(session, school_id, None, NeedSnapshot.from_need(db_need))
+    
+    # 使用 BaseCRUD 的 create 方法（彙總表在同一交易內更新）
+    return await need_crud.create(session, need_data, before_commit=update_rollup)
 
 
 async def get_need_by_id(session: AsyncSession, need_id: uuid.UUID) -> Optional[Need]:
@@ -102,13 +106,21 @@ async def get_all_needs_for_companies(session: AsyncSession, skip: int = 0, limi
 
 async def update_need(session: AsyncSession, db_need: Need, need_in: NeedUpdate) -> Need:
     """更新需求"""
-    # 使用 BaseCRUD 的 update 方法
-    return await need_crud.update(session, db_need, need_in)
+    before = NeedSnapshot.from_need(db_need)
+    
+    async def update_rollup(updated: Need) -> None:
+        await record_need_change(session, updated.school_id, before, NeedSnapshot.from_need(updated), need_id=updated.id)
+    
+    # 使用 BaseCRUD 的 update 方法（彙總表在同一交易內更新）
+    return await need_crud.update(session, db_need, need_in, before_commit=update_rollup)
 
 
 async def delete_need(session: AsyncSession, db_need: Need) -> None:
     """刪除需求"""
     if db_need.id is None:
         raise ValidationError("無法刪除未儲存的需求")
-    # 使用 BaseCRUD 的 delete 方法
-    await need_crud.delete(session, db_need.id)
+    async def update_rollup(deleted: Need) -> None:
+        await record_need_change(session, deleted.school_id, NeedSnapshot.from_need(deleted), None)
+    
+    # 使用 BaseCRUD 的 delete 方法（彙總表在同一交易內更新）
+    await need_crud.delete(session, db_need.id, before_commit=update_rollup)
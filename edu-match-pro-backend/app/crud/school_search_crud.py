@@ -0,0 +1,63 @@
+"""
+學校名稱搜尋 CRUD
+註冊頁的學校選單每次輸入都會查詢，使用 pg_trgm GIN 索引支援 ILIKE '%...%'，
+並依 word_similarity 排序，讓最接近輸入的名稱排在前面
+"""
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.sql_filters import SqlFilter
+
+# 顯示名稱："本校名稱"-"分校分班名稱"
+_DISPLAY_NAME_SQL = """
+    CASE 
+        WHEN "分校分班名稱" IS NOT NULL AND "分校分班名稱" != '' 
+        THEN "本校名稱" || '-' || "分校分班名稱"
+        ELSE "本校名稱"
+    END
+"""
+
+
+async def search_school_names(session: AsyncSession, query: str = "", limit: int = 100) -> List[str]:
+    """
+    搜尋學校名稱（wide_faraway3）
+
+    Args:
+        query: 搜尋字串；空字串時依名稱排序回傳前 limit 筆
+        limit: 回傳筆數上限
+
+    Returns:
+        不重複的學校顯示名稱，有搜尋字串時依相似度由高到低排序
+    """
+    filters = SqlFilter()
+    filters.add('("本校名稱" IS NOT NULL AND "本校名稱" != \'\')')
+    filters.contains(['"本校名稱"', '"分校分班名稱"'], "query", query, rank=True)
+
+    # 同一顯示名稱可能出現在多個學年度，取最高分後去重
+    sql = text(f"""
+        SELECT school_name
+        FROM (
+            SELECT {_DISPLAY_NAME_SQL} AS school_name,
+                   {filters.rank_sql() or '0'} AS score
+            FROM wide_faraway3
+            {filters.where_sql()}
+        ) AS matched
+        GROUP BY school_name
+        ORDER BY MAX(score) DESC, school_name
+        LIMIT :limit
+    """)
+    result = await session.execute(sql, filters.bind(limit=limit))
+    return [row[0] for row in result.fetchall()]
+
+
+async def list_school_names(session: AsyncSession) -> List[str]:
+    """列出所有不重複的學校顯示名稱（建立行程內自動完成索引用）"""
+    sql = text(f"""
+        SELECT DISTINCT {_DISPLAY_NAME_SQL} AS school_name
+        FROM wide_faraway3
+        WHERE "本校名稱" IS NOT NULL AND "本校名稱" != ''
+    """)
+    result = await session.execute(sql)
+    return [row[0] for row in result.fetchall()]
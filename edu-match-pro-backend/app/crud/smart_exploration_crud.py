@@ -2,221 +2,221 @@
 智能探索數據查詢 CRUD
 針對四個 wide 表進行優化查詢，減少 API 調用
 """
-from typing import List, Dict, Any, Optional
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+from typing import Awaitable, Callable, List, Dict, Any, Optional
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select, func, and_, or_, text
+from app.core.config import settings
+from app.crud.sql_filters import SqlFilter
 
+# 代表「不篩選縣市」的關鍵字
+ALL_COUNTIES_KEYWORDS = ['全台灣', '全台', '所有縣市', '全部']
 
-async def query_schools_by_criteria(
+
+def _valid_counties(counties: Optional[List[str]]) -> List[str]:
+    """回傳要篩選的縣市；包含「全台灣」等關鍵字或沒有有效值時回傳空列表（不篩選）"""
+    if not counties or any(keyword in str(counties) for keyword in ALL_COUNTIES_KEYWORDS):
+        return []
+    # 過濾掉空字串
+    return [c for c in counties if c and c.strip()]
+
+
+async def _query_faraway_schools(
     session: AsyncSession,
-    counties: Optional[List[str]] = None,
-    area_type: Optional[str] = None,
-    limit: int = 100
-) -> Dict[str, Any]:
-    """
-    根據條件查詢學校數據（省 API 方式：在數據庫層面聚合）
-    
-    Args:
-        session: 數據庫會話
-        counties: 目標縣市列表
-        area_type: 地區屬性
-        limit: 限制返回數量
-    
-    Returns:
-        包含統計數據和學校列表的字典
-    """
-    result = {
-        "faraway_schools": [],
-        "edu_stats": [],
-        "devices_info": [],
-        "volunteer_teams": [],
-        "statistics": {
-            "total_schools": 0,
-            "total_students": 0,
-            "counties_covered": [],
-            "area_types": {}
-        }
-    }
-    
-    # 1. 查詢偏鄉學校數據（wide_faraway3）
+    counties: List[str],
+    area_type: Optional[str],
+    limit: int
+) -> List[Dict[str, Any]]:
+    """查詢偏鄉學校數據（wide_faraway3）"""
     # 注意：列名是「本校名稱」和「分校分班名稱」，學生數需要計算
-    # 縣市名稱格式：「13屏東縣」（前面有數字編號），所以用 LIKE 查詢
-    conditions = []
-    
-    # 如果 counties 包含「全台灣」、「全台」等，則不篩選縣市
-    if counties and not any(keyword in str(counties) for keyword in ['全台灣', '全台', '所有縣市', '全部']):
-        # 過濾掉空字串
-        valid_counties = [c for c in counties if c and c.strip()]
-        if valid_counties:
-            county_conditions = " OR ".join([f"縣市名稱 LIKE '%{county}'" for county in valid_counties])
-            conditions.append(f"({county_conditions})")
-    
-    if area_type:
-        conditions.append(f"地區屬性 = '{area_type}'")
-    
-    if conditions:
-        faraway_query = text(f"""
-            SELECT 縣市名稱, 本校名稱, 分校分班名稱, 地區屬性, 班級數, 
-                   (COALESCE("男學生數[人]", 0) + COALESCE("女學生數[人]", 0)) AS 學生數
-            FROM wide_faraway3
-            WHERE {' AND '.join(conditions)}
-            ORDER BY 學生數 DESC
-            LIMIT {limit}
-        """)
-    else:
-        faraway_query = text(f"""
-            SELECT 縣市名稱, 本校名稱, 分校分班名稱, 地區屬性, 班級數, 
-                   (COALESCE("男學生數[人]", 0) + COALESCE("女學生數[人]", 0)) AS 學生數
-            FROM wide_faraway3
-            ORDER BY 學生數 DESC
-            LIMIT {limit}
-        """)
+    # 縣市名稱格式：「13屏東縣」（前面有數字編號），以 county_id 篩選並回傳 dim_county 的標準名稱
+    filters = SqlFilter()
+    filters.county("w.縣市名稱", "counties", counties, id_column="w.county_id")
+    filters.equals("w.地區屬性", "area_type", area_type)
+    faraway_query = text(f"""
+        SELECT COALESCE(c.name, w.縣市名稱), w.本校名稱, w.分校分班名稱, w.地區屬性, w.班級數, 
+               (COALESCE(w."男學生數[人]", 0) + COALESCE(w."女學生數[人]", 0)) AS 學生數
+        FROM wide_faraway3 AS w
+        LEFT JOIN dim_county AS c ON c.id = w.county_id
+        {filters.where_sql()}
+        ORDER BY 學生數 DESC
+        LIMIT :limit
+    """)
     
     try:
-        faraway_result = await session.execute(faraway_query)
-        faraway_rows = faraway_result.fetchall()
-        
-        for row in faraway_rows:
-            result["faraway_schools"].append({
+        faraway_result = await session.execute(faraway_query, filters.bind(limit=limit))
+        return [
+            {
                 "county": row[0],
                 "school_name": row[1],
                 "branch_name": row[2],
                 "area_type": row[3],
                 "classes": row[4],
                 "students": row[5]
-            })
+            }
+            for row in faraway_result.fetchall()
+        ]
     except Exception as e:
         print(f"[查詢錯誤] 偏鄉學校: {e}")
-    
-    # 2. 查詢教育統計數據（wide_edu_B_1_4）
-    # 注意：表名包含大寫字母，需要用雙引號包裹
-    # 列名：縣市別, 幼兒園[人], 國小[人], 國中[人] 等
-    edu_query_conditions = []
-    if counties and not any(keyword in str(counties) for keyword in ['全台灣', '全台', '所有縣市', '全部']):
-        valid_counties = [c for c in counties if c and c.strip()]
-        if valid_counties:
-            county_conditions = " OR ".join([f"縣市別 LIKE '%{county}'" for county in valid_counties])
-            edu_query_conditions.append(f"({county_conditions})")
-    
-    if edu_query_conditions:
-        edu_query = text(f"""
-            SELECT 縣市別, 
-                   SUM(CAST("幼兒園[人]" AS INTEGER)) as total_kindergarten,
-                   SUM(CAST("國小[人]" AS INTEGER)) as total_elementary,
-                   SUM(CAST("國中[人]" AS INTEGER)) as total_junior,
-                   SUM(CAST("高級中等學校-普通科[人]" AS INTEGER) + 
-                       CAST("高級中等學校-專業群科[人]" AS INTEGER) + 
-                       CAST("高級中等學校-綜合高中[人]" AS INTEGER)) as total_senior
-            FROM "wide_edu_B_1_4"
-            WHERE {' AND '.join(edu_query_conditions)}
-            GROUP BY 縣市別
-        """)
-    else:
-        edu_query = text(f"""
-            SELECT 縣市別, 
-                   SUM(CAST("幼兒園[人]" AS INTEGER)) as total_kindergarten,
-                   SUM(CAST("國小[人]" AS INTEGER)) as total_elementary,
-                   SUM(CAST("國中[人]" AS INTEGER)) as total_junior,
-                   SUM(CAST("高級中等學校-普通科[人]" AS INTEGER) + 
-                       CAST("高級中等學校-專業群科[人]" AS INTEGER) + 
-                       CAST("高級中等學校-綜合高中[人]" AS INTEGER)) as total_senior
-            FROM "wide_edu_B_1_4"
-            GROUP BY 縣市別
-            LIMIT {limit}
-        """)
+        return []
+
+
+async def _query_edu_stats(session: AsyncSession, counties: List[str], limit: int) -> List[Dict[str, Any]]:
+    """查詢教育統計數據（wide_edu_B_1_4 的各縣市彙總，讀取 mv_county_education_stats）"""
+    # 各縣市加總已由 materialized view 預先計算（ingest 後重新整理），這裡只是依縣市讀取
+    filters = SqlFilter()
+    filters.county("county_name", "counties", counties, id_column="county_id")
+
+    edu_query = text(f"""
+        SELECT county_name, total_kindergarten, total_elementary, total_junior, total_senior
+        FROM mv_county_education_stats
+        {filters.where_sql()}
+        ORDER BY county_name
+        LIMIT :limit
+    """)
     
     try:
-        edu_result = await session.execute(edu_query)
-        edu_rows = edu_result.fetchall()
-        
-        for row in edu_rows:
-            result["edu_stats"].append({
+        edu_result = await session.execute(edu_query, filters.bind(limit=limit))
+        return [
+            {
                 "county": row[0],
                 "kindergarten": row[1] or 0,
                 "elementary": row[2] or 0,
                 "junior": row[3] or 0,
                 "senior": row[4] or 0
-            })
+            }
+            for row in edu_result.fetchall()
+        ]
     except Exception as e:
         print(f"[查詢錯誤] 教育統計: {e}")
-    
-    # 3. 查詢電腦設備數據（wide_connected_devices）
+        return []
+
+
+async def _query_devices(session: AsyncSession, counties: List[str], limit: int) -> List[Dict[str, Any]]:
+    """查詢電腦設備數據（wide_connected_devices）"""
     # 列名：教學電腦數
-    devices_query_conditions = []
-    if counties and not any(keyword in str(counties) for keyword in ['全台灣', '全台', '所有縣市', '全部']):
-        valid_counties = [c for c in counties if c and c.strip()]
-        if valid_counties:
-            county_conditions = " OR ".join([f"縣市 LIKE '%{county}'" for county in valid_counties])
-            devices_query_conditions.append(f"({county_conditions})")
-    
-    if devices_query_conditions:
-        devices_query = text(f"""
-            SELECT 縣市, 鄉鎮市區, 學校名稱, 
-                   CAST(教學電腦數 AS INTEGER) as computers
-            FROM wide_connected_devices
-            WHERE {' AND '.join(devices_query_conditions)}
-            ORDER BY computers DESC
-            LIMIT {limit}
-        """)
-    else:
-        devices_query = text(f"""
-            SELECT 縣市, 鄉鎮市區, 學校名稱, 
-                   CAST(教學電腦數 AS INTEGER) as computers
-            FROM wide_connected_devices
-            ORDER BY computers DESC
-            LIMIT {limit}
-        """)
+    filters = SqlFilter()
+    filters.county("w.縣市", "counties", counties, id_column="w.county_id")
+
+    devices_query = text(f"""
+        SELECT COALESCE(c.name, w.縣市), w.鄉鎮市區, w.學校名稱, 
+               CAST(w.教學電腦數 AS INTEGER) as computers
+        FROM wide_connected_devices AS w
+        LEFT JOIN dim_county AS c ON c.id = w.county_id
+        {filters.where_sql()}
+        ORDER BY computers DESC
+        LIMIT :limit
+    """)
     
     try:
-        devices_result = await session.execute(devices_query)
-        devices_rows = devices_result.fetchall()
-        
-        for row in devices_rows:
-            result["devices_info"].append({
+        devices_result = await session.execute(devices_query, filters.bind(limit=limit))
+        return [
+            {
                 "county": row[0],
                 "township": row[1],
                 "school_name": row[2],
                 "computers": row[3] or 0
-            })
+            }
+            for row in devices_result.fetchall()
+        ]
     except Exception as e:
         print(f"[查詢錯誤] 電腦設備: {e}")
-    
-    # 4. 查詢志工團隊數據（wide_volunteer_teams）
+        return []
+
+
+async def _query_volunteer_teams(session: AsyncSession, counties: List[str], limit: int) -> List[Dict[str, Any]]:
+    """查詢志工團隊數據（wide_volunteer_teams）"""
     # 列名：年度, 受服務單位, 志工團隊學校
-    volunteer_query_conditions = []
-    if counties and not any(keyword in str(counties) for keyword in ['全台灣', '全台', '所有縣市', '全部']):
-        valid_counties = [c for c in counties if c and c.strip()]
-        if valid_counties:
-            county_conditions = " OR ".join([f"縣市 LIKE '%{county}'" for county in valid_counties])
-            volunteer_query_conditions.append(f"({county_conditions})")
-    
-    if volunteer_query_conditions:
-        volunteer_query = text(f"""
-            SELECT 年度, 縣市, 受服務單位, 志工團隊學校
-            FROM wide_volunteer_teams
-            WHERE {' AND '.join(volunteer_query_conditions)}
-            LIMIT {limit}
-        """)
-    else:
-        volunteer_query = text(f"""
-            SELECT 年度, 縣市, 受服務單位, 志工團隊學校
-            FROM wide_volunteer_teams
-            LIMIT {limit}
-        """)
+    filters = SqlFilter()
+    filters.county("w.縣市", "counties", counties, id_column="w.county_id")
+
+    volunteer_query = text(f"""
+        SELECT w.年度, COALESCE(c.name, w.縣市), w.受服務單位, w.志工團隊學校
+        FROM wide_volunteer_teams AS w
+        LEFT JOIN dim_county AS c ON c.id = w.county_id
+        {filters.where_sql()}
+        LIMIT :limit
+    """)
     
     try:
-        volunteer_result = await session.execute(volunteer_query)
-        volunteer_rows = volunteer_result.fetchall()
-        
-        for row in volunteer_rows:
-            result["volunteer_teams"].append({
+        volunteer_result = await session.execute(volunteer_query, filters.bind(limit=limit))
+        return [
+            {
                 "year": row[0],
                 "county": row[1],
                 "service_unit": row[2],
                 "volunteer_school": row[3]
-            })
+            }
+            for row in volunteer_result.fetchall()
+        ]
     except Exception as e:
         print(f"[查詢錯誤] 志工團隊: {e}")
+        return []
+
+
+async def _run_in_own_session(
+    session_factory: async_sessionmaker,
+    query: Callable[[AsyncSession], Awaitable[List[Dict[str, Any]]]]
+) -> List[Dict[str, Any]]:
+    """在獨立的 session（獨立的連線池連線）中執行一個查詢"""
+    async with session_factory() as own_session:
+        return await query(own_session)
+
+
+async def query_schools_by_criteria(
+    session: AsyncSession,
+    counties: Optional[List[str]] = None,
+    area_type: Optional[str] = None,
+    limit: int = 100,
+    session_factory: Optional[async_sessionmaker] = None
+) -> Dict[str, Any]:
+    """
+    根據條件查詢學校數據（省 API 方式：在數據庫層面聚合）
+    
+    四個 wide 表的查詢彼此獨立：並行模式下各自使用連線池中的一條連線同時執行，
+    總耗時約等於最慢的那一個查詢；關閉並行模式時依序在傳入的 session 上執行。
+    
+    Args:
+        session: 數據庫會話（依序模式使用）
+        counties: 目標縣市列表
+        area_type: 地區屬性
+        limit: 限制返回數量
+        session_factory: 並行模式建立 session 的工廠（預設為應用程式的連線池）
+    
+    Returns:
+        包含統計數據和學校列表的字典
+    """
+    valid_counties = _valid_counties(counties)
+    queries: List[Callable[[AsyncSession], Awaitable[List[Dict[str, Any]]]]] = [
+        lambda s: _query_faraway_schools(s, valid_counties, area_type, limit),
+        lambda s: _query_edu_stats(s, valid_counties, limit),
+        lambda s: _query_devices(s, valid_counties, limit),
+        lambda s: _query_volunteer_teams(s, valid_counties, limit),
+    ]
+
+    if settings.smart_exploration_concurrent_queries:
+        if session_factory is None:
+            # 唯讀查詢：設定讀取副本時使用副本
+            from app.db import read_session_factory
+            session_factory = await read_session_factory()
+        faraway, edu_stats, devices, volunteers = await asyncio.gather(
+            *(_run_in_own_session(session_factory, query) for query in queries)
+        )
+    else:
+        faraway, edu_stats, devices, volunteers = [await query(session) for query in queries]
+
+    result = {
+        "faraway_schools": faraway,
+        "edu_stats": edu_stats,
+        "devices_info": devices,
+        "volunteer_teams": volunteers,
+        "statistics": {
+            "total_schools": 0,
+            "total_students": 0,
+            "counties_covered": [],
+            "area_types": {}
+        }
+    }
     
     # 計算統計數據
     result["statistics"]["total_schools"] = len(result["faraway_schools"])
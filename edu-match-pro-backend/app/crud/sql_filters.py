@@ -0,0 +1,169 @@
+"""
+參數化的 WHERE 條件組裝工具（wide 表查詢共用）
+
+所有值一律以綁定參數傳入，多值條件使用陣列參數（= ANY / LIKE ANY），
+因此 SQL 文字只取決於「有哪些條件」，與縣市數量或內容無關：
+- 不會有 SQL 注入
+- 相同形狀的查詢產生相同的 SQL 文字，asyncpg 的 prepared statement 快取可以重複使用
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.core.county_resolver import resolve_county_ids
+
+
+def _clean_values(values: Optional[Iterable[Any]]) -> List[Any]:
+    """去除 None 與空字串"""
+    if not values:
+        return []
+    return [v.strip() if isinstance(v, str) else v for v in values if v is not None and str(v).strip()]
+
+
+def _county_spellings(values: Iterable[str]) -> List[str]:
+    """原始寫法加上「台」「臺」互換的寫法（資料中兩種都有），保持順序並去重"""
+    spellings: List[str] = []
+    for value in values:
+        for spelling in (value, value.replace("台", "臺"), value.replace("臺", "台")):
+            if spelling not in spellings:
+                spellings.append(spelling)
+    return spellings
+
+
+class SqlFilter:
+    """
+    累積 WHERE 條件與綁定參數
+
+    用法：
+        f = SqlFilter()
+        f.like_any('"縣市名稱"', "counties", ["臺東縣"], pattern="%{}")
+        f.equals('"地區屬性"', "area_type", area_type)
+        sql = text(f"SELECT ... FROM wide_faraway3 {f.where_sql()} LIMIT :limit")
+        await session.execute(sql, f.bind(limit=100))
+
+    條件值為空時不加入條件（視為不篩選）；欄位名稱必須是程式內的常數，不可來自使用者輸入。
+    搜尋條件可要求依相似度排序（pg_trgm 的 word_similarity），由 order_sql() 產生 ORDER BY。
+    """
+
+    def __init__(self):
+        self.clauses: List[str] = []
+        self.params: Dict[str, Any] = {}
+        self.rank_terms: List[str] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.clauses)
+
+    def copy(self) -> "SqlFilter":
+        """複製一份條件（在副本上追加條件不影響原本的）"""
+        clone = SqlFilter()
+        clone.clauses = list(self.clauses)
+        clone.params = dict(self.params)
+        clone.rank_terms = list(self.rank_terms)
+        return clone
+
+    def add(self, clause: str, **params: Any) -> "SqlFilter":
+        """加入自訂條件（條件中的值必須以 :name 參數表示）"""
+        self.clauses.append(clause)
+        self.params.update(params)
+        return self
+
+    def equals(self, column: str, name: str, value: Any) -> "SqlFilter":
+        """column = :name"""
+        if value is None or value == "":
+            return self
+        return self.add(f"{column} = :{name}", **{name: value})
+
+    def equals_any(self, column: str, name: str, values: Optional[Sequence[Any]]) -> "SqlFilter":
+        """column = ANY(:name)，以單一陣列參數比對多個值"""
+        values = _clean_values(values)
+        if not values:
+            return self
+        return self.add(f"{column} = ANY(:{name})", **{name: values})
+
+    def like_any(
+        self,
+        column: str,
+        name: str,
+        values: Optional[Sequence[str]],
+        pattern: str = "%{}%",
+        case_insensitive: bool = False,
+    ) -> "SqlFilter":
+        """
+        column LIKE ANY(:name)
+
+        Args:
+            pattern: 套用到每個值的樣式，例如 "%{}" 表示以該值結尾（縣市名稱前面有數字編號）
+            case_insensitive: 使用 ILIKE
+        """
+        values = _clean_values(values)
+        if not values:
+            return self
+        operator = "ILIKE" if case_insensitive else "LIKE"
+        patterns = [pattern.format(escape_like(str(v))) for v in values]
+        return self.add(f"{column} {operator} ANY(:{name})", **{name: patterns})
+
+    def county(
+        self,
+        name_column: str,
+        name: str,
+        values: Optional[Sequence[str]],
+        pattern: str = "%{}",
+        id_column: str = "county_id",
+        case_insensitive: bool = False,
+    ) -> "SqlFilter":
+        """
+        縣市條件：可解析的名稱（台/臺、編號前綴、簡稱）以 county_id = ANY 等值比對並走索引，
+        無法解析的名稱才退回以 name_column LIKE ANY 比對（原始寫法與台/臺互換的寫法都比對）
+        """
+        ids, unresolved = resolve_county_ids(values)
+        unresolved = _county_spellings(unresolved)
+        if ids and unresolved:
+            operator = "ILIKE" if case_insensitive else "LIKE"
+            patterns = [pattern.format(escape_like(v)) for v in unresolved]
+            return self.add(
+                f"({id_column} = ANY(:{name}_ids) OR {name_column} {operator} ANY(:{name}_names))",
+                **{f"{name}_ids": ids, f"{name}_names": patterns},
+            )
+        if ids:
+            return self.equals_any(id_column, f"{name}_ids", ids)
+        return self.like_any(name_column, f"{name}_names", unresolved, pattern, case_insensitive)
+
+    def contains(self, columns: Sequence[str], name: str, value: Optional[str], rank: bool = False) -> "SqlFilter":
+        """
+        任一欄位 ILIKE '%value%'（搜尋框用，由 pg_trgm GIN 索引支援）
+
+        Args:
+            rank: 依 word_similarity 排序，最接近搜尋字串的結果排在前面
+        """
+        if not value or not value.strip():
+            return self
+        pattern = f"%{escape_like(value.strip())}%"
+        if rank:
+            self.params[f"{name}_q"] = value.strip()
+            self.rank_terms.extend(f"word_similarity(:{name}_q, {column})" for column in columns)
+        if len(columns) == 1:
+            return self.add(f"{columns[0]} ILIKE :{name}", **{name: pattern})
+        clause = " OR ".join(f"{column} ILIKE :{name}" for column in columns)
+        return self.add(f"({clause})", **{name: pattern})
+
+    def where_sql(self) -> str:
+        """完整的 WHERE 子句；沒有條件時回傳空字串"""
+        return f"WHERE {' AND '.join(self.clauses)}" if self.clauses else ""
+
+    def rank_sql(self) -> Optional[str]:
+        """相似度分數的 SQL 運算式（0~1）；沒有排序條件時回傳 None"""
+        if not self.rank_terms:
+            return None
+        return self.rank_terms[0] if len(self.rank_terms) == 1 else f"GREATEST({', '.join(self.rank_terms)})"
+
+    def order_sql(self, default: str) -> str:
+        """ORDER BY 子句：有相似度排序條件時優先依相似度，其餘依 default"""
+        score = self.rank_sql()
+        return f"ORDER BY {score} DESC, {default}" if score else f"ORDER BY {default}"
+
+    def bind(self, **extra: Any) -> Dict[str, Any]:
+        """條件參數加上額外參數（如 limit / offset）"""
+        return {**self.params, **extra}
+
+
+def escape_like(value: str) -> str:
+    """跳脫 LIKE 的萬用字元，讓使用者輸入的 % 與 _ 只代表字面值"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
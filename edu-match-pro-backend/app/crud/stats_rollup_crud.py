@@ -0,0 +1,237 @@
+"""
+儀表板彙總表 CRUD（school_stats、company_stats、company_sdg_stats）
+需求與捐贈的寫入路徑在同一交易內以「變更前後的差值」遞增更新彙總列，儀表板只需讀取一列；
+彙總與明細不一致時（例如腳本直接寫入資料表）以 rebuild_stats_rollups 重新計算
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.donation import Donation, DonationStatus
+from app.models.need import Need, NeedStatus
+from app.models.stats_rollup import CompanySdgStats, CompanyStats, SchoolStats
+
+
+@dataclass(frozen=True)
+class NeedSnapshot:
+    """需求中影響彙總的欄位"""
+    status: NeedStatus
+    student_count: int
+    sdgs: Tuple[int, ...] = ()
+
+    @classmethod
+    def from_need(cls, need: Need) -> "NeedSnapshot":
+        return cls(status=need.status, student_count=need.student_count or 0, sdgs=tuple(need.sdgs or ()))
+
+    def school_counts(self) -> Dict[str, int]:
+        completed = self.status == NeedStatus.completed
+        return {
+            "total_needs": 1,
+            "active_needs": int(self.status == NeedStatus.active),
+            "in_progress_needs": int(self.status == NeedStatus.in_progress),
+            "completed_needs": int(completed),
+            "students_benefited": self.student_count if completed else 0,
+        }
+
+
+@dataclass(frozen=True)
+class DonationSnapshot:
+    """捐贈（與其需求）中影響企業彙總的欄位"""
+    status: DonationStatus
+    student_count: int = 0
+    sdgs: Tuple[int, ...] = ()
+    # 已完成專案天數（與原本的計算相同：updated_at - created_at）；無法計算時為 None
+    duration_days: Optional[int] = None
+
+    @classmethod
+    def from_donation(cls, donation: Donation, need: Optional[Need]) -> "DonationSnapshot":
+        duration = None
+        if donation.created_at and donation.updated_at:
+            duration = (donation.updated_at - donation.created_at).days
+        return cls(
+            status=donation.status,
+            student_count=(need.student_count or 0) if need else 0,
+            sdgs=tuple(need.sdgs or ()) if need else (),
+            duration_days=duration,
+        )
+
+    def company_counts(self) -> Dict[str, int]:
+        completed = self.status == DonationStatus.completed
+        with_duration = completed and self.duration_days is not None
+        return {
+            "total_donations": 1,
+            "completed_donations": int(completed),
+            "students_helped": self.student_count if completed else 0,
+            "completed_duration_days": self.duration_days if with_duration else 0,
+            "completed_with_duration": int(with_duration),
+        }
+
+    def sdg_counts(self) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        if self.status == DonationStatus.completed:
+            for sdg in self.sdgs:
+                counts[sdg] = counts.get(sdg, 0) + 1
+        return counts
+
+
+def _diff(before: Dict[Any, int], after: Dict[Any, int]) -> Dict[Any, int]:
+    keys = set(before) | set(after)
+    return {key: after.get(key, 0) - before.get(key, 0) for key in keys}
+
+
+async def _increment(session: AsyncSession, model: Any, keys: Dict[str, Any], deltas: Dict[str, int]) -> None:
+    """以 upsert 將差值加到彙總列（列不存在時以差值建立）"""
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = model.__table__
+    values = {**keys, **deltas}
+    has_updated_at = "updated_at" in table.c
+    if has_updated_at:
+        values["updated_at"] = datetime.utcnow()
+    stmt = pg_insert(table).values(**values)
+    updates = {column: table.c[column] + stmt.excluded[column] for column in deltas}
+    if has_updated_at:
+        updates["updated_at"] = stmt.excluded.updated_at
+    await session.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=updates))
+
+
+async def _apply_company_delta(
+    session: AsyncSession,
+    company_id: uuid.UUID,
+    before: Optional[DonationSnapshot],
+    after: Optional[DonationSnapshot],
+) -> None:
+    await _increment(
+        session, CompanyStats, {"company_id": company_id},
+        _diff(before.company_counts() if before else {}, after.company_counts() if after else {})
+    )
+    sdg_deltas = _diff(before.sdg_counts() if before else {}, after.sdg_counts() if after else {})
+    for sdg, delta in sorted(sdg_deltas.items()):
+        await _increment(session, CompanySdgStats, {"company_id": company_id, "sdg": sdg}, {"contributions": delta})
+
+
+async def record_need_change(
+    session: AsyncSession,
+    school_id: uuid.UUID,
+    before: Optional[NeedSnapshot],
+    after: Optional[NeedSnapshot],
+    need_id: Optional[uuid.UUID] = None,
+) -> None:
+    """
+    需求新增（before=None）、修改或刪除（after=None）時更新彙總（不會 commit）
+
+    學生數或 SDG 變動時，已完成此需求的捐贈所屬企業的彙總也會一併調整（需提供 need_id）
+    """
+    await _increment(
+        session, SchoolStats, {"school_id": school_id},
+        _diff(before.school_counts() if before else {}, after.school_counts() if after else {})
+    )
+
+    if need_id is None or before is None or after is None:
+        return
+    if before.student_count == after.student_count and before.sdgs == after.sdgs:
+        return
+    result = await session.execute(
+        select(Donation.company_id, Donation.created_at, Donation.updated_at).where(
+            Donation.need_id == need_id,
+            Donation.status == DonationStatus.completed
+        )
+    )
+    for company_id, created_at, updated_at in result.all():
+        duration = (updated_at - created_at).days if created_at and updated_at else None
+        await _apply_company_delta(
+            session, company_id,
+            DonationSnapshot(DonationStatus.completed, before.student_count, before.sdgs, duration),
+            DonationSnapshot(DonationStatus.completed, after.student_count, after.sdgs, duration),
+        )
+
+
+async def record_donation_change(
+    session: AsyncSession,
+    company_id: uuid.UUID,
+    before: Optional[DonationSnapshot],
+    after: Optional[DonationSnapshot],
+) -> None:
+    """捐贈新增（before=None）或狀態變更時更新企業彙總（不會 commit）"""
+    await _apply_company_delta(session, company_id, before, after)
+
+
+async def get_school_stats(session: AsyncSession, school_id: uuid.UUID) -> Optional[SchoolStats]:
+    result = await session.execute(select(SchoolStats).where(SchoolStats.school_id == school_id))
+    return result.scalar_one_or_none()
+
+
+async def get_company_stats(
+    session: AsyncSession, company_id: uuid.UUID
+) -> Tuple[Optional[CompanyStats], Dict[str, int]]:
+    """企業彙總列與各 SDG 的貢獻數（鍵為字串，與儀表板回應格式一致）"""
+    result = await session.execute(select(CompanyStats).where(CompanyStats.company_id == company_id))
+    stats = result.scalar_one_or_none()
+    sdg_result = await session.execute(
+        select(CompanySdgStats.sdg, CompanySdgStats.contributions)
+        .where(CompanySdgStats.company_id == company_id, CompanySdgStats.contributions > 0)
+        .order_by(CompanySdgStats.sdg)
+    )
+    return stats, {str(sdg): contributions for sdg, contributions in sdg_result.all()}
+
+
+# 從明細重新計算所有彙總（migration 的回填使用相同的 SQL）
+REBUILD_STATEMENTS: List[str] = [
+    "DELETE FROM company_sdg_stats",
+    "DELETE FROM company_stats",
+    "DELETE FROM school_stats",
+    """
+    INSERT INTO school_stats (school_id, total_needs, active_needs, in_progress_needs,
+                              completed_needs, students_benefited, updated_at)
+    SELECT school_id,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE status = 'active'),
+           COUNT(*) FILTER (WHERE status = 'in_progress'),
+           COUNT(*) FILTER (WHERE status = 'completed'),
+           COALESCE(SUM(student_count) FILTER (WHERE status = 'completed'), 0),
+           timezone('utc', now())
+    FROM need
+    GROUP BY school_id
+    """,
+    """
+    INSERT INTO company_stats (company_id, total_donations, completed_donations, students_helped,
+                               completed_duration_days, completed_with_duration, updated_at)
+    SELECT d.company_id,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE d.status = 'completed'),
+           COALESCE(SUM(n.student_count) FILTER (WHERE d.status = 'completed'), 0),
+           COALESCE(SUM(EXTRACT(DAY FROM d.updated_at - d.created_at)::int)
+                    FILTER (WHERE d.status = 'completed' AND d.updated_at IS NOT NULL), 0),
+           COUNT(*) FILTER (WHERE d.status = 'completed' AND d.updated_at IS NOT NULL),
+           timezone('utc', now())
+    FROM donation AS d
+    JOIN need AS n ON n.id = d.need_id
+    GROUP BY d.company_id
+    """,
+    """
+    INSERT INTO company_sdg_stats (company_id, sdg, contributions)
+    SELECT d.company_id, s.sdg, COUNT(*)
+    FROM donation AS d
+    JOIN need AS n ON n.id = d.need_id
+    CROSS JOIN LATERAL unnest(n.sdgs) AS s(sdg)
+    WHERE d.status = 'completed'
+    GROUP BY d.company_id, s.sdg
+    """,
+]
+
+
+async def rebuild_stats_rollups(session: AsyncSession) -> Dict[str, int]:
+    """在目前交易中重新計算所有彙總表（不會 commit），回傳各表的列數"""
+    for statement in REBUILD_STATEMENTS:
+        await session.execute(text(statement))
+    counts = {}
+    for table in ("school_stats", "company_stats", "company_sdg_stats"):
+        result = await session.execute(text(f"SELECT COUNT(*) FROM {table}"))
+        counts[table] = result.scalar() or 0
+    return counts
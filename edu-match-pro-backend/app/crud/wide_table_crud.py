@@ -0,0 +1,194 @@
+"""
+Wide 表列表查詢 CRUD（/data/* 端點共用）
+支援兩種分頁：
+- page + limit：LIMIT/OFFSET（保留相容性，深頁成本隨 offset 線性增加）
+- cursor：keyset 分頁，以上一頁最後一筆的排序鍵為起點，任何深度都只讀 limit + 1 筆
+
+總數有三種計算方式（count_mode）：
+- exact：精確計數；page 模式與第一頁以 COUNT(*) OVER () 和資料在同一次查詢取得
+- cached：依條件簽章快取精確計數，ingest 遞增 data_version 後失效
+- estimated：沒有篩選條件時使用 planner 統計（pg_class.reltuples），有條件或統計不可用時退回 cached
+"""
+from dataclasses import dataclass
+from typing import Any, List, Hashable, Optional, Sequence, get_args
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUTTLCache, MISSING
+from app.core.config import CountMode, settings
+from app.core.data_version import data_version_watcher
+from app.crud.keyset_pagination import KeysetColumn, KeysetOrder, next_cursor, uuid_key
+from app.crud.sql_filters import SqlFilter
+
+# 各 wide 表的 keyset 排序鍵（與 migration 中的複合索引一致；可為 NULL 的欄位以 COALESCE 處理）
+FARAWAY_ORDER = KeysetOrder("faraway", [
+    KeysetColumn('"縣市名稱"'),
+    KeysetColumn('"本校名稱"'),
+    KeysetColumn("id", parse=uuid_key),
+])
+EDUCATION_ORDER = KeysetOrder("education", [
+    KeysetColumn('"學年度"', descending=True),
+    KeysetColumn('"縣市別"'),
+    KeysetColumn("id", parse=uuid_key),
+])
+DEVICES_ORDER = KeysetOrder("devices", [
+    KeysetColumn('COALESCE("縣市", \'\')'),
+    KeysetColumn('COALESCE("學校名稱", \'\')'),
+    KeysetColumn("id", parse=uuid_key),
+])
+VOLUNTEER_ORDER = KeysetOrder("volunteer", [
+    KeysetColumn('COALESCE("年度", \'\')', descending=True),
+    KeysetColumn('COALESCE("縣市", \'\')'),
+    KeysetColumn('COALESCE("受服務單位", \'\')'),
+    KeysetColumn("id", parse=uuid_key),
+])
+
+
+COUNT_MODES = get_args(CountMode)
+
+# 條件簽章 -> 精確總數（鍵中包含資料版本，ingest 後舊項目不再命中）
+count_cache: LRUTTLCache[int] = LRUTTLCache(
+    max_entries=settings.data_count_cache_max_entries,
+    ttl_seconds=settings.data_count_cache_ttl_seconds
+)
+
+
+@dataclass
+class WidePage:
+    rows: List[Sequence[Any]]
+    total: int
+    next_cursor: Optional[str] = None
+    # 產生 total 的方式：exact / cached / estimated
+    total_mode: str = "exact"
+
+
+def _count_cache_key(table: str, filters: SqlFilter, version: int) -> Hashable:
+    params = tuple(sorted((k, repr(v)) for k, v in filters.params.items()))
+    return table, filters.where_sql(), params, version
+
+
+async def _estimated_count(session: AsyncSession, table: str) -> Optional[int]:
+    """
+    planner 統計的列數
+
+    reltuples 在表尚未 VACUUM/ANALYZE 過時為 -1（PostgreSQL 14 起）或 0，
+    此時不可信，回傳 None 讓呼叫端改用精確計數
+    """
+    result = await session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table}
+    )
+    estimate = result.scalar_one_or_none()
+    return int(estimate) if estimate is not None and estimate > 0 else None
+
+
+async def _exact_count(session: AsyncSession, table: str, filters: SqlFilter) -> int:
+    result = await session.execute(text(f"SELECT COUNT(*) FROM {table} {filters.where_sql()}"), filters.bind())
+    return result.scalar() or 0
+
+
+async def fetch_wide_page(
+    session: AsyncSession,
+    table: str,
+    columns: str,
+    filters: SqlFilter,
+    order: KeysetOrder,
+    offset_order: str,
+    limit: int,
+    page: int = 1,
+    cursor: Optional[str] = None,
+    count_mode: Optional[CountMode] = None,
+) -> WidePage:
+    """
+    查詢 wide 表的一頁資料
+
+    Args:
+        table: 表名（含必要的雙引號）
+        columns: SELECT 的資料欄位
+        filters: WHERE 條件
+        order: keyset 排序鍵（cursor 模式）
+        offset_order: page 模式的 ORDER BY 欄位（搜尋時會先依相似度排序）
+        cursor: None 表示使用 page 模式；空字串表示 cursor 模式的第一頁
+        count_mode: exact / cached / estimated，預設使用設定值
+
+    Raises:
+        InvalidCursorError: 游標無法解碼
+    """
+    count_mode = count_mode or settings.data_count_mode
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"不支援的 count_mode: {count_mode}")
+
+    total: Optional[int] = None
+    total_mode = "exact"
+    cache_key: Optional[Hashable] = None
+
+    if count_mode == "estimated":
+        if not filters:
+            total = await _estimated_count(session, table)
+            total_mode = "estimated"
+        if total is None:
+            count_mode = "cached"
+    if count_mode == "cached":
+        cache_key = _count_cache_key(table, filters, await data_version_watcher.current(session))
+        cached = count_cache.get(cache_key)
+        if cached is not MISSING:
+            total, total_mode = cached, "cached"
+        else:
+            total_mode = "exact"
+
+    # 需要精確計數且查詢範圍就是完整的條件集合（page 模式或游標第一頁）時，以視窗函數一起取得
+    with_window = total is None and not cursor
+    window_sql = ", COUNT(*) OVER () AS _total" if with_window else ""
+
+    if cursor is None:
+        data_sql = text(f"""
+            SELECT {columns}{window_sql}
+            FROM {table}
+            {filters.where_sql()}
+            {filters.order_sql(offset_order)}
+            LIMIT :limit OFFSET :offset
+        """)
+        result = await session.execute(data_sql, filters.bind(limit=limit, offset=(page - 1) * limit))
+        fetched = list(result.fetchall())
+        key_columns = 0
+    else:
+        keyset_filters = filters.copy()
+        if cursor:
+            keyset_filters.add(order.after_clause(), **order.decode(cursor))
+        data_sql = text(f"""
+            SELECT {columns}, {order.select_sql()}{window_sql}
+            FROM {table}
+            {keyset_filters.where_sql()}
+            {order.order_sql()}
+            LIMIT :limit
+        """)
+        result = await session.execute(data_sql, keyset_filters.bind(limit=limit + 1))
+        fetched = list(result.fetchall())
+        key_columns = len(order.columns)
+
+    if with_window:
+        if fetched:
+            total = int(fetched[0][-1])
+        elif cursor is None and page > 1:
+            # 頁數超出範圍時視窗函數沒有任何列可附帶總數
+            total = await _exact_count(session, table, filters)
+        else:
+            total = 0
+        fetched = [row[:-1] for row in fetched]
+    elif total is None:
+        total = await _exact_count(session, table, filters)
+
+    if cache_key is not None and total_mode == "exact":
+        count_cache.set(cache_key, total)
+
+    following = None
+    if cursor is None:
+        rows = fetched
+    else:
+        data_columns = len(fetched[0]) - key_columns if fetched else 0
+        rows = [order.split_row(row, data_columns)[0] for row in fetched[:limit]]
+        last_keys = order.split_row(fetched[limit - 1], data_columns)[1] if len(fetched) > limit else None
+        following = next_cursor(order, last_keys, len(fetched), limit)
+
+    return WidePage(rows=rows, total=total, next_cursor=following, total_mode=total_mode)
@@ -1,16 +1,43 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlmodel import SQLModel
 from app.core.config import settings
+from app.core.db_engine import engine_options, engine_url, resolve_profile
+from app.core.db_replica import ReplicaRouter
 from typing import AsyncGenerator
 
-# 建立非同步引擎
-engine = create_async_engine(settings.database_url, echo=True)
+# 依 DB_PROFILE（dev / prod / test）建立非同步引擎
+engine_profile = resolve_profile(settings)
+engine = create_async_engine(
+    engine_url(settings.database_url, engine_profile),
+    **engine_options(settings.database_url, engine_profile)
+)
 
 # 建立非同步 Session Local
 async_session_local = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# 讀取副本（未設定 REPLICA_DATABASE_URL 時唯讀請求也使用主庫）
+replica_engine = create_async_engine(
+    engine_url(settings.replica_database_url, engine_profile),
+    **engine_options(settings.replica_database_url, engine_profile, name="replica")
+) if settings.replica_database_url else None
+async_read_session_local = async_sessionmaker(
+    replica_engine, class_=AsyncSession, expire_on_commit=False
+) if replica_engine is not None else async_session_local
+replica_router = ReplicaRouter(
+    replica_engine,
+    check_interval_seconds=settings.replica_health_check_seconds,
+    max_lag_seconds=settings.replica_max_lag_seconds
+)
+
+
+async def read_session_factory() -> async_sessionmaker:
+    """目前唯讀查詢應使用的 session factory（副本不可用或落後過多時為主庫）"""
+    if await replica_router.use_replica():
+        return async_read_session_local
+    return async_session_local
+
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """FastAPI 依賴項：產生資料庫 session"""
@@ -21,6 +48,16 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """FastAPI 依賴項：唯讀端點使用的 session（可容忍副本的短暫延遲，不可用於寫入）"""
+    session_factory = await read_session_factory()
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 async def create_db_and_tables():
     """建立資料庫和資料表"""
     async with engine.begin() as conn:
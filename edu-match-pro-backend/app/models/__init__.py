@@ -5,6 +5,9 @@ from app.models.need import Need, UrgencyLevel, NeedStatus
 from app.models.donation import Donation, DonationStatus
 from app.models.impact_story import ImpactStory
 from app.models.activity_log import ActivityLog, ActivityType
+from app.models.analysis_report import AnalysisReport, AnalysisJobStatus
+from app.models.conversation import ConversationSession, ConversationTurn
+from app.models.stats_rollup import SchoolStats, CompanyStats, CompanySdgStats
 
 __all__ = [
     "BaseModel",
@@ -19,4 +22,11 @@ __all__ = [
     "ImpactStory",
     "ActivityLog",
     "ActivityType",
+    "AnalysisReport",
+    "AnalysisJobStatus",
+    "ConversationSession",
+    "ConversationTurn",
+    "SchoolStats",
+    "CompanyStats",
+    "CompanySdgStats",
 ]
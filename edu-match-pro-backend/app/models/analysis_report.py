@@ -0,0 +1,32 @@
+from sqlmodel import Field, Column
+from sqlalchemy import Text
+from typing import Optional
+from enum import Enum
+from datetime import datetime
+from app.models.base import BaseModel
+
+
+class AnalysisJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class AnalysisReport(BaseModel, table=True):
+    """
+    AI 捐贈策略分析報告
+    同時作為背景分析工作的狀態紀錄：id 即 job id，
+    完成後依 params_hash 供相同參數的請求直接重用
+    """
+    __tablename__ = "analysis_report"
+    
+    params_hash: str = Field(index=True, max_length=64)
+    user_params: str = Field(sa_column=Column(Text, nullable=False))  # JSON 字串
+    status: AnalysisJobStatus = Field(default=AnalysisJobStatus.queued)
+    report: Optional[str] = Field(default=None, sa_column=Column(Text))
+    school_data: Optional[str] = Field(default=None, sa_column=Column(Text))  # JSON 字串
+    error: Optional[str] = Field(default=None)
+    # worker 實際開始執行的時間（排隊等待不計入執行逾時）
+    started_at: Optional[datetime] = Field(default=None)
+    completed_at: Optional[datetime] = Field(default=None)
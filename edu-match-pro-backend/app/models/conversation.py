@@ -0,0 +1,24 @@
+from sqlmodel import Field, Column
+from sqlalchemy import Text
+import uuid
+from app.models.base import BaseModel
+
+
+class ConversationSession(BaseModel, table=True):
+    """
+    AI 智能探索的對話 session
+    保存跨輪次合併後的捐贈參數；對話內容存於 conversation_turn（只新增不修改）
+    """
+    __tablename__ = "conversation_session"
+    
+    params: str = Field(default="{}", sa_column=Column(Text, nullable=False))  # JSON 字串
+
+
+class ConversationTurn(BaseModel, table=True):
+    """對話 session 中的一則訊息"""
+    __tablename__ = "conversation_turn"
+    
+    session_id: uuid.UUID = Field(foreign_key="conversation_session.id", index=True)
+    seq: int
+    role: str = Field(max_length=20)
+    content: str = Field(sa_column=Column(Text, nullable=False))
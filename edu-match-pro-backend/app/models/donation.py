@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship, ForeignKey
 from typing import Optional, TYPE_CHECKING
+from sqlalchemy import Index
 from enum import Enum
 from app.models.base import BaseModel
 
@@ -21,6 +22,11 @@ class DonationStatus(str, Enum):
 
 class Donation(BaseModel, table=True):
     __tablename__ = "donation"
+    # 平台統計計算已完成捐贈數；企業儀表板依 company_id 查詢
+    __table_args__ = (
+        Index("ix_donation_status", "status"),
+        Index("ix_donation_company_id_status", "company_id", "status"),
+    )
     
     company_id: uuid.UUID = Field(foreign_key="user.id")
     need_id: uuid.UUID = Field(foreign_key="need.id")
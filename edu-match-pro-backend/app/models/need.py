@@ -1,7 +1,7 @@
 from sqlmodel import Field, Relationship, Column
 from typing import Optional, List, TYPE_CHECKING
 from enum import Enum
-from sqlalchemy import ARRAY, Integer
+from sqlalchemy import ARRAY, Index, Integer
 import uuid
 from app.models.base import BaseModel
 
@@ -24,6 +24,8 @@ class NeedStatus(str, Enum):
 
 class Need(BaseModel, table=True):
     __tablename__ = "need"
+    # 學校儀表板依 school_id 與 status 做條件聚合
+    __table_args__ = (Index("ix_need_school_id_status", "school_id", "status"),)
     
     school_id: uuid.UUID = Field(foreign_key="user.id")
     title: str
@@ -0,0 +1,46 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import ForeignKey
+from datetime import datetime
+import uuid
+
+
+class SchoolStats(SQLModel, table=True):
+    """
+    學校儀表板彙總（每所學校一列）
+    由 need_crud / donation_crud 在同一交易內增量更新；scripts/rebuild_stats_rollups.py 可重新計算
+    彙總列隨使用者刪除（ON DELETE CASCADE，與 migration 一致）
+    """
+    __tablename__ = "school_stats"
+
+    school_id: uuid.UUID = Field(primary_key=True, sa_column_args=[ForeignKey("user.id", ondelete="CASCADE")])
+    total_needs: int = Field(default=0)
+    active_needs: int = Field(default=0)
+    in_progress_needs: int = Field(default=0)
+    completed_needs: int = Field(default=0)
+    # 已完成需求的學生數總和
+    students_benefited: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class CompanyStats(SQLModel, table=True):
+    """企業儀表板彙總（每家企業一列）"""
+    __tablename__ = "company_stats"
+
+    company_id: uuid.UUID = Field(primary_key=True, sa_column_args=[ForeignKey("user.id", ondelete="CASCADE")])
+    total_donations: int = Field(default=0)
+    completed_donations: int = Field(default=0)
+    # 已完成捐贈對應需求的學生數總和
+    students_helped: int = Field(default=0)
+    # 平均專案天數 = completed_duration_days // completed_with_duration
+    completed_duration_days: int = Field(default=0)
+    completed_with_duration: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class CompanySdgStats(SQLModel, table=True):
+    """企業各 SDG 的已完成捐贈數"""
+    __tablename__ = "company_sdg_stats"
+
+    company_id: uuid.UUID = Field(primary_key=True, sa_column_args=[ForeignKey("user.id", ondelete="CASCADE")])
+    sdg: int = Field(primary_key=True)
+    contributions: int = Field(default=0)
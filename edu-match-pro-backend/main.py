@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -5,8 +6,32 @@ from app.api.main_api import router as main_router
 from app.api.auth_api import router as auth_router
 from app.core.exceptions import EduMatchProException, global_exception_handler
 from app.core.config import settings
+from app.core.analysis_jobs import analysis_job_queue
 
-app = FastAPI(title="Edu-Match-Pro API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 啟動時預先載入模型目錄並初始化 AI 服務，第一個 AI 請求不再等待模型探索
+    if settings.ai_warmup_on_startup:
+        from app.core.ai_service import get_ai_service_async
+        try:
+            await get_ai_service_async()
+        except Exception as e:
+            # AI 服務不可用不影響其他 API，第一次 AI 請求時會再嘗試
+            print(f"[AI服務] 啟動時初始化失敗: {e}")
+    # 預先載入學校名稱索引，第一次輸入就不必等待資料庫
+    if settings.school_autocomplete_enabled:
+        from app.core.school_name_index import school_name_autocomplete
+        try:
+            await school_name_autocomplete.get_index()
+        except Exception as e:
+            print(f"[學校索引] 啟動時載入失敗: {e}")
+    yield
+    # 關閉時停止背景分析 worker
+    await analysis_job_queue.shutdown()
+
+
+app = FastAPI(title="Edu-Match-Pro API", version="1.0.0", lifespan=lifespan)
 
 # 設定 CORS（使用配置文件中的設定）
 app.add_middleware(
@@ -343,6 +343,13 @@ async def main():
         # 3. 验证数据
         await verify_data()
         
+        # 4. 需求直接写入资料表，重新计算仪表板汇总
+        from app.crud.stats_rollup_crud import rebuild_stats_rollups
+        async with async_session_local() as session:
+            await session.begin()
+            await rebuild_stats_rollups(session)
+            await session.commit()
+        
         print("\n" + "="*80)
         print("✓✓✓ 真实需求数据生成完成！")
         print("="*80)
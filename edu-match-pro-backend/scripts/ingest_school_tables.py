@@ -2,7 +2,7 @@ import asyncio
 import csv
 import os
 from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import sqlalchemy as sa
 import uuid
@@ -13,6 +13,9 @@ from sqlalchemy import MetaData, Table, text
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.core.config import settings
+from app.core.county_resolver import COUNTIES, resolve_county_id
+from app.crud.aggregate_views_crud import AGGREGATE_VIEWS, refresh_aggregate_view
+from app.crud.data_version_crud import bump_data_version
 
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
@@ -32,6 +35,48 @@ def normalize_county(name: str) -> str:
     return name.replace("[", "").replace("]", "") if name else name
 
 
+# --- 縣市 / 鄉鎮維度 ---
+# (county_id, 鄉鎮名稱) -> dim_township.id，避免每一列都查詢一次
+_township_ids: Dict[Tuple[int, str], int] = {}
+
+
+async def ensure_county_dimension(session: AsyncSession) -> None:
+    """寫入 dim_county（內政部縣市代碼為主鍵）"""
+    metadata = MetaData()
+    table = Table(
+        'dim_county',
+        metadata,
+        sa.Column('id', sa.Integer),
+        sa.Column('name', sa.Text),
+    )
+    for county_id, name in COUNTIES:
+        stmt = (
+            pg_insert(table)
+            .values(id=county_id, name=name)
+            .on_conflict_do_update(index_elements=['id'], set_={'name': name})
+        )
+        await session.execute(stmt)
+
+
+async def get_township_id(session: AsyncSession, county_id: Optional[int], name: Optional[str]) -> Optional[int]:
+    """取得（必要時建立）dim_township 的 id"""
+    name = (name or '').strip()
+    if county_id is None or not name:
+        return None
+    key = (county_id, name)
+    if key not in _township_ids:
+        result = await session.execute(
+            text(
+                "INSERT INTO dim_township (county_id, name) VALUES (:county_id, :name) "
+                "ON CONFLICT ON CONSTRAINT uq_dim_township_county_name DO UPDATE SET name = EXCLUDED.name "
+                "RETURNING id"
+            ),
+            {"county_id": county_id, "name": name},
+        )
+        _township_ids[key] = result.scalar_one()
+    return _township_ids[key]
+
+
 def parse_int(value: Optional[str]) -> Optional[int]:
     if value is None:
         return None
@@ -80,11 +125,14 @@ async def upsert_wide_edu(session: AsyncSession, row: Dict[str, Any]) -> None:
         sa.Column('宗教研修學院[人]', sa.Integer),
         sa.Column('國民補習及大專進修學校及空大[人]', sa.Integer),
         sa.Column('特殊教育學校[人]', sa.Integer),
+        sa.Column('county_id', sa.Integer),
     )
 
     def gi(key: str) -> Optional[int]:
         return parse_int(row.get(key))
 
+    county = (row.get('縣市別') or row.get('縣市名稱') or '').strip()
+    county_id = resolve_county_id(county)
     now = datetime.utcnow()
     stmt = (
         pg_insert(table)
@@ -94,7 +142,8 @@ async def upsert_wide_edu(session: AsyncSession, row: Dict[str, Any]) -> None:
             updated_at=now,
             **{
                 '學年度': (row.get('學年度') or '').strip(),
-                '縣市別': (row.get('縣市別') or row.get('縣市名稱') or '').strip(),
+                '縣市別': county,
+                'county_id': county_id,
                 '幼兒園[人]': gi('幼兒園[人]'),
                 '國小[人]': gi('國小[人]'),
                 '國中[人]': gi('國中[人]'),
@@ -114,6 +163,7 @@ async def upsert_wide_edu(session: AsyncSession, row: Dict[str, Any]) -> None:
             constraint='uq_wide_edu_year_county',
             set_={
                 'updated_at': sa.literal(now),
+                'county_id': sa.literal(county_id),
                 '幼兒園[人]': sa.literal(gi('幼兒園[人]')),
                 '國小[人]': sa.literal(gi('國小[人]')),
                 '國中[人]': sa.literal(gi('國中[人]')),
@@ -156,8 +206,12 @@ async def upsert_wide_faraway(session: AsyncSession, row: Dict[str, Any]) -> Non
         sa.Column('原住民學生比率', sa.Numeric(10, 4)),
         sa.Column('上學年男畢業生數[人]', sa.Integer),
         sa.Column('上學年女畢業生數[人]', sa.Integer),
+        sa.Column('county_id', sa.Integer),
+        sa.Column('township_id', sa.Integer),
     )
 
+    county_id = resolve_county_id(row.get('縣市名稱'))
+    township_id = await get_township_id(session, county_id, row.get('鄉鎮市區'))
     now = datetime.utcnow()
     stmt = (
         pg_insert(table)
@@ -181,6 +235,8 @@ async def upsert_wide_faraway(session: AsyncSession, row: Dict[str, Any]) -> Non
                 '原住民學生比率': parse_decimal(row.get('原住民學生比率')),
                 '上學年男畢業生數[人]': parse_int(row.get('上學年男畢業生數[人]')),
                 '上學年女畢業生數[人]': parse_int(row.get('上學年女畢業生數[人]')),
+                'county_id': county_id,
+                'township_id': township_id,
             }
         )
         .on_conflict_do_update(
@@ -200,6 +256,8 @@ async def upsert_wide_faraway(session: AsyncSession, row: Dict[str, Any]) -> Non
                 '原住民學生比率': sa.literal(parse_decimal(row.get('原住民學生比率'))),
                 '上學年男畢業生數[人]': sa.literal(parse_int(row.get('上學年男畢業生數[人]'))),
                 '上學年女畢業生數[人]': sa.literal(parse_int(row.get('上學年女畢業生數[人]'))),
+                'county_id': sa.literal(county_id),
+                'township_id': sa.literal(township_id),
             }
         )
     )
@@ -223,6 +281,8 @@ async def upsert_wide_connected_devices(session: AsyncSession, row: Dict[str, An
         sa.Column('鄉鎮市區', sa.Text),
         sa.Column('學校名稱', sa.Text),
         sa.Column('教學電腦數', sa.Text),
+        sa.Column('county_id', sa.Integer),
+        sa.Column('township_id', sa.Integer),
     )
 
     def gi(key: str) -> Optional[int]:
@@ -236,6 +296,8 @@ async def upsert_wide_connected_devices(session: AsyncSession, row: Dict[str, An
                 return str(v).strip()
         return None
 
+    county_id = resolve_county_id(get_field('縣市', '縣市別', '縣市名稱'))
+    township_id = await get_township_id(session, county_id, get_field('鄉鎮市區', '鄉鎮'))
     now = datetime.utcnow()
     stmt = (
         pg_insert(table)
@@ -249,6 +311,8 @@ async def upsert_wide_connected_devices(session: AsyncSession, row: Dict[str, An
                 '鄉鎮市區': (get_field('鄉鎮市區', '鄉鎮', '鄉鎮市區') or ''),
                 '學校名稱': (get_field('學校名稱', '本校名稱', '本校名稱(學校名稱)') or ''),
                 '教學電腦數': (get_field('教學電腦數', '教學電腦數', '數量', '數量(台)', '可上網電腦數量') or ''),
+                'county_id': county_id,
+                'township_id': township_id,
             }
         )
         .on_conflict_do_update(
@@ -260,6 +324,8 @@ async def upsert_wide_connected_devices(session: AsyncSession, row: Dict[str, An
                 '鄉鎮市區': sa.literal((get_field('鄉鎮市區', '鄉鎮', '鄉鎮市區') or '')),
                 '縣市代碼': sa.literal((get_field('縣市代碼', '縣市代號', '縣市別代砠') or '')),
                 '學校名稱': sa.literal((get_field('學校名稱', '本校名稱', '本校名稱(學校名稱)') or '')),
+                'county_id': sa.literal(county_id),
+                'township_id': sa.literal(township_id),
             }
         )
     )
@@ -281,6 +347,7 @@ async def upsert_wide_volunteer_teams(session: AsyncSession, row: Dict[str, Any]
         sa.Column('縣市', sa.Text),
         sa.Column('受服務單位', sa.Text),
         sa.Column('志工團隊學校', sa.Text),
+        sa.Column('county_id', sa.Integer),
     )
 
     now = datetime.utcnow()
@@ -289,6 +356,7 @@ async def upsert_wide_volunteer_teams(session: AsyncSession, row: Dict[str, Any]
     county = (row.get('縣市') or '').strip()
     service_unit = (row.get('受服務單位') or '').strip()
     volunteer_school = (row.get('志工團隊學校') or '').strip()
+    county_id = resolve_county_id(county)
     
     stmt = (
         pg_insert(table)
@@ -301,6 +369,7 @@ async def upsert_wide_volunteer_teams(session: AsyncSession, row: Dict[str, Any]
                 '縣市': county,
                 '受服務單位': service_unit,
                 '志工團隊學校': volunteer_school,
+                'county_id': county_id,
             }
         )
         .on_conflict_do_update(
@@ -308,6 +377,7 @@ async def upsert_wide_volunteer_teams(session: AsyncSession, row: Dict[str, Any]
             constraint='uq_wide_volunteer_year_county_unit_school',
             set_={
                 'updated_at': sa.literal(now),
+                'county_id': sa.literal(county_id),
             }
         )
     )
@@ -421,6 +491,23 @@ async def ensure_wide_tables_exist() -> None:
     engine = create_async_engine(settings.database_url, echo=False)
     metadata = MetaData()
 
+    # 縣市 / 鄉鎮維度
+    Table(
+        'dim_county',
+        metadata,
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('name', sa.Text, nullable=False),
+        sa.UniqueConstraint('name', name='uq_dim_county_name')
+    )
+    Table(
+        'dim_township',
+        metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('county_id', sa.Integer, sa.ForeignKey('dim_county.id'), nullable=False),
+        sa.Column('name', sa.Text, nullable=False),
+        sa.UniqueConstraint('county_id', 'name', name='uq_dim_township_county_name')
+    )
+
     # wide_edu_B_1_4
     Table(
         'wide_edu_B_1_4',
@@ -443,6 +530,7 @@ async def ensure_wide_tables_exist() -> None:
         sa.Column('宗教研修學院[人]', sa.Integer),
         sa.Column('國民補習及大專進修學校及空大[人]', sa.Integer),
         sa.Column('特殊教育學校[人]', sa.Integer),
+        sa.Column('county_id', sa.Integer, sa.ForeignKey('dim_county.id'), index=True),
         sa.UniqueConstraint('學年度', '縣市別', name='uq_wide_edu_year_county')
     )
 
@@ -468,6 +556,8 @@ async def ensure_wide_tables_exist() -> None:
         sa.Column('原住民學生比率', sa.Numeric(10, 4)),
         sa.Column('上學年男畢業生數[人]', sa.Integer),
         sa.Column('上學年女畢業生數[人]', sa.Integer),
+        sa.Column('county_id', sa.Integer, sa.ForeignKey('dim_county.id'), index=True),
+        sa.Column('township_id', sa.Integer, sa.ForeignKey('dim_township.id'), index=True),
         sa.UniqueConstraint('學年度', '本校代碼', '分校分班名稱', name='uq_wide_faraway_year_code_branch')
     )
 
@@ -483,6 +573,8 @@ async def ensure_wide_tables_exist() -> None:
         sa.Column('鄉鎮市區', sa.Text),
         sa.Column('學校名稱', sa.Text),
         sa.Column('教學電腦數', sa.Text),
+        sa.Column('county_id', sa.Integer, sa.ForeignKey('dim_county.id'), index=True),
+        sa.Column('township_id', sa.Integer, sa.ForeignKey('dim_township.id'), index=True),
         sa.UniqueConstraint('縣市', '縣市代碼', '鄉鎮市區', '學校名稱', name='uq_wide_connected_county_code_town_school')
     )
 
@@ -497,6 +589,7 @@ async def ensure_wide_tables_exist() -> None:
         sa.Column('縣市', sa.Text),
         sa.Column('受服務單位', sa.Text),
         sa.Column('志工團隊學校', sa.Text),
+        sa.Column('county_id', sa.Integer, sa.ForeignKey('dim_county.id'), index=True),
         sa.UniqueConstraint('年度', '縣市', '受服務單位', '志工團隊學校', name='uq_wide_volunteer_year_county_unit_school')
     )
 
@@ -506,6 +599,25 @@ async def ensure_wide_tables_exist() -> None:
     await engine.dispose()
 
 
+async def refresh_one_aggregate_view(view: str) -> bool:
+    """以獨立連線更新一個 materialized view；view 不存在（尚未執行 migration）時略過"""
+    async with await get_session() as session:
+        # execute 會自動開始交易，存在檢查與更新放在同一個交易區塊內
+        async with session.begin():
+            exists = await session.execute(text("SELECT to_regclass(:view) IS NOT NULL"), {"view": view})
+            if not exists.scalar():
+                print(f"⚠️  找不到 {view}，請先執行 alembic upgrade head")
+                return False
+            await refresh_aggregate_view(session, view)
+    return True
+
+
+async def refresh_aggregate_views() -> int:
+    """並行更新所有彙總 view（CONCURRENTLY 更新期間 API 仍可讀取舊資料）"""
+    results = await asyncio.gather(*(refresh_one_aggregate_view(view) for view in AGGREGATE_VIEWS))
+    return sum(1 for refreshed in results if refreshed)
+
+
 async def main() -> None:
     # 預設情況下使用 Alembic migration 管理資料表。若你想在 ingest 時自動建立表
     #（開發模式），可以將環境變數 CREATE_TABLES_AT_INGEST 設為 1/true。
@@ -515,6 +627,12 @@ async def main() -> None:
     print("📊 開始導入資料...")
     print("-" * 60)
     
+    async with await get_session() as session:
+        await session.begin()
+        await ensure_county_dimension(session)
+        await session.commit()
+    print(f"✅ 已寫入 {len(COUNTIES)} 筆縣市維度資料")
+    
     w1 = await ingest_school_population_wide()
     print(f"✅ 已處理 {w1} 筆 edu_B_1_4 資料")
     
@@ -527,6 +645,16 @@ async def main() -> None:
     w4 = await ingest_volunteer_teams_wide()
     print(f"✅ 已處理 {w4} 筆 volunteer_teams 資料")
     
+    refreshed = await refresh_aggregate_views()
+    print(f"✅ 已更新 {refreshed} 個彙總 materialized view")
+    
+    # 遞增資料版本，API 行程據此重建學校名稱索引等記憶體快取
+    async with await get_session() as session:
+        await session.begin()
+        version = await bump_data_version(session)
+        await session.commit()
+    print(f"✅ 資料版本已更新為 {version}")
+    
     print("-" * 60)
     print("📈 資料庫統計:")
     
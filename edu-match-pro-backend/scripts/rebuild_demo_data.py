@@ -842,6 +842,13 @@ async def rebuild_demo_data(mode='generate', init_only=False):
             
             # 步驟 6: 驗證
             await verify_results(engine, demo_users)
+            
+            # 步驟 7: 資料直接寫入資料表，重新計算儀表板彙總
+            from app.crud.stats_rollup_crud import rebuild_stats_rollups
+            async with async_session_local() as session:
+                await session.begin()
+                await rebuild_stats_rollups(session)
+                await session.commit()
         
     finally:
         await engine.dispose()
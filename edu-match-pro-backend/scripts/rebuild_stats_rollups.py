@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+重建儀表板彙總表
+從 need / donation 明細重新計算 school_stats、company_stats、company_sdg_stats。
+平常由寫入路徑增量維護；直接寫入資料表的腳本執行後（或懷疑數字不一致時）執行此腳本回填
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加項目根目錄到 Python 路徑
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db import async_session_local
+from app.crud.stats_rollup_crud import rebuild_stats_rollups
+
+
+async def main() -> None:
+    print("📊 重建儀表板彙總表...")
+    async with async_session_local() as session:
+        await session.begin()
+        counts = await rebuild_stats_rollups(session)
+        await session.commit()
+    for table, count in counts.items():
+        print(f"  • {table}: {count} 筆")
+    print("✅ 彙總表重建完成")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
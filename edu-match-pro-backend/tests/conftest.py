@@ -10,7 +10,7 @@ import subprocess
 import os
 
 from app.core.config import settings
-from app.db import get_session
+from app.db import get_read_session, get_session
 from main import app
 
 
@@ -61,6 +61,7 @@ def override_app_session(test_session_maker):
         async with test_session_maker() as session:
             yield session
     app.dependency_overrides[get_session] = _override_get_session
+    app.dependency_overrides[get_read_session] = _override_get_session
     yield
     app.dependency_overrides.clear()
 
@@ -0,0 +1,230 @@
+"""
+tests/core 共用的測試替身
+
+這些測試不連資料庫也不連 Gemini：
+- FakeSession 記錄執行的 SQL 與參數，依 responder 回傳固定結果
+- make_ai_service 以建構子建立 AIService，模型來自假模型後端或測試指定的模型物件
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from app.core.ai_fake_backend import FakeModelBackend
+from app.core.ai_key_pool import GeminiKeyPool, KeyState
+from app.core.ai_model_catalog import ModelCatalog
+from app.core.ai_service import AIService, ModelBackend
+from app.core.config import settings
+
+
+class FakeResult:
+    """查詢結果替身：one / fetchone / scalar 回傳 value，fetchall / all 回傳 rows"""
+
+    def __init__(self, value: Any = None, rows: Any = ()):
+        self.value = value
+        self.rows = list(rows)
+
+    def one(self):
+        return self.value
+
+    def fetchone(self):
+        return self.value
+
+    def scalar(self):
+        return self.value
+
+    def scalar_one(self):
+        return self.value
+
+    def scalar_one_or_none(self):
+        return self.value
+
+    def fetchall(self):
+        return self.rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeTransaction:
+    """session.begin() 的回傳值：可 await，也可作為 async with 區塊（離開時 commit 或 rollback）"""
+
+    def __init__(self, session: "FakeSession"):
+        self.session = session
+
+    def __await__(self):
+        return self._noop().__await__()
+
+    async def _noop(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, *exc):
+        if exc_type is None:
+            await self.session.commit()
+        else:
+            await self.session.rollback()
+        return False
+
+
+class FakeSession:
+    """
+    AsyncSession 替身
+
+    - execute 記錄 (SQL 文字, 參數)，原始 statement 保留在 executed，回傳 responder(statement, params) 的結果
+    - add 的物件保留在 added
+    - 與 AsyncSession 相同，execute 會自動開始交易；交易進行中再呼叫 begin() 會拋出 InvalidRequestError
+    - 由 FakeSessionFactory 建立時，同時執行中的查詢數量記錄在工廠上
+    """
+
+    def __init__(
+        self,
+        value: Any = None,
+        rows: Any = (),
+        responder: Optional[Callable[[Any, dict], Any]] = None,
+        delay: float = 0.0,
+        factory: Optional["FakeSessionFactory"] = None,
+    ):
+        self.responder = responder or (lambda statement, params: FakeResult(value, rows))
+        self.delay = delay
+        self.factory = factory
+        self.calls: List[Tuple[str, dict]] = []
+        self.executed: List[Any] = []
+        self.added: List[Any] = []
+        self.in_transaction = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    @property
+    def statements(self) -> List[str]:
+        return [sql for sql, _ in self.calls]
+
+    async def execute(self, statement, params=None):
+        self.in_transaction = True
+        self.calls.append((str(statement), params or {}))
+        self.executed.append(statement)
+        if self.factory is not None:
+            self.factory.running += 1
+            self.factory.peak = max(self.factory.peak, self.factory.running)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            return self.responder(statement, params or {})
+        finally:
+            if self.factory is not None:
+                self.factory.running -= 1
+
+    def add(self, instance: Any) -> None:
+        self.added.append(instance)
+
+    def begin(self) -> FakeTransaction:
+        if self.in_transaction:
+            raise InvalidRequestError("A transaction is already begun on this Session.")
+        self.in_transaction = True
+        return FakeTransaction(self)
+
+    async def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    async def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSessionFactory:
+    """async_sessionmaker 替身：記錄建立的 session 與同時執行中的查詢數量高峰"""
+
+    def __init__(self, **session_options: Any):
+        self.session_options = session_options
+        self.sessions: List[FakeSession] = []
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self) -> FakeSession:
+        session = FakeSession(factory=self, **self.session_options)
+        self.sessions.append(session)
+        return session
+
+    @property
+    def statements(self) -> List[str]:
+        return [sql for session in self.sessions for sql in session.statements]
+
+    @property
+    def calls(self) -> List[Tuple[str, dict]]:
+        return [call for session in self.sessions for call in session.calls]
+
+
+@pytest.fixture
+def fake_session():
+    """建立 FakeSession（參數同 FakeSession）"""
+    return FakeSession
+
+
+@pytest.fixture
+def fake_session_factory():
+    """建立 FakeSessionFactory（參數為每個 session 的 FakeSession 參數）"""
+    return FakeSessionFactory
+
+
+@pytest.fixture
+def fake_result():
+    """建立 FakeResult（供 responder 使用）"""
+    return FakeResult
+
+
+class StaticModelBackend(ModelBackend):
+    """每把金鑰回傳測試指定的模型物件（models 為單一模型，或 {金鑰索引: 模型}）"""
+
+    name = "static"
+
+    def __init__(self, models: Union[Any, Dict[int, Any]], catalog: Sequence[str] = ("models/fake",)):
+        self.models = models
+        self.catalog = list(catalog)
+
+    def load_catalog(self, key_pool: GeminiKeyPool) -> ModelCatalog:
+        return ModelCatalog(models=list(self.catalog), fetched_at=time.time(), source="static")
+
+    def get_model(self, key_pool: GeminiKeyPool, key: KeyState, model_name: str):
+        if isinstance(self.models, dict):
+            return self.models[key.index]
+        return self.models
+
+
+@pytest.fixture
+def make_ai_service(monkeypatch):
+    """
+    以建構子建立 AIService
+
+    backend 預設為無延遲的假模型後端；model 指定時改用 StaticModelBackend。
+    金鑰池不限流，回應快取只在 cache=True 時啟用（僅記憶體層）
+    """
+    def make(
+        backend: Optional[ModelBackend] = None,
+        model: Any = None,
+        keys: Sequence[str] = ("fake-key-0001", "fake-key-0002"),
+        cache: bool = False,
+        concurrency: int = 4,
+        acquire_timeout: float = 1,
+    ) -> AIService:
+        monkeypatch.setattr(settings, "ai_cache_enabled", cache)
+        monkeypatch.setattr(settings, "ai_cache_dir", None)
+        monkeypatch.setattr(settings, "ai_key_rpm", 6000)
+        monkeypatch.setattr(settings, "ai_key_burst", 10)
+        monkeypatch.setattr(settings, "ai_key_acquire_timeout_seconds", acquire_timeout)
+        monkeypatch.setattr(settings, "ai_max_concurrency", concurrency)
+        if backend is None:
+            backend = StaticModelBackend(model) if model is not None else FakeModelBackend(latency_ms=0, seed=1)
+        return AIService(backend=backend, api_keys=list(keys))
+
+    return make
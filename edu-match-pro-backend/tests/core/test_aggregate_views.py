@@ -0,0 +1,55 @@
+import pytest
+
+from app.crud.aggregate_views_crud import get_wide_table_stats, refresh_aggregate_view
+
+
+@pytest.mark.asyncio
+async def test_wide_table_stats_keeps_response_shape(fake_session):
+    session = fake_session((10, 3, 40, 500, 7, 20, 5, 8, 4, 6, None))
+
+    stats = await get_wide_table_stats(session)
+
+    assert stats["faraway_schools"] == {
+        "total_records": 10, "counties": 3, "total_classes": 40, "total_students": 500
+    }
+    assert stats["education_statistics"] == {"total_records": 7}
+    assert stats["connected_devices"] == {"total_records": 20, "counties": 5}
+    assert stats["volunteer_teams"] == {"total_records": 8, "counties": 4, "volunteer_schools": 6}
+    assert "mv_wide_table_stats" in session.statements[0]
+
+
+@pytest.mark.asyncio
+async def test_wide_table_stats_missing_row(fake_session):
+    assert await get_wide_table_stats(fake_session()) is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_only_known_views(fake_session):
+    session = fake_session()
+    await refresh_aggregate_view(session, "mv_county_education_stats")
+    assert "REFRESH MATERIALIZED VIEW CONCURRENTLY mv_county_education_stats" in session.statements[0]
+
+    with pytest.raises(ValueError):
+        await refresh_aggregate_view(session, "users; DROP TABLE users")
+
+
+@pytest.mark.asyncio
+async def test_ingest_refreshes_existing_views_in_one_transaction(monkeypatch, fake_session_factory):
+    """測試 ingest 在同一個交易內檢查 view 是否存在並更新，view 不存在時略過"""
+    import scripts.ingest_school_tables as ingest
+
+    factory = fake_session_factory(value=True)
+
+    async def get_session():
+        return factory()
+
+    monkeypatch.setattr(ingest, "get_session", get_session)
+
+    assert await ingest.refresh_aggregate_views() == 2
+    assert [session.commits for session in factory.sessions] == [1, 1]
+    assert sum("REFRESH MATERIALIZED VIEW CONCURRENTLY" in sql for sql in factory.statements) == 2
+
+    factory.session_options["value"] = False
+    factory.sessions.clear()
+    assert await ingest.refresh_aggregate_views() == 0
+    assert not any("REFRESH" in sql for sql in factory.statements)
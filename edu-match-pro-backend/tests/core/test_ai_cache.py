@@ -0,0 +1,70 @@
+import time
+
+from app.core.ai_cache import AIResponseCache, make_cache_key
+from app.core.cache import LRUTTLCache, MISSING
+
+
+def test_lru_evicts_least_recently_used():
+    """測試超過容量時淘汰最久未使用的項目"""
+    cache = LRUTTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+
+def test_entries_expire_after_ttl():
+    """測試 TTL 到期後視為未命中"""
+    cache = LRUTTLCache(max_entries=10, ttl_seconds=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is MISSING
+    assert cache.stats.expirations == 1
+
+
+def test_cache_key_ignores_whitespace_but_not_model():
+    """測試快取鍵對排版不敏感，但會區分模型與人設"""
+    key = make_cache_key("捐電腦給  台東縣\n", "models/gemini-2.5-flash", "p1")
+    assert key == make_cache_key("捐電腦給 台東縣", "models/gemini-2.5-flash", "p1")
+    assert key != make_cache_key("捐電腦給 台東縣", "models/gemini-2.5-pro", "p1")
+    assert key != make_cache_key("捐電腦給 台東縣", "models/gemini-2.5-flash", "p2")
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """測試磁碟層在重新建立快取後仍可命中"""
+    first = AIResponseCache(max_entries=4, ttl_seconds=60, disk_dir=str(tmp_path))
+    first.set("k", "報告內容")
+
+    second = AIResponseCache(max_entries=4, ttl_seconds=60, disk_dir=str(tmp_path))
+    assert second.get("k") == "報告內容"
+    assert second.stats()["disk"]["hits"] == 1
+
+
+def test_disk_tier_evicts_by_size(tmp_path):
+    """測試磁碟層超過容量時淘汰最舊的資料"""
+    cache = AIResponseCache(max_entries=1, ttl_seconds=60, disk_dir=str(tmp_path), disk_max_bytes=10)
+    cache.set("old", "12345678")
+    cache.set("new", "abcdefgh")
+
+    assert cache.disk.get("old") is None
+    assert cache.disk.get("new") == "abcdefgh"
+
+
+def test_ai_service_serves_repeated_prompt_from_cache(make_ai_service):
+    """測試相同 prompt 第二次不再呼叫模型"""
+    calls = []
+
+    ai = make_ai_service(cache=True)
+    ai._call_with_retry = lambda prompt, served=None: calls.append(prompt) or '{"resource_type": "電腦"}'
+
+    first = ai.extract_donation_parameters("捐電腦給台東縣", [])
+    second = ai.extract_donation_parameters("捐電腦給台東縣", [])
+
+    assert first == second == {"resource_type": "電腦"}
+    assert len(calls) == 1
+    assert ai.cache_stats()["hits"] == 1
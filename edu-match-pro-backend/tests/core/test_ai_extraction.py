@@ -0,0 +1,18 @@
+def test_combined_extraction_returns_params_and_reply_in_one_call(make_ai_service):
+    """測試合併模式一次調用同時取得參數與回覆，格式不符時回傳 None"""
+    calls = []
+    responses = [
+        '```json\n{"params": {"resource_type": "電腦", "target_counties": ["臺東縣"]}, "reply": "好的，要捐幾台呢？"}\n```',
+        '{"resource_type": "電腦"}',
+    ]
+
+    ai = make_ai_service()
+    ai._call_with_retry = lambda prompt, served=None: calls.append(prompt) or responses[len(calls) - 1]
+
+    result = ai.extract_and_reply("捐電腦給臺東縣", [])
+    assert result == {
+        "extracted_params": {"resource_type": "電腦", "target_counties": ["臺東縣"]},
+        "followup_question": "好的，要捐幾台呢？",
+    }
+    assert ai.extract_and_reply("捐電腦", []) is None
+    assert len(calls) == 2
@@ -0,0 +1,49 @@
+import pytest
+
+from app.core.ai_fake_backend import FakeModelBackend, CANNED_RESPONSES
+
+
+def test_latency_distribution_is_reproducible_with_seed():
+    """測試相同 seed 抽樣到相同的延遲序列"""
+    first = FakeModelBackend(latency_ms=100, seed=7)
+    second = FakeModelBackend(latency_ms=100, seed=7)
+    assert [first.sample_latency() for _ in range(5)] == [second.sample_latency() for _ in range(5)]
+    assert FakeModelBackend(latency_ms=100, distribution="fixed").sample_latency() == 0.1
+
+
+@pytest.mark.asyncio
+async def test_fake_backend_serves_canned_extraction(make_ai_service):
+    """測試假模型依 prompt 類型回傳固定內容"""
+    ai = make_ai_service()
+    params = await ai.extract_donation_parameters_async("捐電腦給臺東縣", [])
+    assert params["target_counties"] == ["臺東縣"]
+
+    report = "".join([text async for text in ai.stream_analysis_report_async({}, {}, {})])
+    assert report == CANNED_RESPONSES["report"]
+
+
+@pytest.mark.asyncio
+async def test_injected_leaked_key_error_puts_key_in_cooldown(make_ai_service):
+    """測試注入的 403 金鑰洩露錯誤會讓金鑰進入冷卻，並改用另一把金鑰"""
+    backend = FakeModelBackend(latency_ms=0, leaked_key_rate=1.0)
+    ai = make_ai_service(backend)
+
+    with pytest.raises(ValueError):
+        await ai._call_with_retry_async("hi", max_retries=2)
+
+    stats = ai.key_pool_stats()
+    assert [k["forbidden"] for k in stats["keys"]] == [1, 1]
+    assert stats["available"] == 0
+
+
+def test_model_backend_requires_both_methods():
+    """測試模型後端必須實作 load_catalog 與 get_model，假後端也是 ModelBackend"""
+    from app.core.ai_service import ModelBackend
+
+    class CatalogOnly(ModelBackend):
+        def load_catalog(self, key_pool):
+            return None
+
+    with pytest.raises(TypeError):
+        CatalogOnly()
+    assert isinstance(FakeModelBackend(), ModelBackend)
@@ -0,0 +1,173 @@
+import time
+
+import pytest
+
+from app.core.ai_key_pool import GeminiKeyPool, KeyPoolExhaustedError, parse_retry_delay
+from app.core.ai_model_catalog import ModelCatalog
+from app.core.ai_service import ModelBackend
+
+
+def make_pool(keys=("key-aaaa", "key-bbbb", "key-cccc"), **kwargs):
+    options = dict(rate_per_minute=600, burst=10, acquire_timeout=0.5)
+    options.update(kwargs)
+    return GeminiKeyPool(list(keys), **options)
+
+
+def test_requests_are_spread_round_robin():
+    """測試請求輪流分配到每一把金鑰"""
+    pool = make_pool()
+    picked = [pool.acquire().index for _ in range(6)]
+    assert picked == [0, 1, 2, 0, 1, 2]
+
+
+def test_rate_limited_key_is_skipped_until_cooldown():
+    """測試 429 後該金鑰在冷卻期間不再被分配"""
+    pool = make_pool(keys=("key-aaaa", "key-bbbb"), cooldown_seconds=60)
+    first = pool.acquire()
+    pool.record_failure(first, "429 resource exhausted", "rate_limited")
+
+    assert [pool.acquire().index for _ in range(3)] == [1, 1, 1]
+    assert pool.stats()["keys"][0]["rate_limited"] == 1
+
+
+def test_token_bucket_limits_each_key():
+    """測試令牌用完後等待逾時拋出 KeyPoolExhaustedError"""
+    pool = make_pool(keys=("key-aaaa",), rate_per_minute=1, burst=2, acquire_timeout=0.1)
+    pool.acquire()
+    pool.acquire()
+    with pytest.raises(KeyPoolExhaustedError):
+        pool.acquire()
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes():
+    """測試連續失敗達門檻後熔斷，逾時後只放行一個試探請求"""
+    pool = make_pool(keys=("key-aaaa",), breaker_threshold=2, breaker_reset_seconds=0.05)
+    for _ in range(2):
+        key = pool.acquire()
+        pool.record_failure(key, "500 internal")
+    assert pool.keys[0].breaker_state == "open"
+
+    probe = pool.acquire()
+    assert probe.breaker_state == "half_open"
+    assert pool.try_acquire()[0] is None
+
+    pool.record_success(probe, 0.01)
+    assert pool.keys[0].breaker_state == "closed"
+
+
+def test_parse_retry_delay():
+    """測試解析 429 回應中建議的等待秒數"""
+    assert parse_retry_delay("429 ... retry_delay {\n  seconds: 37\n}") == 37
+    assert parse_retry_delay("please retry in 12.5s.") == 12.5
+    assert parse_retry_delay("403 forbidden") is None
+
+
+class FakeModel:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    async def generate_content_async(self, prompt):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return type("Response", (), {"text": self.outcome})()
+
+
+@pytest.mark.asyncio
+async def test_ai_service_moves_to_next_key_after_429(make_ai_service):
+    """測試 AIService 在某把金鑰 429 後改用下一把金鑰，不再等待退避"""
+    models = {0: FakeModel(Exception("429 Resource exhausted")), 1: FakeModel("ok")}
+    ai = make_ai_service(model=models, keys=["key-aaaa", "key-bbbb"])
+
+    assert await ai._call_with_retry_async("hi") == "ok"
+    stats = ai.key_pool_stats()["keys"]
+    assert stats[0]["rate_limited"] == 1
+    assert stats[1]["successes"] == 1
+
+
+def test_rate_limit_cools_down_only_that_model():
+    """測試 429 只冷卻該金鑰在該模型上的使用，其他模型仍可使用同一把金鑰"""
+    pool = make_pool(keys=("key-aaaa",), cooldown_seconds=60)
+    key = pool.acquire("models/a")
+    pool.record_failure(key, "429 resource exhausted", "rate_limited", "models/a")
+
+    assert pool.try_acquire("models/a")[0] is None
+    assert pool.model_cooling_down("models/a")
+    assert pool.acquire("models/b").index == 0
+    assert "models/a" in pool.stats()["keys"][0]["model_cooldowns"]
+
+
+class ModelsByNameBackend(ModelBackend):
+    """依模型名稱回傳假模型（所有金鑰共用）"""
+
+    name = "by-name"
+
+    def __init__(self, models):
+        self.models = models
+
+    def load_catalog(self, key_pool):
+        return ModelCatalog(models=list(self.models), fetched_at=time.time(), source="test")
+
+    def get_model(self, key_pool, key, model_name):
+        return self.models[model_name]
+
+
+@pytest.mark.asyncio
+async def test_ai_service_falls_back_to_next_model_per_call(make_ai_service):
+    """測試所有金鑰在目前模型都 429 時，本次調用改用下一個模型，不修改共用的模型設定也不清除冷卻"""
+    backend = ModelsByNameBackend({
+        "models/gemini-2.5-flash": FakeModel(Exception("429 Resource exhausted")),
+        "models/gemini-2.0-flash": FakeModel("ok"),
+    })
+    ai = make_ai_service(backend=backend, keys=["key-aaaa", "key-bbbb"])
+
+    assert await ai._call_with_retry_async("hi") == "ok"
+    assert ai.model_name == "models/gemini-2.5-flash"
+    assert ai.key_pool.model_cooling_down("models/gemini-2.5-flash")
+    assert [k["rate_limited"] for k in ai.key_pool_stats()["keys"]] == [1, 1]
+
+    # 冷卻中的模型直接跳過，不再對已受限的金鑰發出請求
+    assert await ai._call_with_retry_async("hi") == "ok"
+    assert [k["rate_limited"] for k in ai.key_pool_stats()["keys"]] == [1, 1]
+
+
+
+@pytest.mark.asyncio
+async def test_fallback_model_response_is_not_cached_as_primary(make_ai_service):
+    """測試備援模型的回應不寫入以主要模型計算的快取鍵，主要模型恢復後不會重播備援的回應"""
+    primary = FakeModel(Exception("429 Resource exhausted"))
+    backend = ModelsByNameBackend({"models/gemini-2.5-flash": primary, "models/gemini-2.0-flash": FakeModel("備援")})
+    ai = make_ai_service(backend=backend, keys=["key-aaaa"], cache=True)
+
+    assert await ai._generate_async("hi") == "備援"
+
+    primary.outcome = "主要"
+    for key in ai.key_pool.keys:
+        key.model_cooldowns.clear()
+    assert await ai._generate_async("hi") == "主要"
+    assert await ai._generate_async("hi") == "主要"
+    assert ai.cache_stats()["hits"] == 1
+
+def test_gemini_key_model_uses_public_client_per_key():
+    """測試金鑰綁定的模型透過該金鑰自己的 generativelanguage client 發送請求"""
+    import google.ai.generativelanguage as glm
+
+    class FakeClient:
+        def __init__(self):
+            self.requests = []
+
+        def generate_content(self, request):
+            self.requests.append(request)
+            return glm.GenerateContentResponse(candidates=[
+                glm.Candidate(content=glm.Content(role="model", parts=[glm.Part(text="你好")]))
+            ])
+
+    pool = make_pool(keys=("key-aaaa", "key-bbbb"))
+    client = FakeClient()
+    pool.keys[1]._clients["generative"] = client
+
+    response = pool.model_for(pool.keys[1], "models/a").generate_content("hi")
+
+    assert response.text == "你好"
+    assert client.requests[0].model == "models/a"
+    assert client.requests[0].contents[0].parts[0].text == "hi"
+    assert "generative" not in pool.keys[0]._clients
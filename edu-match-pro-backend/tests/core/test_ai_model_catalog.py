@@ -0,0 +1,56 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.ai_key_pool import GeminiKeyPool
+from app.core.ai_model_catalog import load_model_catalog
+
+
+class CountingPool(GeminiKeyPool):
+    """list_models 不連網，只計算呼叫次數"""
+
+    def __init__(self, fail=False):
+        super().__init__(["key-aaaa"])
+        self.fail = fail
+        self.list_calls = 0
+
+    def list_models(self, key):
+        self.list_calls += 1
+        if self.fail:
+            raise RuntimeError("network down")
+        return [
+            SimpleNamespace(name="models/gemini-2.5-flash", supported_generation_methods=["generateContent"]),
+            SimpleNamespace(name="models/embedding-001", supported_generation_methods=["embedContent"]),
+        ]
+
+
+def test_catalog_is_fetched_once_and_reused_from_file(tmp_path):
+    """測試第一次取得後寫入檔案，刷新間隔內不再呼叫 list_models"""
+    path = str(tmp_path / "models.json")
+    pool = CountingPool()
+
+    first = load_model_catalog(pool, path=path, refresh_seconds=3600)
+    second = load_model_catalog(pool, path=path, refresh_seconds=3600)
+
+    assert first.models == ["models/gemini-2.5-flash"]
+    assert second.source == "file"
+    assert pool.list_calls == 1
+
+
+def test_expired_catalog_falls_back_when_refresh_fails(tmp_path):
+    """測試目錄過期且無法重新取得時沿用舊清單"""
+    path = tmp_path / "models.json"
+    path.write_text(json.dumps({"fetched_at": time.time() - 7200, "models": ["models/gemini-2.0-flash"]}))
+
+    catalog = load_model_catalog(CountingPool(fail=True), path=str(path), refresh_seconds=3600)
+
+    assert catalog.models == ["models/gemini-2.0-flash"]
+    assert catalog.source == "stale_file"
+
+
+def test_missing_catalog_and_failed_fetch_raises(tmp_path):
+    """測試沒有目錄檔又無法取得時拋出 ValueError"""
+    with pytest.raises(ValueError):
+        load_model_catalog(CountingPool(fail=True), path=str(tmp_path / "none.json"), refresh_seconds=3600)
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.sse import format_sse
+
+
+class FakeStreamingModel:
+    """模擬 generate_content_async(stream=True) 逐段回傳文字"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+
+        async def iterate():
+            for text in self.chunks:
+                yield SimpleNamespace(text=text)
+
+        return iterate()
+
+
+async def collect(stream):
+    return [text async for text in stream]
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_chunks_in_order(make_ai_service):
+    """測試串流逐段輸出模型回應"""
+    ai = make_ai_service(model=FakeStreamingModel(["## 報告", "\n第一段", "\n第二段"]), cache=True)
+
+    parts = await collect(ai._generate_stream_async("報告 prompt"))
+
+    assert parts == ["## 報告", "\n第一段", "\n第二段"]
+
+
+@pytest.mark.asyncio
+async def test_stream_replays_cached_response(make_ai_service):
+    """測試串流完成後寫入快取，第二次直接回放完整內容"""
+    model = FakeStreamingModel(["好的，", "請問要捐到哪個縣市？"])
+    ai = make_ai_service(model=model, cache=True)
+
+    await collect(ai._generate_stream_async("追問 prompt"))
+    replay = await collect(ai._generate_stream_async("追問 prompt"))
+
+    assert replay == ["好的，請問要捐到哪個縣市？"]
+    assert model.calls == 1
+
+
+class FailingStreamModel:
+    """輸出第一段後拋出錯誤"""
+
+    def __init__(self, error):
+        self.error = error
+
+    async def generate_content_async(self, prompt, stream=False):
+        async def iterate():
+            yield SimpleNamespace(text="第一段")
+            raise self.error
+
+        return iterate()
+
+
+@pytest.mark.asyncio
+async def test_mid_stream_rate_limit_cools_down_model_not_breaker(make_ai_service):
+    """測試已輸出內容後的 429 仍記為該模型的冷卻，而不是計入熔斷器的一般錯誤"""
+    ai = make_ai_service(model=FailingStreamModel(Exception("429 Resource exhausted")), keys=["fake-key-0001"])
+
+    with pytest.raises(Exception, match="429"):
+        await collect(ai._stream_with_retry_async("報告 prompt"))
+
+    key = ai.key_pool.keys[0]
+    assert key.rate_limited == 1 and key.consecutive_failures == 0
+    assert ai.model_name in key.model_cooldowns
+
+
+def test_format_sse_keeps_newlines_inside_data():
+    """測試事件內容中的換行不會提前結束 SSE 事件"""
+    event = format_sse("token", {"text": "第一行\n第二行"})
+
+    assert event.startswith("event: token\ndata: ")
+    assert event.endswith("\n\n")
+    assert event.count("\n") == 3
+
+
+@pytest.mark.asyncio
+async def test_analysis_stream_opens_its_own_session(monkeypatch, make_ai_service, fake_session_factory):
+    """測試串流報告在產生回應時自行開啟 session 查詢學校，不使用端點返回後已關閉的注入 session"""
+    from httpx import ASGITransport, AsyncClient
+
+    import app.api.main_api as main_api
+    import app.core.ai_service as ai_service_module
+    import app.crud.smart_exploration_crud as smart_exploration_crud
+    from main import app
+
+    factory = fake_session_factory()
+
+    async def read_session_factory():
+        return factory
+
+    monkeypatch.setattr(main_api, "read_session_factory", read_session_factory)
+    monkeypatch.setattr(smart_exploration_crud.settings, "smart_exploration_concurrent_queries", False)
+    monkeypatch.setattr(ai_service_module, "_ai_service_instance", make_ai_service())
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/ai/analyze/stream", json={"user_params": {"target_counties": ["臺東縣"]}})
+
+    assert "event: school_data" in response.text
+    assert "event: done" in response.text
+    assert "event: error" not in response.text
+    assert len(factory.sessions) == 1 and len(factory.statements) == 4
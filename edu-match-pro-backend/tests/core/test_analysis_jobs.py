@@ -0,0 +1,182 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+import app.core.analysis_jobs as analysis_jobs
+from app.core.analysis_jobs import AnalysisJobQueue, is_job_stale, job_to_response
+from app.core.exceptions import ServiceUnavailableError
+from app.models.analysis_report import AnalysisReport, AnalysisJobStatus
+
+
+class InMemoryJobStore:
+    """以字典取代 analysis_report 表的 crud 函式"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    async def get_analysis_job(self, session, job_id):
+        return self.jobs.get(job_id)
+
+    async def get_reusable_report(self, session, params_hash, max_age):
+        return None
+
+    async def get_inflight_job(self, session, params_hash, queue_timeout, run_timeout):
+        return None
+
+    async def create_analysis_job(self, session, job_id, params_hash, user_params):
+        job = AnalysisReport(
+            id=job_id,
+            params_hash=params_hash,
+            user_params=json.dumps(user_params, ensure_ascii=False),
+            status=AnalysisJobStatus.queued
+        )
+        self.jobs[job_id] = job
+        return job
+
+    async def update_analysis_job(self, session, job_id, status, report=None, school_data=None, error=None):
+        job = self.jobs[job_id]
+        job.status = status
+        if report is not None:
+            job.report = report
+        if school_data is not None:
+            job.school_data = json.dumps(school_data, ensure_ascii=False)
+        if error is not None:
+            job.error = error
+        if status == AnalysisJobStatus.running:
+            job.started_at = datetime.utcnow()
+        if status in (AnalysisJobStatus.completed, AnalysisJobStatus.failed):
+            job.completed_at = datetime.utcnow()
+        return job
+
+
+@pytest.fixture
+def job_store(monkeypatch):
+    store = InMemoryJobStore()
+    for name in ("get_analysis_job", "get_reusable_report", "get_inflight_job",
+                 "create_analysis_job", "update_analysis_job"):
+        monkeypatch.setattr(analysis_jobs, name, getattr(store, name))
+    return store
+
+
+def fake_analysis(error=None):
+    async def run_donation_analysis(session, user_params, raise_errors=False):
+        if error:
+            raise error
+        school_data = {"faraway_schools": [], "statistics": {"total_schools": 3}}
+        return {"report": f"報告：{user_params['target_counties'][0]}", "school_data": school_data,
+                "statistics": school_data["statistics"]}
+    return run_donation_analysis
+
+
+async def wait_until_idle(queue):
+    await asyncio.wait_for(queue._queue.join(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_submit_runs_job_to_completion(monkeypatch, job_store, fake_session, fake_session_factory):
+    """測試提交後立即回傳排隊中的工作，worker 完成後可輪詢到報告"""
+    monkeypatch.setattr(analysis_jobs, "run_donation_analysis", fake_analysis())
+    queue = AnalysisJobQueue(workers=1, max_pending=5, session_factory=fake_session_factory())
+
+    job = await queue.submit(fake_session, {"target_counties": ["臺東縣"]})
+    assert job.status == AnalysisJobStatus.queued
+
+    await wait_until_idle(queue)
+    response = job_to_response(job_store.jobs[job.id])
+    await queue.shutdown()
+
+    assert response["status"] == AnalysisJobStatus.completed
+    assert response["report"] == "報告：臺東縣"
+    assert response["statistics"] == {"total_schools": 3}
+    assert queue.stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_job_reports_error(monkeypatch, job_store, fake_session, fake_session_factory):
+    """測試分析失敗時工作標記為 failed 並帶出錯誤訊息"""
+    monkeypatch.setattr(analysis_jobs, "run_donation_analysis", fake_analysis(RuntimeError("模型無回應")))
+    queue = AnalysisJobQueue(workers=1, max_pending=5, session_factory=fake_session_factory())
+
+    job = await queue.submit(fake_session, {"target_counties": ["花蓮縣"]})
+    await wait_until_idle(queue)
+    response = job_to_response(job_store.jobs[job.id])
+    await queue.shutdown()
+
+    assert response["status"] == AnalysisJobStatus.failed
+    assert response["error"] == "模型無回應"
+
+
+@pytest.mark.asyncio
+async def test_duplicate_submit_reuses_inflight_job(monkeypatch, job_store, fake_session):
+    """測試相同參數在處理中時重用同一個工作，佇列滿時拒絕新工作"""
+    queue = AnalysisJobQueue(workers=1, max_pending=1)
+    queue._ensure_started()
+    for task in queue._workers:
+        task.cancel()
+
+    first = await queue.submit(fake_session, {"target_counties": ["臺東縣"]})
+    again = await queue.submit(fake_session, {"target_counties": ["臺東縣"]})
+    with pytest.raises(ServiceUnavailableError):
+        await queue.submit(fake_session, {"target_counties": ["屏東縣"]})
+    await queue.shutdown()
+
+    assert again.id == first.id
+    assert len(job_store.jobs) == 1
+
+
+def test_running_job_is_stale_from_started_at():
+    """測試執行逾時從 started_at 起算，長時間排隊後才開始的工作不會被誤判為逾時"""
+    now = datetime.utcnow()
+    timeout = analysis_jobs.job_run_timeout()
+    job = AnalysisReport(params_hash="x", user_params="{}", status=AnalysisJobStatus.running,
+                         created_at=now - timeout * 3, started_at=now - timeout / 2)
+
+    assert not is_job_stale(job, now)
+    assert is_job_stale(job, now + timeout)
+
+
+def test_queued_job_waits_longer_than_run_timeout():
+    """測試排隊中的工作以佇列等待上限判斷是否失效，而非單一工作的執行逾時"""
+    now = datetime.utcnow()
+    job = AnalysisReport(params_hash="x", user_params="{}", status=AnalysisJobStatus.queued,
+                         created_at=now - analysis_jobs.job_run_timeout() * 2)
+
+    assert not is_job_stale(job, now)
+    assert is_job_stale(job, now + analysis_jobs.job_queue_timeout())
+
+
+@pytest.mark.asyncio
+async def test_jobs_endpoints_submit_and_poll(monkeypatch, job_store, fake_session, fake_session_factory):
+    """測試 POST /ai/analyze/jobs 回傳 202 與 job id，GET 輪詢取得完成的報告"""
+    from httpx import ASGITransport, AsyncClient
+
+    import app.crud.analysis_report_crud as analysis_report_crud
+    from app.db import get_session
+    from main import app
+
+    monkeypatch.setattr(analysis_jobs, "run_donation_analysis", fake_analysis())
+    monkeypatch.setattr(analysis_report_crud, "get_analysis_job", job_store.get_analysis_job)
+    queue = AnalysisJobQueue(workers=1, max_pending=5, session_factory=fake_session_factory())
+    monkeypatch.setattr(analysis_jobs, "analysis_job_queue", queue)
+
+    async def override_get_session():
+        yield fake_session
+
+    app.dependency_overrides[get_session] = override_get_session
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            submitted = await client.post("/ai/analyze/jobs", json={"user_params": {"target_counties": ["臺東縣"]}})
+            await wait_until_idle(queue)
+            polled = await client.get(f"/ai/analyze/jobs/{submitted.json()['job_id']}")
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+        await queue.shutdown()
+
+    assert submitted.status_code == 202
+    assert submitted.json()["status"] == "queued"
+    assert polled.status_code == 200
+    assert polled.json()["status"] == "completed"
+    assert polled.json()["report"] == "報告：臺東縣"
@@ -0,0 +1,123 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+import app.core.ai_service as ai_service_module
+from app.core.conversation_store import ConversationStore, merge_params
+
+
+def test_merge_params_keeps_previous_values():
+    """測試新一輪沒提到的參數保留舊值，非空值覆蓋"""
+    merged = merge_params(
+        {"resource_type": "電腦", "target_counties": ["花蓮縣"]},
+        {"resource_type": None, "target_counties": ["臺東縣"], "_raw_ai_error": "x"}
+    )
+    assert merged == {"resource_type": "電腦", "target_counties": ["臺東縣"]}
+
+
+@pytest.mark.asyncio
+async def test_memory_store_appends_turns_and_expires():
+    """測試記憶體 session 追加訊息與 TTL 到期"""
+    store = ConversationStore(ttl_seconds=0.05, max_sessions=10)
+    state = await store.create()
+    await store.append(state, [{"role": "user", "content": "捐電腦"}], {"resource_type": "電腦"})
+
+    loaded = await store.get(state.session_id)
+    assert loaded.turns == [{"role": "user", "content": "捐電腦"}]
+    assert loaded.params == {"resource_type": "電腦"}
+
+    await asyncio.sleep(0.06)
+    assert await store.get(state.session_id) is None
+
+
+@pytest.mark.asyncio
+async def test_extract_endpoint_rebuilds_history_from_session(monkeypatch, make_ai_service):
+    """測試客戶端只送新訊息時，伺服器以 session 重建對話並合併參數"""
+    from main import app
+
+    ai = make_ai_service(keys=["fake-key-0001"])
+    monkeypatch.setattr(ai_service_module, "_ai_service_instance", ai)
+
+    prompts = []
+    original = ai._call_with_retry_async
+
+    async def record(prompt, max_retries=None, served=None):
+        prompts.append(prompt)
+        return await original(prompt, max_retries, served)
+
+    ai._call_with_retry_async = record
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        first = (await client.post("/ai/extract_parameters", json={"query": "我想捐電腦"})).json()
+        session_id = first["session_id"]
+        assert session_id and first["session_params"]["resource_type"] == "電腦"
+
+        await client.post("/ai/extract_parameters", json={"query": "第二句話", "session_id": session_id})
+        assert "我想捐電腦" in prompts[-1]
+
+        session = (await client.get(f"/ai/sessions/{session_id}")).json()
+        assert [t["role"] for t in session["turns"]] == ["user", "assistant", "user", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_db_store_reads_database_and_merges_params_there(monkeypatch, fake_session_factory):
+    """測試 DB 模式每次都從資料庫讀取，只送出本輪有值的參數，並採用資料庫合併後的結果"""
+    import app.core.conversation_store as store_module
+
+    reads = []
+    appended = []
+
+    async def fake_get_conversation(session, conversation_id, max_age):
+        reads.append(conversation_id)
+        conversation = SimpleNamespace(params='{"resource_type": "電腦"}')
+        return conversation, [SimpleNamespace(role="user", content="捐電腦")]
+
+    async def fake_append(session, conversation_id, turns, params):
+        appended.append(params)
+        # 另一個 worker 已寫入 quantity，資料庫合併結果包含兩者
+        return {"resource_type": "電腦", "quantity": 20, **params}
+
+    monkeypatch.setattr(store_module, "get_conversation", fake_get_conversation)
+    monkeypatch.setattr(store_module, "append_conversation_turns", fake_append)
+    store = ConversationStore(ttl_seconds=60, max_sessions=10, backend="db", session_factory=fake_session_factory())
+    session_id = str(uuid.uuid4())
+
+    state = await store.get(session_id)
+    await store.get(session_id)
+    assert len(reads) == 2
+
+    await store.append(state, [{"role": "user", "content": "捐到臺東"}], {"target_counties": ["臺東縣"], "quantity": None})
+    assert appended == [{"target_counties": ["臺東縣"]}]
+    assert state.params == {"resource_type": "電腦", "quantity": 20, "target_counties": ["臺東縣"]}
+
+
+@pytest.mark.asyncio
+async def test_append_locks_session_row_and_merges_with_jsonb(fake_session, fake_result):
+    """測試寫入時先鎖住 session 列，參數以 jsonb || 在資料庫內合併"""
+    from app.crud.conversation_crud import append_conversation_turns
+
+    conversation_id = uuid.uuid4()
+
+    def respond(statement, params):
+        sql = str(statement)
+        if "FOR UPDATE" in sql:
+            return fake_result(conversation_id)
+        if "max(" in sql:
+            return fake_result(1)
+        return fake_result('{"resource_type": "電腦", "quantity": 20}')
+
+    session = fake_session(responder=respond)
+
+    merged = await append_conversation_turns(
+        session, conversation_id, [{"role": "user", "content": "捐電腦"}], {"quantity": 20}
+    )
+
+    assert merged == {"resource_type": "電腦", "quantity": 20}
+    assert "FOR UPDATE" in session.statements[0]
+    assert "||" in session.statements[2] and "RETURNING" in session.statements[2]
+    assert [turn.seq for turn in session.added] == [2]
+    assert session.commits == 1
@@ -0,0 +1,37 @@
+from app.core.county_resolver import canonical_county_name, resolve_county_id, resolve_county_ids
+from app.crud.sql_filters import SqlFilter
+
+
+def test_resolves_prefixes_variants_and_typos():
+    """測試編號前綴、台/臺、簡稱與資料中的錯字都解析到同一個 county_id"""
+    for raw in ["[14]臺東縣", "14臺東縣", "台東縣", "臺東", " 台東 ", "臺東線"]:
+        assert resolve_county_id(raw) == 10014
+    assert canonical_county_name("[01]新北市") == "新北市"
+    assert canonical_county_name("臺北縣") == "新北市"
+
+
+def test_ambiguous_or_unknown_names_are_unresolved():
+    """測試有歧義的簡稱與未知名稱不會被猜測"""
+    assert resolve_county_id("新竹") is None
+    ids, unresolved = resolve_county_ids(["台東縣", "臺東縣", "新竹", "", None])
+    assert ids == [10014]
+    assert unresolved == ["新竹"]
+
+
+def test_county_filter_uses_ids_with_like_fallback():
+    """測試縣市條件以 county_id 等值比對，無法解析的名稱才用 LIKE"""
+    resolved = SqlFilter().county("w.縣市", "counties", ["台東縣", "花蓮"], id_column="w.county_id")
+    assert resolved.where_sql() == "WHERE w.county_id = ANY(:counties_ids)"
+    assert resolved.params == {"counties_ids": [10014, 10015]}
+
+    mixed = SqlFilter().county("縣市", "county", ["臺東縣", "新竹"], pattern="%{}%", case_insensitive=True)
+    assert mixed.where_sql() == "WHERE (county_id = ANY(:county_ids) OR 縣市 ILIKE ANY(:county_names))"
+    assert mixed.params == {"county_ids": [10014], "county_names": ["%新竹%"]}
+
+
+def test_unresolved_county_matches_both_tai_spellings():
+    """測試無法解析的名稱以原始寫法比對，並加上台/臺互換的寫法（?county=台 仍比對到「台北市」）"""
+    filters = SqlFilter().county("縣市", "county", ["台"], pattern="%{}%", case_insensitive=True)
+
+    assert filters.where_sql() == "WHERE 縣市 ILIKE ANY(:county_names)"
+    assert filters.params == {"county_names": ["%台%", "%臺%"]}
@@ -0,0 +1,93 @@
+import uuid
+
+import pytest
+
+from app.crud import dashboard_crud
+
+
+@pytest.mark.asyncio
+async def test_school_dashboard_is_one_round_trip(monkeypatch, fake_session):
+    monkeypatch.setattr(dashboard_crud.settings, "dashboard_stats_rollups", False)
+    session = fake_session((4, 1, 2, 60))
+
+    stats = await dashboard_crud.get_school_dashboard_stats(session, uuid.uuid4())
+
+    assert len(session.statements) == 1
+    assert "FILTER (WHERE" in session.statements[0]
+    assert stats["totalNeeds"] == 4 and stats["activeNeeds"] == 1
+    assert stats["completedNeeds"] == 2 and stats["studentsBenefited"] == 60
+    assert stats["successRate"] == 50.0
+
+
+
+@pytest.mark.asyncio
+async def test_school_rollup_database_error_falls_back_to_live_stats(monkeypatch, fake_session):
+    """測試讀取 school_stats 的資料庫錯誤（例如 migration 尚未套用）改用即時計算"""
+    from sqlalchemy.exc import ProgrammingError
+
+    monkeypatch.setattr(dashboard_crud.settings, "dashboard_stats_rollups", True)
+    session = fake_session((4, 1, 2, 60))
+
+    async def missing_table(session, school_id):
+        raise ProgrammingError("SELECT", {}, Exception('relation "school_stats" does not exist'))
+
+    monkeypatch.setattr(dashboard_crud, "get_school_stats", missing_table)
+    stats = await dashboard_crud.get_school_dashboard_stats(session, uuid.uuid4())
+
+    assert session.rollbacks == 1
+    assert len(session.statements) == 1 and "FILTER (WHERE" in session.statements[0]
+    assert stats["totalNeeds"] == 4 and stats["successRate"] == 50.0
+
+@pytest.mark.asyncio
+async def test_platform_stats_is_one_round_trip(fake_session):
+    session = fake_session((3, 10, 120, 4))
+
+    stats = await dashboard_crud.get_platform_stats(session)
+
+    assert len(session.statements) == 1
+    assert stats == {
+        "schoolsWithNeeds": 3,
+        "completedMatches": 4,
+        "studentsBenefited": 120,
+        "successRate": 40.0
+    }
+
+
+@pytest.mark.asyncio
+async def test_company_live_stats_are_aggregated_in_sql(monkeypatch, fake_session):
+    monkeypatch.setattr(dashboard_crud.settings, "dashboard_stats_rollups", False)
+    session = fake_session((5, 2, 40, 3), rows=[(4, 2), (10, 1)])
+
+    stats = await dashboard_crud.get_company_dashboard_stats(session, uuid.uuid4())
+
+    assert len(session.statements) == 2
+    assert "FILTER (WHERE" in session.statements[0]
+    assert "unnest(need.sdgs)" in session.statements[1]
+    assert stats["completedProjects"] == 2 and stats["studentsHelped"] == 40
+    assert stats["avgProjectDuration"] == 3 and stats["successRate"] == 40.0
+    assert stats["sdgContributions"] == {"4": 2, "10": 1}
+
+
+@pytest.mark.asyncio
+async def test_company_rollup_database_error_falls_back_to_live_stats(monkeypatch, fake_session):
+    """測試讀取彙總列的資料庫錯誤改用即時計算，其他錯誤照常拋出"""
+    from sqlalchemy.exc import OperationalError
+
+    monkeypatch.setattr(dashboard_crud.settings, "dashboard_stats_rollups", True)
+    session = fake_session((5, 2, 40, 3), rows=[(4, 2)])
+
+    async def missing_table(session, company_id):
+        raise OperationalError("SELECT", {}, Exception('relation "company_stats" does not exist'))
+
+    monkeypatch.setattr(dashboard_crud, "get_company_stats", missing_table)
+    stats = await dashboard_crud.get_company_dashboard_stats(session, uuid.uuid4())
+
+    assert session.rollbacks == 1
+    assert stats["completedProjects"] == 2 and stats["sdgContributions"] == {"4": 2}
+
+    async def broken(session, company_id):
+        raise AttributeError("rollup")
+
+    monkeypatch.setattr(dashboard_crud, "get_company_stats", broken)
+    with pytest.raises(AttributeError):
+        await dashboard_crud.get_company_dashboard_stats(session, uuid.uuid4())
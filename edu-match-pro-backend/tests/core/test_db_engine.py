@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.pool import NullPool
+
+from app.core.db_engine import (
+    InstrumentedAsyncQueuePool, PoolMetrics, engine_options, engine_url, resolve_profile
+)
+
+URL = "postgresql+asyncpg://user@localhost/db"
+
+
+def _settings(profile="prod", **overrides):
+    fields = ["db_echo", "db_pool_size", "db_max_overflow", "db_pool_timeout_seconds",
+              "db_pool_recycle_seconds", "db_pool_pre_ping", "db_statement_cache_size",
+              "db_statement_timeout_ms"]
+    values = {name: None for name in fields}
+    values.update(overrides)
+    return SimpleNamespace(db_profile=profile, **values)
+
+
+def test_prod_profile_with_overrides():
+    profile = resolve_profile(_settings(db_pool_size=3, db_echo=True))
+    assert profile.pool_size == 3 and profile.echo is True
+    assert profile.max_overflow == 20
+
+    options = engine_options(URL, profile)
+    assert options["poolclass"] is InstrumentedAsyncQueuePool
+    assert options["pool_size"] == 3
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "15000"}}
+    assert engine_url(URL, profile).query["prepared_statement_cache_size"] == "500"
+
+
+def test_test_profile_uses_null_pool():
+    options = engine_options(URL, resolve_profile(_settings("test")))
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+    assert options["echo"] is False
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        resolve_profile(_settings("staging"))
+
+
+def test_pool_metrics():
+    metrics = PoolMetrics()
+    for wait in (0.001, 0.002, 0.010):
+        metrics.record(wait)
+    metrics.record_timeout()
+
+    stats = metrics.stats()
+    assert stats["checkouts"] == 3 and stats["timeouts"] == 1
+    assert stats["wait_ms_max"] == 10.0
+    assert stats["wait_ms_p50"] == 2.0
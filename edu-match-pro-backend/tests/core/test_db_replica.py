@@ -0,0 +1,72 @@
+import pytest
+
+from app.core.db_replica import ReplicaRouter
+
+
+class _FakeResult:
+    def __init__(self, lag):
+        self.lag = lag
+
+    def scalar(self):
+        return self.lag
+
+
+class _FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def execute(self, statement):
+        if self.engine.error:
+            raise ConnectionRefusedError("replica down")
+        return _FakeResult(self.engine.lag)
+
+    async def __aenter__(self):
+        self.engine.checks += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeEngine:
+    def __init__(self, lag=0.0, error=False):
+        self.lag = lag
+        self.error = error
+        self.checks = 0
+
+    def connect(self):
+        return _FakeConnection(self)
+
+
+@pytest.mark.asyncio
+async def test_without_replica_always_uses_primary():
+    router = ReplicaRouter(None)
+    assert await router.use_replica() is False
+    assert router.stats()["configured"] is False
+
+
+@pytest.mark.asyncio
+async def test_healthy_replica_is_checked_once_per_interval():
+    engine = _FakeEngine(lag=1.0)
+    router = ReplicaRouter(engine, check_interval_seconds=60, max_lag_seconds=30)
+
+    assert await router.use_replica() is True
+    assert await router.use_replica() is True
+    assert engine.checks == 1
+    assert router.stats()["replica_sessions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_primary_when_lagging_or_down():
+    engine = _FakeEngine(lag=120.0)
+    router = ReplicaRouter(engine, check_interval_seconds=0, max_lag_seconds=30)
+    assert await router.use_replica() is False
+    assert router.lag_seconds == 120.0
+
+    engine.lag, engine.error = 0.0, True
+    assert await router.use_replica() is False
+    assert "replica down" in router.stats()["last_error"]
+
+    engine.error = False
+    assert await router.use_replica() is True
+    assert router.stats()["primary_fallbacks"] == 2
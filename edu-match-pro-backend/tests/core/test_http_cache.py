@@ -0,0 +1,38 @@
+from fastapi import Request, Response
+
+from app.core.http_cache import conditional_response, etag_matches, make_etag
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_make_etag_is_stable_and_content_sensitive():
+    assert make_etag("x", {"a": 1, "b": 2}) == make_etag("x", {"b": 2, "a": 1})
+    assert make_etag("x", {"a": 1}) != make_etag("x", {"a": 2})
+    assert make_etag("x").startswith('W/"')
+
+
+def test_etag_matches_uses_weak_comparison():
+    etag = make_etag("x")
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert etag_matches(f'W/"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_conditional_response():
+    etag = make_etag("x")
+
+    response = Response()
+    assert conditional_response(_request(), response, etag, "public, max-age=60") is None
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+    not_modified = conditional_response(_request(etag), Response(), etag, "public, max-age=60")
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.body == b""
@@ -0,0 +1,122 @@
+import uuid
+
+import pytest
+
+from app.crud.keyset_pagination import InvalidCursorError
+from app.crud.sql_filters import SqlFilter
+from app.crud.wide_table_crud import EDUCATION_ORDER, FARAWAY_ORDER, fetch_wide_page
+
+
+def test_cursor_round_trip_and_validation():
+    """測試游標編碼後可還原為查詢參數，且不接受其他列表的游標"""
+    school_id = uuid.uuid4()
+    cursor = FARAWAY_ORDER.encode(["臺東縣", "大武國小", school_id])
+
+    assert FARAWAY_ORDER.decode(cursor) == {"cursor_0": "臺東縣", "cursor_1": "大武國小", "cursor_2": school_id}
+    with pytest.raises(InvalidCursorError):
+        EDUCATION_ORDER.decode(cursor)
+    with pytest.raises(InvalidCursorError):
+        FARAWAY_ORDER.decode("not-a-cursor")
+
+
+def test_after_clause_uses_row_comparison_when_directions_match():
+    """測試排序方向一致時使用 row comparison，混合方向時展開為 OR 條件"""
+    assert FARAWAY_ORDER.after_clause() == '("縣市名稱", "本校名稱", id) > (:cursor_0, :cursor_1, :cursor_2)'
+    assert EDUCATION_ORDER.after_clause() == (
+        '("學年度" <= :cursor_0 AND ("學年度" < :cursor_0 OR ("學年度" = :cursor_0 AND '
+        '("縣市別" > :cursor_1 OR ("縣市別" = :cursor_1 AND id > :cursor_2)))))'
+    )
+
+
+@pytest.fixture
+def wide_session(fake_session, fake_result):
+    """依 SQL 內容回傳資料版本、planner 估計值、總數或資料列的 FakeSession"""
+    def make(rows, total, version=1, estimate=1000):
+        def respond(statement, params):
+            sql = str(statement)
+            if "data_version" in sql:
+                return fake_result(version)
+            if "reltuples" in sql:
+                return fake_result(estimate)
+            if sql.startswith("SELECT COUNT(*)"):
+                return fake_result(total)
+            page = rows[:params["limit"]]
+            if "COUNT(*) OVER ()" in sql:
+                page = [tuple(row) + (total,) for row in page]
+            return fake_result(rows=page)
+
+        return fake_session(responder=respond)
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_returns_next_cursor_only_when_more_rows_exist(wide_session):
+    """測試多抓一筆判斷是否有下一頁，並以最後一筆的排序鍵產生游標"""
+    ids = [uuid.uuid4() for _ in range(3)]
+    rows = [(f"school-{i}", "臺東縣", f"school-{i}", ids[i]) for i in range(3)]
+    session = wide_session(rows, total=3)
+    filters = SqlFilter().equals('"地區屬性"', "area_type", "偏遠")
+
+    page = await fetch_wide_page(session, "wide_faraway3", '"本校名稱"', filters, FARAWAY_ORDER,
+                                 '"縣市名稱"', limit=2, cursor="", count_mode="exact")
+
+    assert page.rows == [("school-0",), ("school-1",)]
+    assert page.total == 3
+    assert FARAWAY_ORDER.decode(page.next_cursor)["cursor_2"] == ids[1]
+    # 第一頁的總數以視窗函數和資料一起取得
+    assert len(session.calls) == 1
+    data_sql, params = session.calls[0]
+    assert "OFFSET" not in data_sql and params["limit"] == 3
+
+    session = wide_session(rows[2:], total=3)
+    last = await fetch_wide_page(session, "wide_faraway3", '"本校名稱"', filters, FARAWAY_ORDER,
+                                 '"縣市名稱"', limit=2, cursor=page.next_cursor, count_mode="exact")
+    assert last.next_cursor is None
+    assert last.rows == [("school-2",)]
+    assert "> (:cursor_0, :cursor_1, :cursor_2)" in session.calls[0][0]
+    # 有游標時總數不受游標條件影響，另外計算
+    count_sql, _ = session.calls[1]
+    assert count_sql.startswith("SELECT COUNT(*)") and "cursor_" not in count_sql
+
+
+@pytest.mark.asyncio
+async def test_count_modes(monkeypatch, wide_session):
+    """測試快取計數在資料版本不變時命中、變動後失效，以及無條件時使用 planner 估計值"""
+    import app.crud.wide_table_crud as wide_table_crud
+
+    wide_table_crud.count_cache.clear()
+    monkeypatch.setattr(wide_table_crud.data_version_watcher, "refresh_seconds", 0)
+    filters = SqlFilter().equals('"地區屬性"', "area_type", "極偏")
+    rows = [("a",), ("b",)]
+
+    first = await fetch_wide_page(wide_session(rows, total=42), "wide_faraway3", '"本校名稱"', filters,
+                                  FARAWAY_ORDER, '"縣市名稱"', limit=2, count_mode="cached")
+    assert (first.total, first.total_mode) == (42, "exact")
+
+    session = wide_session(rows, total=99)
+    second = await fetch_wide_page(session, "wide_faraway3", '"本校名稱"', filters,
+                                   FARAWAY_ORDER, '"縣市名稱"', limit=2, count_mode="cached")
+    assert (second.total, second.total_mode) == (42, "cached")
+    assert not any("COUNT(*)" in sql for sql, _ in session.calls)
+
+    refreshed = await fetch_wide_page(wide_session(rows, total=99, version=2), "wide_faraway3", '"本校名稱"',
+                                      filters, FARAWAY_ORDER, '"縣市名稱"', limit=2, count_mode="cached")
+    assert (refreshed.total, refreshed.total_mode) == (99, "exact")
+
+    estimated = await fetch_wide_page(wide_session(rows, total=5), "wide_faraway3", '"本校名稱"', SqlFilter(),
+                                      FARAWAY_ORDER, '"縣市名稱"', limit=2, count_mode="estimated")
+    assert (estimated.total, estimated.total_mode) == (1000, "estimated")
+
+
+@pytest.mark.parametrize("reltuples", [0, -1])
+@pytest.mark.asyncio
+async def test_estimated_count_falls_back_when_table_never_analyzed(wide_session, reltuples):
+    """測試 reltuples 為 0 或 -1（尚未 ANALYZE）時不使用估計值，改為精確計數"""
+    import app.crud.wide_table_crud as wide_table_crud
+
+    wide_table_crud.count_cache.clear()
+    page = await fetch_wide_page(wide_session([("a",)], total=7, estimate=reltuples), "wide_faraway3", '"本校名稱"',
+                                 SqlFilter(), FARAWAY_ORDER, '"縣市名稱"', limit=2, count_mode="estimated")
+
+    assert (page.total, page.total_mode) == (7, "exact")
@@ -0,0 +1,48 @@
+from app.core.prompt_builder import (
+    compact_table, estimate_tokens, fit_rows_to_budget, format_history, PromptMetrics
+)
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    """測試中文約一字一 token，英文約四字元一 token"""
+    assert estimate_tokens("偏鄉學校") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("") == 0
+
+
+def test_compact_table_is_smaller_than_json_and_drops_empty_columns():
+    """測試緊湊表格省略全空欄位"""
+    rows = [{"school_name": "示範國小", "students": 42, "classes": None}]
+    table = compact_table(rows, [("school_name", "學校"), ("students", "學生數"), ("classes", "班級數")])
+    assert table == "學校|學生數\n示範國小|42"
+
+
+def test_format_history_summarizes_older_turns():
+    """測試較早的對話壓成摘要，最近的保留原文"""
+    history = [
+        {"role": "user", "content": "我想捐電腦"},
+        {"role": "assistant", "content": "好的，要捐到哪裡？"},
+        {"role": "user", "content": "臺東縣"},
+    ]
+    text = format_history(history, recent_turns=1)
+    assert text.splitlines() == ["（較早對話摘要，用戶提過：我想捐電腦）", "用戶: 臺東縣"]
+
+
+def test_fit_rows_to_budget_trims_rows_until_prompt_fits():
+    """測試超出預算時減少列數，但不少於最少列數"""
+    render = lambda rows: "學校" * 10 * rows
+    prompt, rows = fit_rows_to_budget(render, max_rows=15, budget_tokens=100, min_rows=3)
+    assert rows == 5 and estimate_tokens(prompt) <= 100
+
+    _, rows = fit_rows_to_budget(render, max_rows=15, budget_tokens=10, min_rows=3)
+    assert rows == 3
+
+
+def test_prompt_metrics_tracks_over_budget():
+    """測試提示詞統計記錄超出預算與被裁減的次數"""
+    metrics = PromptMetrics()
+    metrics.record("report", "學" * 50, budget_tokens=40)
+    metrics.record("report", "學" * 10, budget_tokens=40, trimmed=True)
+    stats = metrics.stats()["report"]
+    assert stats["calls"] == 2 and stats["over_budget"] == 1 and stats["trimmed"] == 1
+    assert stats["avg_tokens"] == 30
@@ -0,0 +1,62 @@
+import pytest
+
+from app.core.query_cache import PublicQueryCache, normalize_params
+
+
+class _FakeWatcher:
+    def __init__(self, version=1):
+        self.version = version
+
+    async def current(self, session):
+        return self.version
+
+
+def _counting_loader(calls):
+    async def load():
+        calls.append(1)
+        return {"data": len(calls)}
+    return load
+
+
+def test_normalize_params_ignores_order_whitespace_and_none():
+    assert normalize_params({"b": " 臺東 ", "a": 1, "cursor": None}) == normalize_params({"a": 1, "b": "臺東"})
+    # cursor="" 是 keyset 第一頁，不能與未提供 cursor 視為相同
+    assert normalize_params({"cursor": ""}) != normalize_params({"cursor": None})
+
+
+@pytest.mark.asyncio
+async def test_hit_until_data_version_changes():
+    watcher = _FakeWatcher()
+    cache = PublicQueryCache(version_watcher=watcher)
+    calls = []
+
+    first = await cache.get_or_load(None, "/data/x", {"page": 1}, _counting_loader(calls))
+    second = await cache.get_or_load(None, "/data/x", {"page": 1}, _counting_loader(calls))
+    assert first == second and len(calls) == 1
+
+    watcher.version = 2
+    await cache.get_or_load(None, "/data/x", {"page": 1}, _counting_loader(calls))
+    assert len(calls) == 2
+
+    stats = cache.stats()
+    assert stats["endpoints"]["/data/x"] == {"hits": 1, "misses": 2}
+    assert stats["data_version"] == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_and_disabled_cache_are_not_cached():
+    cache = PublicQueryCache(version_watcher=_FakeWatcher())
+
+    async def failing():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load(None, "/data/x", {}, failing)
+    calls = []
+    await cache.get_or_load(None, "/data/x", {}, _counting_loader(calls))
+    assert len(calls) == 1
+
+    disabled = PublicQueryCache(enabled=False, version_watcher=_FakeWatcher())
+    for _ in range(2):
+        await disabled.get_or_load(None, "/data/x", {}, _counting_loader(calls))
+    assert len(calls) == 3
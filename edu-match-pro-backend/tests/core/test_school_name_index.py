@@ -0,0 +1,58 @@
+import pytest
+
+from app.core.school_name_index import SchoolNameAutocomplete, SchoolNameIndex
+
+NAMES = [
+    "縣立大同國小",
+    "縣立大同國小-大同分校",
+    "大同國小",
+    "臺東縣立大武國小",
+    "縣立長濱國中-三間分校",
+]
+
+
+def test_ranks_exact_prefix_and_branch_matches_first():
+    """測試完全相同、開頭相同、分校名稱開頭相同依序排前面"""
+    index = SchoolNameIndex(NAMES)
+
+    assert index.search("大同國小") == ["大同國小", "縣立大同國小", "縣立大同國小-大同分校"]
+    assert index.search("三間")[0] == "縣立長濱國中-三間分校"
+    assert index.search("台東") == ["臺東縣立大武國小"]
+    assert index.search("", limit=2) == sorted(NAMES)[:2]
+
+
+def test_single_character_and_fuzzy_lookup():
+    """測試單字查詢與打錯字時的 bigram 模糊比對"""
+    index = SchoolNameIndex(NAMES)
+
+    assert set(index.search("濱")) == {"縣立長濱國中-三間分校"}
+    assert index.search("大同國中")[0] in {"大同國小", "縣立大同國小"}
+    assert index.search("完全無關") == []
+
+
+@pytest.mark.asyncio
+async def test_rebuilds_only_when_data_version_changes(monkeypatch, fake_session_factory):
+    """測試資料版本不變時不重新載入名稱"""
+    import app.crud.data_version_crud as data_version_crud
+    import app.crud.school_search_crud as school_search_crud
+
+    state = {"version": 1, "loads": 0}
+
+    async def fake_version(session, name="wide_tables"):
+        return state["version"]
+
+    async def fake_names(session):
+        state["loads"] += 1
+        return NAMES[:state["version"] + 1]
+
+    monkeypatch.setattr(data_version_crud, "get_data_version", fake_version)
+    monkeypatch.setattr(school_search_crud, "list_school_names", fake_names)
+    autocomplete = SchoolNameAutocomplete(refresh_seconds=0, session_factory=fake_session_factory())
+
+    assert len(await autocomplete.get_index()) == 2
+    await autocomplete.search("大同")
+    assert state["loads"] == 1
+
+    state["version"] = 2
+    assert len(await autocomplete.get_index()) == 3
+    assert state["loads"] == 2
@@ -0,0 +1,34 @@
+import pytest
+
+import app.crud.smart_exploration_crud as crud
+
+
+@pytest.mark.asyncio
+async def test_concurrent_mode_uses_one_session_per_query(monkeypatch, fake_session_factory):
+    """測試並行模式下四個查詢各用一個 session 同時執行"""
+    monkeypatch.setattr(crud.settings, "smart_exploration_concurrent_queries", True)
+    factory = fake_session_factory(delay=0.05)
+
+    result = await crud.query_schools_by_criteria(None, counties=["臺東縣"], session_factory=factory)
+
+    assert len(factory.sessions) == 4
+    assert factory.peak == 4
+    assert len(factory.statements) == 4
+    assert result["statistics"]["total_schools"] == 0
+    # 縣市解析為 county_id 陣列參數，不出現在 SQL 文字中
+    assert all("臺東縣" not in s for s in factory.statements)
+    assert all(p["counties_ids"] == [10014] for _, p in factory.calls)
+
+
+@pytest.mark.asyncio
+async def test_sequential_mode_runs_on_given_session(monkeypatch, fake_session_factory):
+    """測試關閉並行模式時依序在傳入的 session 上執行"""
+    monkeypatch.setattr(crud.settings, "smart_exploration_concurrent_queries", False)
+    factory = fake_session_factory(delay=0.05)
+    session = factory()
+
+    await crud.query_schools_by_criteria(session, counties=["全台灣"])
+
+    assert factory.peak == 1
+    assert len(session.statements) == 4
+    assert all("LIKE" not in s for s in session.statements)
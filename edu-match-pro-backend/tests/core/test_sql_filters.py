@@ -0,0 +1,40 @@
+from app.crud.sql_filters import SqlFilter, escape_like
+
+
+def test_sql_text_does_not_depend_on_values():
+    """測試不同縣市數量產生相同的 SQL 文字，值全部走參數"""
+    one = SqlFilter().like_any("縣市", "counties", ["臺東縣"], pattern="%{}")
+    three = SqlFilter().like_any("縣市", "counties", ["臺東縣", "花蓮縣", "屏東縣"], pattern="%{}")
+
+    assert one.where_sql() == three.where_sql() == "WHERE 縣市 LIKE ANY(:counties)"
+    assert three.bind(limit=10) == {"counties": ["%臺東縣", "%花蓮縣", "%屏東縣"], "limit": 10}
+
+
+def test_empty_values_add_no_condition():
+    """測試空值不加入條件"""
+    filters = SqlFilter().like_any("縣市", "counties", ["", None]).equals("地區屬性", "area_type", None)
+
+    assert not filters
+    assert filters.where_sql() == ""
+
+
+def test_user_input_is_escaped_and_bound():
+    """測試使用者輸入中的引號與萬用字元不會進入 SQL 文字"""
+    filters = SqlFilter().contains(['"受服務單位"', '"志工團隊學校"'], "school", "x' OR 1=1 --%")
+
+    assert "'" not in filters.where_sql()
+    assert filters.where_sql() == 'WHERE ("受服務單位" ILIKE :school OR "志工團隊學校" ILIKE :school)'
+    assert filters.params["school"] == "%x' OR 1=1 --\\%%"
+    assert escape_like("50_%") == "50\\_\\%"
+
+
+def test_ranked_search_orders_by_similarity():
+    """測試搜尋條件要求排序時，ORDER BY 先依 word_similarity"""
+    filters = SqlFilter().contains(['"受服務單位"', '"志工團隊學校"'], "school", " 大同國小 ", rank=True)
+
+    assert filters.order_sql('"縣市"') == (
+        'ORDER BY GREATEST(word_similarity(:school_q, "受服務單位"), '
+        'word_similarity(:school_q, "志工團隊學校")) DESC, "縣市"'
+    )
+    assert filters.params["school_q"] == "大同國小"
+    assert SqlFilter().order_sql('"縣市"') == 'ORDER BY "縣市"'
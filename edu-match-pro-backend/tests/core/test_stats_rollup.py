@@ -0,0 +1,80 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.crud import stats_rollup_crud as rollup
+from app.crud.stats_rollup_crud import DonationSnapshot, NeedSnapshot
+from app.models.donation import DonationStatus
+from app.models.need import NeedStatus
+
+
+def _increments(session):
+    """各次 upsert 的目標表與差值"""
+    increments = []
+    for statement in session.executed:
+        params = statement.compile(dialect=postgresql.dialect()).params
+        increments.append((statement.table.name, {key: value for key, value in params.items() if value is not None}))
+    return increments
+
+
+def _deltas(session, table):
+    return [
+        {k: v for k, v in values.items() if k not in ("school_id", "company_id", "updated_at")}
+        for name, values in _increments(session) if name == table
+    ]
+
+
+@pytest.mark.asyncio
+async def test_need_status_change_moves_counts(fake_session):
+    session = fake_session()
+    before = NeedSnapshot(NeedStatus.in_progress, 30, (4,))
+    after = NeedSnapshot(NeedStatus.completed, 30, (4,))
+
+    await rollup.record_need_change(session, uuid.uuid4(), before, after)
+
+    assert _deltas(session, "school_stats") == [
+        {"in_progress_needs": -1, "completed_needs": 1, "students_benefited": 30}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_new_need_and_unchanged_update(fake_session):
+    session = fake_session()
+    need = NeedSnapshot(NeedStatus.active, 12)
+
+    await rollup.record_need_change(session, uuid.uuid4(), None, need)
+    await rollup.record_need_change(session, uuid.uuid4(), need, need, need_id=uuid.uuid4())
+
+    # 沒有差值時不寫入；學生數與 SDG 未變動時不需查詢相關捐贈
+    assert _deltas(session, "school_stats") == [{"total_needs": 1, "active_needs": 1}]
+    assert len(session.executed) == 1
+
+
+@pytest.mark.asyncio
+async def test_completed_donation_adds_students_sdgs_and_duration(fake_session):
+    session = fake_session()
+    company_id = uuid.uuid4()
+    pending = DonationSnapshot(DonationStatus.pending, 40, (4, 10))
+    completed = DonationSnapshot(DonationStatus.completed, 40, (4, 10), duration_days=7)
+
+    await rollup.record_donation_change(session, company_id, None, pending)
+    await rollup.record_donation_change(session, company_id, pending, completed)
+
+    assert _deltas(session, "company_stats") == [
+        {"total_donations": 1},
+        {"completed_donations": 1, "students_helped": 40, "completed_duration_days": 7, "completed_with_duration": 1},
+    ]
+    assert sorted(values["sdg"] for table, values in _increments(session) if table == "company_sdg_stats") == [4, 10]
+
+
+def test_donation_duration_uses_updated_at():
+    class _Donation:
+        status = DonationStatus.completed
+        created_at = datetime(2026, 1, 1)
+        updated_at = datetime(2026, 1, 1) + timedelta(days=3, hours=5)
+
+    snapshot = DonationSnapshot.from_donation(_Donation(), None)
+    assert snapshot.duration_days == 3
+    assert snapshot.student_count == 0
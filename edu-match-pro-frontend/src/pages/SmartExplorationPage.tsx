@@ -52,6 +52,8 @@ const SmartExplorationPage = () => {
   const [inputValue, setInputValue] = useState('');
   const [isProcessing, setIsProcessing] = useState(false);
   const [conversationHistory, setConversationHistory] = useState<any[]>([]);
+  // 後端對話 session（對話歷史由後端保存，每輪只送出新訊息）
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [extractedParams, setExtractedParams] = useState<ExtractedParams>({});
   const [analysisResult, setAnalysisResult] = useState<AnalysisResult | null>(null);
   const [isComplete, setIsComplete] = useState(false);
@@ -115,7 +117,7 @@ const SmartExplorationPage = () => {
         // 調用分析 API
         const analysisResponse = await apiService.analyzeAIStrategy(
           extractedParams,
-          conversationHistory
+          sessionId
         );
 
         setAnalysisResult(analysisResponse);
@@ -137,12 +139,15 @@ const SmartExplorationPage = () => {
         ];
         console.log('📝 對話歷史（發送前）:', newHistory);
 
-        // 調用 AI 參數提取 API（傳入完整對話歷史）
+        // 調用 AI 參數提取 API（只送出新訊息，對話歷史由後端 session 保存）
         const response = await apiService.extractAIParameters(
           userMessage,
-          newHistory
+          sessionId
         );
         console.log('📨 收到 AI 回應:', response);
+        if (response.session_id) {
+          setSessionId(response.session_id);
+        }
 
         // 更新提取的參數（保留已有的參數，只添加新的）
         const newParams = { 
@@ -216,6 +221,7 @@ const SmartExplorationPage = () => {
     }]);
     setInputValue('');
     setConversationHistory([]);
+    setSessionId(null);
     setExtractedParams({});
     setAnalysisResult(null);
     setIsComplete(false);
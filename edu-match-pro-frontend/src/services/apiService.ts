@@ -416,21 +416,27 @@ class ApiService {
   
   /**
    * AI 參數提取
+   * 帶 sessionId 時只送出新訊息，對話歷史由後端 session 保存；
+   * 第一次呼叫不帶 sessionId，後端會建立新的 session 並在回應中帶回 session_id
    */
-  async extractAIParameters(query: string, conversationHistory: any[] = []): Promise<{
+  async extractAIParameters(query: string, sessionId: string | null = null): Promise<{
     extracted_params: any;
     followup_question: string | null;
     is_complete: boolean;
+    session_id?: string | null;
+    session_params?: any;
   }> {
     return this.request<{
       extracted_params: any;
       followup_question: string | null;
       is_complete: boolean;
+      session_id?: string | null;
+      session_params?: any;
     }>('/ai/extract_parameters', {
       method: 'POST',
       body: JSON.stringify({
         query,
-        conversation_history: conversationHistory
+        session_id: sessionId
       })
     });
   }
@@ -438,7 +444,7 @@ class ApiService {
   /**
    * AI 策略分析
    */
-  async analyzeAIStrategy(userParams: any, conversationHistory: any[] = []): Promise<{
+  async analyzeAIStrategy(userParams: any, sessionId: string | null = null): Promise<{
     report: string;
     school_data: any;
     statistics: any;
@@ -451,7 +457,7 @@ class ApiService {
       method: 'POST',
       body: JSON.stringify({
         user_params: userParams,
-        conversation_history: conversationHistory
+        session_id: sessionId
       })
     });
   }